@@ -1,8 +1,15 @@
 import logging
 from getpass import getpass
+from pathlib import Path
+from typing import Optional
 
+from pydantic import TypeAdapter
+
+from abrechnung.application.balances import BalanceService
+from abrechnung.application.transactions import TransactionService
 from abrechnung.application.users import UserService
 from abrechnung.config import Config
+from abrechnung.domain.transactions import NewTransaction
 from abrechnung.framework.database import create_db_pool
 
 logger = logging.getLogger(__name__)
@@ -24,3 +31,60 @@ async def create_user(config: Config, name: str, email: str, skip_email_check: b
     await user_service.register_user(  # pylint: disable=missing-kwoa
         username=name, email=email, password=password, requires_email_confirmation=not no_email_confirmation
     )
+
+
+async def import_transactions(config: Config, user_id: int, group_id: int, transactions_file: Path):
+    transactions = TypeAdapter(list[NewTransaction]).validate_json(transactions_file.read_bytes())
+    logger.info(f"Importing {len(transactions)} transactions into group {group_id} as user {user_id}")
+
+    db_pool = await create_db_pool(config.database)
+    user_service = UserService(db_pool, config)
+    transaction_service = TransactionService(db_pool, config)
+    user = await user_service.get_user(user_id=user_id)  # pylint: disable=missing-kwoa
+    transaction_ids = await transaction_service.create_transactions_bulk(  # pylint: disable=missing-kwoa
+        user=user, group_id=group_id, transactions=transactions
+    )
+    await db_pool.close()
+    logger.info(f"Imported {len(transaction_ids)} transactions")
+
+
+async def export_transactions(config: Config, user_id: int, group_id: int, output_file: Path):
+    logger.info(f"Exporting the transactions of group {group_id} as user {user_id} to {output_file}")
+
+    db_pool = await create_db_pool(config.database)
+    user_service = UserService(db_pool, config)
+    transaction_service = TransactionService(db_pool, config)
+    user = await user_service.get_user(user_id=user_id)  # pylint: disable=missing-kwoa
+    export = await transaction_service.prepare_transaction_export(  # pylint: disable=missing-kwoa
+        user=user, group_id=group_id
+    )
+    with output_file.open("wb") as f:
+        async for chunk in transaction_service.export_transactions_csv(export=export):
+            f.write(chunk)
+    await db_pool.close()
+
+
+async def rebuild_balances(config: Config, group_id: Optional[int], verify_only: bool) -> bool:
+    """
+    rebuild the stored account balances of one or all groups and verify them against the full transaction history,
+    returns whether all balances are consistent
+    """
+    db_pool = await create_db_pool(config.database)
+    balance_service = BalanceService(db_pool, config)
+    if group_id is not None:
+        group_ids = [group_id]
+    else:
+        group_ids = [row["id"] for row in await db_pool.fetch("select id from grp order by id")]
+
+    consistent = True
+    for gid in group_ids:
+        if not verify_only:
+            logger.info(f"Rebuilding balances of group {gid}")
+            await balance_service.rebuild_balances(group_id=gid)  # pylint: disable=missing-kwoa
+        mismatches = await balance_service.verify_balances(group_id=gid)  # pylint: disable=missing-kwoa
+        for mismatch in mismatches:
+            logger.error(f"Group {gid}: {mismatch}")
+        consistent = consistent and not mismatches
+    await db_pool.close()
+    logger.info(f"Checked the balances of {len(group_ids)} groups, {'no' if consistent else 'found'} mismatches")
+    return consistent
@@ -19,6 +19,18 @@ from abrechnung.framework.decorators import with_db_connection, with_db_transact
 
 from .common import _get_or_create_tag_ids
 
+# builds the json representation of an Account from a row of the full account state
+ACCOUNT_JSON = (
+    "case when a.type = 'clearing' then json_build_object("
+    "   'id', a.id, 'group_id', a.group_id, 'type', a.type, 'name', a.name, 'description', a.description, "
+    "   'date_info', a.date_info, 'tags', a.tags, 'clearing_shares', a.clearing_shares, "
+    "   'last_changed', a.last_changed, 'deleted', a.deleted"
+    ") else json_build_object("
+    "   'id', a.id, 'group_id', a.group_id, 'type', a.type, 'name', a.name, 'description', a.description, "
+    "   'owning_user_id', a.owning_user_id, 'deleted', a.deleted, 'last_changed', a.last_changed"
+    ") end"
+)
+
 
 class AccountService(Service):
     @staticmethod
@@ -114,8 +126,8 @@ class AccountService(Service):
     @staticmethod
     async def _check_account_exists(conn: asyncpg.Connection, group_id: int, account_id: int) -> int:
         acc = await conn.fetchval(
-            "select account_id from account_state_valid_at() "
-            "where group_id = $1 and account_id = $2 and not deleted",
+            "select account_id from account_state_valid_at_for_ids(array[$2]::int[]) "
+            "where group_id = $1 and not deleted",
             group_id,
             account_id,
         )
@@ -148,11 +160,14 @@ class AccountService(Service):
         return group_id, revision_id
 
     @with_db_transaction
-    async def list_accounts(self, *, conn: Connection, user: User, group_id: int) -> list[Account]:
+    async def list_accounts(
+        self, *, conn: Connection, user: User, group_id: int, valid_at: Optional[datetime] = None
+    ) -> list[Account]:
         await check_group_permissions(conn=conn, group_id=group_id, user=user)
         rows = await conn.fetch(
-            "select * " "from full_account_state_valid_at(now()) " "where group_id = $1",
+            "select * from full_account_state_valid_at_for_group($1, coalesce($2, now()))",
             group_id,
+            valid_at,
         )
         return [
             (
@@ -163,13 +178,31 @@ class AccountService(Service):
             for row in rows
         ]
 
+    @with_db_transaction
+    async def list_accounts_json(
+        self, *, conn: Connection, user: User, group_id: int, valid_at: Optional[datetime] = None
+    ) -> str:
+        """same as list_accounts but returns the accounts as a serialized json array built by the database"""
+        await check_group_permissions(conn=conn, group_id=group_id, user=user)
+        return await conn.fetchval(
+            f"select coalesce(json_agg({ACCOUNT_JSON}), '[]'::json)::text "
+            "from full_account_state_valid_at_for_group($1, coalesce($2, now())) a",
+            group_id,
+            valid_at,
+        )
+
     @with_db_connection
-    async def get_account(self, *, conn: Connection, user: User, account_id: int) -> Account:
+    async def get_account(
+        self, *, conn: Connection, user: User, account_id: int, valid_at: Optional[datetime] = None
+    ) -> Account:
         await self._check_account_permissions(conn=conn, user=user, account_id=account_id)
         row = await conn.fetchrow(
-            "select * " "from full_account_state_valid_at(now()) " "where id = $1",
+            "select * from full_account_state_valid_at_for_ids(array[$1]::int[], coalesce($2, now()))",
             account_id,
+            valid_at,
         )
+        if row is None:
+            raise NotFoundError(f"account did not exist at {valid_at}")
         if row["type"] == AccountType.clearing.value:
             return ClearingAccount.model_validate(dict(row))
         return PersonalAccount.model_validate(dict(row))
@@ -282,7 +315,7 @@ class AccountService(Service):
         revision_id = await self._create_revision(conn=conn, user=user, account_id=account_id)
 
         committed_account = await conn.fetchrow(
-            "select owning_user_id from account_state_valid_at() where account_id = $1",
+            "select owning_user_id from account_state_valid_at_for_ids(array[$1]::int[])",
             account_id,
         )
 
@@ -365,34 +398,27 @@ class AccountService(Service):
         if row is None:
             raise InvalidCommand(f"Account does not exist")
 
-        # TODO: FIXME move this check into the database
-
-        has_shares = await conn.fetchval(
-            "select 1 " "from transaction_state_valid_at() t " "where not deleted and $1 = any(involved_accounts)",
-            account_id,
-        )
-
-        has_clearing_shares = await conn.fetchval(
-            "select 1 " "from account_state_valid_at() a " "where not deleted and $1 = any(involved_accounts)",
-            account_id,
-        )
-
-        has_usages = await conn.fetchval(
-            "select 1 "
-            "from transaction_position_state_valid_at() p "
-            "join transaction t on t.id = p.transaction_id "
-            "where not p.deleted and $1 = any(p.involved_accounts)",
+        references = await conn.fetchrow(
+            "select "
+            "   exists(select from account_reference where account_id = $1 "
+            "       and referenced_by_transaction_id is not null) as has_transaction_references, "
+            "   exists(select from account_reference where account_id = $1 "
+            "       and referenced_by_account_id is not null) as has_clearing_references",
             account_id,
         )
 
-        if has_shares or has_usages:
+        if references["has_transaction_references"]:
             raise InvalidCommand(f"Cannot delete an account that is references by a transaction")
 
-        if has_clearing_shares:
+        if references["has_clearing_references"]:
             raise InvalidCommand(f"Cannot delete an account that is references by a clearing account")
 
         row = await conn.fetchrow(
-            "select name, revision_id, deleted from account_state_valid_at() where account_id = $1",
+            "select ah.revision_id, ah.name, ah.deleted "
+            "from account_history ah join account_revision ar on ah.revision_id = ar.id "
+            "where ah.id = $1 "
+            "order by ar.created_at desc, ar.id desc "
+            "limit 1",
             account_id,
         )
         if row is None:
@@ -401,14 +427,6 @@ class AccountService(Service):
         if row["deleted"]:
             raise InvalidCommand(f"Cannot delete an already deleted account")
 
-        has_clearing_shares = await conn.fetchval(
-            "select 1 " "from account_state_valid_at() p " "where not p.deleted and $1 = any(p.involved_accounts)",
-            account_id,
-        )
-
-        if has_clearing_shares:
-            raise InvalidCommand(f"Cannot delete an account that is references by another clearing account")
-
         revision_id = await conn.fetchval(
             "insert into account_revision (user_id, account_id) " "values ($1, $2) returning id",
             user.id,
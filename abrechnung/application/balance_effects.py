@@ -0,0 +1,228 @@
+"""
+Vectorized computation of the balance effects of all transactions in a group.
+
+The committed shares and position usages of a group are loaded as columnar arrays and the effect of every transaction
+on every account involved in it is computed with scatter-add operations over a sparse (transaction, account) matrix.
+The semantics are the same as in compute_transaction_balance_effect, which handles a single transaction at a time.
+"""
+
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional
+
+import numpy as np
+
+from abrechnung.domain.balances import (
+    TransactionAccountBalance,
+    TransactionBalanceEffect,
+)
+from abrechnung.framework.database import Connection
+
+# loads the latest committed state of all non-deleted transactions in a group as of a point in time. every column is
+# aggregated into a single array, transactions and positions are ordered by their id.
+_BALANCE_EFFECT_COLUMNS_QUERY = """
+with current_transaction as (
+    select distinct on (th.id) th.id, th.revision_id, th.value, th.deleted
+    from
+        transaction t
+        join transaction_history th on th.id = t.id
+        join transaction_revision tr on th.revision_id = tr.id
+    where t.group_id = $1 and tr.created_at <= coalesce($2, now())
+    order by th.id, tr.created_at desc, tr.id desc
+),
+live_transaction as (
+    select * from current_transaction where not deleted
+),
+current_item as (
+    select distinct on (pih.id) pih.id, pi.transaction_id, pih.revision_id, pih.price, pih.communist_shares, pih.deleted
+    from
+        live_transaction lt
+        join purchase_item pi on pi.transaction_id = lt.id
+        join purchase_item_history pih on pih.id = pi.id
+        join transaction_revision tr on pih.revision_id = tr.id
+    where tr.created_at <= coalesce($2, now())
+    order by pih.id, tr.created_at desc, tr.id desc
+),
+live_item as (
+    select * from current_item where not deleted
+),
+creditor as (
+    select s.transaction_id, s.account_id, s.shares
+    from live_transaction lt join creditor_share s on s.transaction_id = lt.id and s.revision_id = lt.revision_id
+),
+debitor as (
+    select s.transaction_id, s.account_id, s.shares
+    from live_transaction lt join debitor_share s on s.transaction_id = lt.id and s.revision_id = lt.revision_id
+),
+item_usage as (
+    select u.item_id, u.account_id, u.share_amount
+    from live_item li join purchase_item_usage u on u.item_id = li.id and u.revision_id = li.revision_id
+)
+select
+    array(select id from live_transaction order by id) as transaction_ids,
+    array(select value from live_transaction order by id) as transaction_values,
+    array(select transaction_id from creditor) as creditor_transaction_ids,
+    array(select account_id from creditor) as creditor_account_ids,
+    array(select shares from creditor) as creditor_shares,
+    array(select transaction_id from debitor) as debitor_transaction_ids,
+    array(select account_id from debitor) as debitor_account_ids,
+    array(select shares from debitor) as debitor_shares,
+    array(select id from live_item order by id) as item_ids,
+    array(select transaction_id from live_item order by id) as item_transaction_ids,
+    array(select price from live_item order by id) as item_prices,
+    array(select communist_shares from live_item order by id) as item_communist_shares,
+    array(select item_id from item_usage) as usage_item_ids,
+    array(select account_id from item_usage) as usage_account_ids,
+    array(select share_amount from item_usage) as usage_shares
+"""
+
+_ID_COLUMNS = {
+    "transaction_ids",
+    "creditor_transaction_ids",
+    "creditor_account_ids",
+    "debitor_transaction_ids",
+    "debitor_account_ids",
+    "item_ids",
+    "item_transaction_ids",
+    "usage_item_ids",
+    "usage_account_ids",
+}
+
+
+@dataclass
+class BalanceEffectColumns:
+    """
+    The committed shares and position usages of a set of transactions in columnar form.
+    transaction_ids and item_ids must be sorted in ascending order.
+    """
+
+    transaction_ids: np.ndarray
+    transaction_values: np.ndarray
+
+    creditor_transaction_ids: np.ndarray
+    creditor_account_ids: np.ndarray
+    creditor_shares: np.ndarray
+
+    debitor_transaction_ids: np.ndarray
+    debitor_account_ids: np.ndarray
+    debitor_shares: np.ndarray
+
+    item_ids: np.ndarray
+    item_transaction_ids: np.ndarray
+    item_prices: np.ndarray
+    item_communist_shares: np.ndarray
+
+    usage_item_ids: np.ndarray
+    usage_account_ids: np.ndarray
+    usage_shares: np.ndarray
+
+
+@dataclass
+class BalanceEffects:
+    """
+    The effect of every transaction on every account involved in it as a sparse (transaction, account) matrix in
+    coordinate form, one entry per pair ordered by transaction id and account id.
+    """
+
+    transaction_ids: np.ndarray
+    account_ids: np.ndarray
+    total: np.ndarray
+    positions: np.ndarray
+    common_creditors: np.ndarray
+    common_debitors: np.ndarray
+
+    def for_transaction(self, transaction_id: int) -> TransactionBalanceEffect:
+        start, end = np.searchsorted(self.transaction_ids, [transaction_id, transaction_id + 1])
+        return {
+            int(self.account_ids[i]): TransactionAccountBalance(
+                total=float(self.total[i]),
+                positions=float(self.positions[i]),
+                common_creditors=float(self.common_creditors[i]),
+                common_debitors=float(self.common_debitors[i]),
+            )
+            for i in range(start, end)
+        }
+
+
+async def load_balance_effect_columns(
+    conn: Connection, group_id: int, valid_at: Optional[datetime] = None
+) -> BalanceEffectColumns:
+    """load the committed shares and position usages of all transactions in a group, as of valid_at if given"""
+    row = await conn.fetchrow(_BALANCE_EFFECT_COLUMNS_QUERY, group_id, valid_at)
+    return BalanceEffectColumns(
+        **{
+            column: np.array(values, dtype=np.int64 if column in _ID_COLUMNS else np.float64)
+            for column, values in row.items()
+        }
+    )
+
+
+def compute_balance_effects(columns: BalanceEffectColumns) -> BalanceEffects:
+    """
+    Compute the effect of every transaction on the balances of all accounts involved in it.
+
+    Memory and runtime are linear in the number of share and usage rows, no dense (transaction, account) matrix
+    is ever built.
+    """
+    n_transactions = len(columns.transaction_ids)
+    n_items = len(columns.item_ids)
+
+    # positions are billed to their users proportionally to their usages
+    item_transaction = np.searchsorted(columns.transaction_ids, columns.item_transaction_ids)
+    usage_item = np.searchsorted(columns.item_ids, columns.usage_item_ids)
+    total_usages = columns.item_communist_shares + np.bincount(
+        usage_item, weights=columns.usage_shares, minlength=n_items
+    )
+    price_per_share = np.divide(columns.item_prices, total_usages, out=np.zeros(n_items), where=total_usages > 0)
+    usage_values = price_per_share[usage_item] * columns.usage_shares
+
+    # whatever is not covered by usages (including the communist shares) is split among the debitors
+    remaining_values = (
+        columns.transaction_values
+        - np.bincount(item_transaction, weights=columns.item_prices, minlength=n_transactions)
+        + np.bincount(
+            item_transaction, weights=price_per_share * columns.item_communist_shares, minlength=n_transactions
+        )
+    )
+
+    debitor_transaction = np.searchsorted(columns.transaction_ids, columns.debitor_transaction_ids)
+    total_debitor_shares = np.bincount(debitor_transaction, weights=columns.debitor_shares, minlength=n_transactions)
+    debitor_value_per_share = np.divide(
+        remaining_values, total_debitor_shares, out=np.zeros(n_transactions), where=total_debitor_shares > 0
+    )
+    debitor_values = debitor_value_per_share[debitor_transaction] * columns.debitor_shares
+
+    creditor_transaction = np.searchsorted(columns.transaction_ids, columns.creditor_transaction_ids)
+    total_creditor_shares = np.bincount(creditor_transaction, weights=columns.creditor_shares, minlength=n_transactions)
+    creditor_value_per_share = np.divide(
+        columns.transaction_values,
+        total_creditor_shares,
+        out=np.zeros(n_transactions),
+        where=total_creditor_shares > 0,
+    )
+    creditor_values = creditor_value_per_share[creditor_transaction] * columns.creditor_shares
+
+    # scatter all contributions into the (transaction, account) entries they belong to
+    transactions = np.concatenate([item_transaction[usage_item], debitor_transaction, creditor_transaction])
+    account_ids, accounts = np.unique(
+        np.concatenate([columns.usage_account_ids, columns.debitor_account_ids, columns.creditor_account_ids]),
+        return_inverse=True,
+    )
+    n_accounts = max(len(account_ids), 1)
+    entries, entry = np.unique(transactions * n_accounts + accounts, return_inverse=True)
+    n_entries = len(entries)
+
+    n_usages = len(usage_values)
+    n_debitors = len(debitor_values)
+    positions = np.bincount(entry[:n_usages], weights=usage_values, minlength=n_entries)
+    common_debitors = np.bincount(entry[n_usages : n_usages + n_debitors], weights=debitor_values, minlength=n_entries)
+    common_creditors = np.bincount(entry[n_usages + n_debitors :], weights=creditor_values, minlength=n_entries)
+
+    return BalanceEffects(
+        transaction_ids=columns.transaction_ids[entries // n_accounts],
+        account_ids=account_ids[entries % n_accounts],
+        total=common_creditors - positions - common_debitors,
+        positions=positions,
+        common_creditors=common_creditors,
+        common_debitors=common_debitors,
+    )
@@ -0,0 +1,399 @@
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
+from typing import Iterator, Optional
+
+import numpy as np
+
+from abrechnung.application.balance_effects import (
+    BalanceEffects,
+    compute_balance_effects,
+    load_balance_effect_columns,
+)
+from abrechnung.application.settlement import compute_settlement
+from abrechnung.core.auth import check_group_permissions
+from abrechnung.core.errors import NotFoundError
+from abrechnung.core.service import Service
+from abrechnung.domain.accounts import (
+    Account,
+    AccountType,
+    ClearingAccount,
+    PersonalAccount,
+)
+from abrechnung.domain.balances import (
+    AccountBalance,
+    AccountBalanceMap,
+    BalanceChangeOrigin,
+    BalanceChangeOriginType,
+    BalanceHistoryEntry,
+    BalanceHistoryInterval,
+    SettlementMode,
+    SettlementPlan,
+    TransactionAccountBalance,
+    TransactionBalanceEffect,
+)
+from abrechnung.domain.transactions import Transaction
+from abrechnung.domain.users import User
+from abrechnung.framework.database import Connection
+from abrechnung.framework.decorators import with_db_transaction
+
+# absolute deviation up to which stored and recomputed balances are considered equal, stored balances accumulate
+# floating point rounding errors as effects are repeatedly added and taken back
+BALANCE_TOLERANCE = 1e-6
+# number of (group, settlement mode) pairs whose settlement plan is kept in memory
+SETTLEMENT_CACHE_SIZE = 1024
+
+
+def compute_transaction_balance_effect(transaction: Transaction) -> TransactionBalanceEffect:
+    """
+    Compute how a single transaction changes the balances of all accounts involved in it.
+
+    Purchase items are billed to their users proportionally to their usages, whatever remains of an item after
+    usages (its communist shares) is added back onto the transaction value which is split among the debitors.
+    """
+    effect: TransactionBalanceEffect = {}
+
+    def _get(account_id: int) -> TransactionAccountBalance:
+        if account_id not in effect:
+            effect[account_id] = TransactionAccountBalance()
+        return effect[account_id]
+
+    remaining_value = transaction.value
+    for position in transaction.positions:
+        if position.deleted:
+            continue
+
+        total_usages = position.communist_shares + sum(position.usages.values())
+        price_per_share = position.price / total_usages if total_usages > 0 else 0.0
+
+        for account_id, usage in position.usages.items():
+            _get(account_id).positions += price_per_share * usage
+
+        # the part of the item not covered by usages is billed to the communist shares
+        remaining_value = remaining_value - position.price + price_per_share * position.communist_shares
+
+    total_debitor_shares = sum(transaction.debitor_shares.values())
+    total_creditor_shares = sum(transaction.creditor_shares.values())
+
+    debitor_value_per_share = remaining_value / total_debitor_shares if total_debitor_shares > 0 else 0.0
+    for account_id, shares in transaction.debitor_shares.items():
+        _get(account_id).common_debitors += debitor_value_per_share * shares
+
+    creditor_value_per_share = transaction.value / total_creditor_shares if total_creditor_shares > 0 else 0.0
+    for account_id, shares in transaction.creditor_shares.items():
+        _get(account_id).common_creditors += creditor_value_per_share * shares
+
+    for balance in effect.values():
+        balance.total = balance.common_creditors - balance.positions - balance.common_debitors
+
+    return effect
+
+
+def _clearing_account_order(clearing_shares: dict[int, dict[int, float]]) -> list[int]:
+    """
+    Linearize the clearing account dependency graph such that every clearing account is resolved before
+    all clearing accounts it distributes its balance onto.
+    """
+    in_degree: dict[int, int] = {account_id: 0 for account_id in clearing_shares}
+    for shares in clearing_shares.values():
+        for share_account_id in shares:
+            if share_account_id in in_degree:
+                in_degree[share_account_id] += 1
+
+    to_visit = [account_id for account_id, degree in in_degree.items() if degree == 0]
+    order = []
+    while to_visit:
+        account_id = to_visit.pop()
+        order.append(account_id)
+        for share_account_id in clearing_shares[account_id]:
+            if share_account_id not in in_degree:
+                continue
+            in_degree[share_account_id] -= 1
+            if in_degree[share_account_id] == 0:
+                to_visit.append(share_account_id)
+
+    return order
+
+
+def _resolve_clearing_accounts(accounts: list[Account], balances: AccountBalanceMap):
+    """redistribute the balances of all clearing accounts onto the accounts they share their balance with"""
+    for balance in balances.values():
+        balance.before_clearing = balance.balance
+
+    clearing_shares = {
+        account.id: account.clearing_shares
+        for account in accounts
+        if isinstance(account, ClearingAccount) and account.clearing_shares
+    }
+    for clearing_account_id in _clearing_account_order(clearing_shares):
+        shares = clearing_shares[clearing_account_id]
+        clearing_balance = balances.get(clearing_account_id)
+        if clearing_balance is None:
+            continue
+
+        to_split = clearing_balance.balance
+        clearing_balance.balance = 0
+        total_shares = sum(shares.values())
+        for account_id, n_shares in shares.items():
+            account_share = to_split * n_shares / total_shares
+            clearing_balance.clearing_resolution[account_id] = (
+                clearing_balance.clearing_resolution.get(account_id, 0.0) + account_share
+            )
+
+            balance = balances.get(account_id)
+            if balance is None:
+                continue
+            balance.balance += account_share
+            if account_share > 0:
+                balance.total_paid += abs(account_share)
+            else:
+                balance.total_consumed += abs(account_share)
+
+
+def compute_account_balances(accounts: list[Account], transactions: list[Transaction]) -> AccountBalanceMap:
+    """
+    Compute the balances of all given accounts from the given transactions, including the redistribution
+    of clearing account balances.
+    """
+    balances: AccountBalanceMap = {account.id: AccountBalance() for account in accounts}
+
+    for transaction in transactions:
+        if transaction.deleted:
+            continue
+        for account_id, effect in compute_transaction_balance_effect(transaction).items():
+            balance = balances.get(account_id)
+            if balance is None:
+                continue
+            balance.balance += effect.total
+            balance.total_consumed += effect.common_debitors + effect.positions
+            balance.total_paid += effect.common_creditors
+
+    _resolve_clearing_accounts(accounts, balances)
+    return balances
+
+
+def _account_balance_sums(effects: BalanceEffects) -> Iterator[tuple[int, float, float, float]]:
+    """sum up the balance effects per account, yields (account_id, balance, total_paid, total_consumed)"""
+    account_ids, entry_account = np.unique(effects.account_ids, return_inverse=True)
+    totals = np.bincount(entry_account, weights=effects.total, minlength=len(account_ids))
+    paid = np.bincount(entry_account, weights=effects.common_creditors, minlength=len(account_ids))
+    consumed = np.bincount(
+        entry_account, weights=effects.common_debitors + effects.positions, minlength=len(account_ids)
+    )
+    return zip(account_ids.tolist(), totals.tolist(), paid.tolist(), consumed.tolist())
+
+
+def compute_account_balances_from_effects(accounts: list[Account], effects: BalanceEffects) -> AccountBalanceMap:
+    """
+    Compute the balances of all given accounts from the precomputed balance effects of all transactions,
+    including the redistribution of clearing account balances.
+    """
+    balances: AccountBalanceMap = {account.id: AccountBalance() for account in accounts}
+
+    for account_id, total, total_paid, total_consumed in _account_balance_sums(effects):
+        balance = balances.get(account_id)
+        if balance is None:
+            continue
+        balance.balance += total
+        balance.total_consumed += total_consumed
+        balance.total_paid += total_paid
+
+    _resolve_clearing_accounts(accounts, balances)
+    return balances
+
+
+def _interval_start(day: date, interval: BalanceHistoryInterval) -> date:
+    """first day of the interval containing the given day, equivalent to date_trunc in postgres"""
+    if interval == BalanceHistoryInterval.week:
+        return day - timedelta(days=day.weekday())
+    if interval == BalanceHistoryInterval.month:
+        return day.replace(day=1)
+    return day
+
+
+class BalanceService(Service):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # least recently used cache of settlement plans, maps (group_id, mode) to the sequence number of the last
+        # committed change in the group the plan was computed at and the plan itself
+        self._settlement_cache: OrderedDict[tuple[int, SettlementMode], tuple[int, SettlementPlan]] = OrderedDict()
+
+    @staticmethod
+    async def _current_balances(conn: Connection, group_id: int, accounts: list[Account]) -> AccountBalanceMap:
+        # the balances before clearing are maintained incrementally whenever a transaction revision is committed
+        rows = await conn.fetch(
+            "select account_id, balance, total_paid, total_consumed from account_balance where group_id = $1",
+            group_id,
+        )
+        balances: AccountBalanceMap = {account.id: AccountBalance() for account in accounts}
+        for row in rows:
+            balance = balances.get(row["account_id"])
+            if balance is None:
+                continue
+            balance.balance = row["balance"]
+            balance.total_paid = row["total_paid"]
+            balance.total_consumed = row["total_consumed"]
+
+        _resolve_clearing_accounts(accounts, balances)
+        return balances
+
+    @staticmethod
+    async def _list_accounts(conn: Connection, group_id: int, valid_at: Optional[datetime]) -> list[Account]:
+        rows = await conn.fetch(
+            "select * from full_account_state_valid_at_for_group($1, coalesce($2, now())) where not deleted",
+            group_id,
+            valid_at,
+        )
+        return [
+            (
+                ClearingAccount.model_validate(dict(row))
+                if row["type"] == AccountType.clearing.value
+                else PersonalAccount.model_validate(dict(row))
+            )
+            for row in rows
+        ]
+
+    @with_db_transaction
+    async def get_balances(
+        self, *, conn: Connection, user: User, group_id: int, valid_at: Optional[datetime] = None
+    ) -> AccountBalanceMap:
+        """compute the balances of all accounts in a group, as of valid_at if given"""
+        await check_group_permissions(conn=conn, group_id=group_id, user=user)
+        accounts = await self._list_accounts(conn=conn, group_id=group_id, valid_at=valid_at)
+        if valid_at is None:
+            return await self._current_balances(conn=conn, group_id=group_id, accounts=accounts)
+
+        columns = await load_balance_effect_columns(conn=conn, group_id=group_id, valid_at=valid_at)
+        return compute_account_balances_from_effects(accounts=accounts, effects=compute_balance_effects(columns))
+
+    @with_db_transaction
+    async def get_settlement(
+        self, *, conn: Connection, user: User, group_id: int, mode: SettlementMode = SettlementMode.greedy
+    ) -> SettlementPlan:
+        """compute a plan of transfers which settles the current balances of all accounts in a group"""
+        await check_group_permissions(conn=conn, group_id=group_id, user=user)
+        # every committed change to a transaction or account of the group increments its change sequence
+        last_seq = await conn.fetchval(
+            "select coalesce((select last_seq from group_change_sequence where group_id = $1), 0)", group_id
+        )
+        cache_key = (group_id, mode)
+        cached = self._settlement_cache.get(cache_key)
+        if cached is not None and cached[0] == last_seq:
+            self._settlement_cache.move_to_end(cache_key)
+            return [transfer.model_copy() for transfer in cached[1]]
+
+        accounts = await self._list_accounts(conn=conn, group_id=group_id, valid_at=None)
+        balances = await self._current_balances(conn=conn, group_id=group_id, accounts=accounts)
+        plan = compute_settlement({account_id: b.balance for account_id, b in balances.items()}, mode=mode)
+
+        self._settlement_cache[cache_key] = (last_seq, plan)
+        self._settlement_cache.move_to_end(cache_key)
+        if len(self._settlement_cache) > SETTLEMENT_CACHE_SIZE:
+            self._settlement_cache.popitem(last=False)
+        return [transfer.model_copy() for transfer in plan]
+
+    @with_db_transaction
+    async def get_account_balance_history(
+        self, *, conn: Connection, user: User, account_id: int, interval: Optional[BalanceHistoryInterval] = None
+    ) -> list[BalanceHistoryEntry]:
+        """
+        compute the running balance of an account over time, optionally aggregated into daily, weekly or monthly
+        intervals. transactions change the balance at their billing date, clearing accounts at their date.
+        """
+        group_id = await conn.fetchval("select group_id from account where id = $1", account_id)
+        if group_id is None:
+            raise NotFoundError("account not found")
+        await check_group_permissions(conn=conn, group_id=group_id, user=user)
+
+        # clearing account resolutions depend on the balances of the clearing accounts and are therefore not part
+        # of the ledger, they are few enough to be merged in after resolving the current balances of the group
+        accounts = await self._list_accounts(conn=conn, group_id=group_id, valid_at=None)
+        balances = await self._current_balances(conn=conn, group_id=group_id, accounts=accounts)
+        clearing_changes = []
+        for account in accounts:
+            if not isinstance(account, ClearingAccount):
+                continue
+            resolution = balances[account.id].clearing_resolution
+            if account_id in resolution:
+                clearing_changes.append(
+                    (account.date_info, BalanceChangeOriginType.clearing, account.id, resolution[account_id])
+                )
+
+        if interval is None:
+            rows = await conn.fetch(
+                "select transaction_id, billed_at, common_creditors - positions - common_debitors as change "
+                "from transaction_balance_effect where account_id = $1",
+                account_id,
+            )
+            changes = [
+                (row["billed_at"], BalanceChangeOriginType.transaction, row["transaction_id"], row["change"])
+                for row in rows
+            ] + clearing_changes
+            # transactions come before clearing accounts on the same day
+            changes.sort(key=lambda c: (c[0], c[1] != BalanceChangeOriginType.transaction, c[2]))
+
+            history = []
+            balance = 0.0
+            for day, origin_type, origin_id, change in changes:
+                balance += change
+                history.append(
+                    BalanceHistoryEntry(
+                        date=day,
+                        change=change,
+                        balance=balance,
+                        change_origin=BalanceChangeOrigin(type=origin_type, id=origin_id),
+                    )
+                )
+            return history
+
+        rows = await conn.fetch(
+            "select date_trunc($2, billed_at::timestamp)::date as interval_start, "
+            "   sum(common_creditors - positions - common_debitors) as change, count(*) as n_changes "
+            "from transaction_balance_effect where account_id = $1 "
+            "group by interval_start",
+            account_id,
+            interval.value,
+        )
+        intervals = {row["interval_start"]: (row["change"], row["n_changes"]) for row in rows}
+        for day, _, _, change in clearing_changes:
+            interval_change, n_changes = intervals.get(_interval_start(day, interval), (0.0, 0))
+            intervals[_interval_start(day, interval)] = (interval_change + change, n_changes + 1)
+
+        history = []
+        balance = 0.0
+        for interval_start in sorted(intervals.keys()):
+            change, n_changes = intervals[interval_start]
+            balance += change
+            history.append(
+                BalanceHistoryEntry(date=interval_start, change=change, balance=balance, n_changes=n_changes)
+            )
+        return history
+
+    @with_db_transaction
+    async def rebuild_balances(self, *, conn: Connection, group_id: int):
+        """recompute the stored transaction balance effects and account balances of a group from scratch"""
+        await conn.execute("call rebuild_group_balances($1)", group_id)
+
+    @with_db_transaction
+    async def verify_balances(self, *, conn: Connection, group_id: int) -> list[str]:
+        """
+        compare the stored account balances of a group against balances computed from its full transaction history,
+        returns a description of every mismatch
+        """
+        rows = await conn.fetch(
+            "select account_id, balance, total_paid, total_consumed from account_balance where group_id = $1",
+            group_id,
+        )
+        stored = {row["account_id"]: (row["balance"], row["total_paid"], row["total_consumed"]) for row in rows}
+
+        columns = await load_balance_effect_columns(conn=conn, group_id=group_id)
+        mismatches = []
+        for account_id, *expected in _account_balance_sums(compute_balance_effects(columns)):
+            actual = stored.pop(account_id, (0.0, 0.0, 0.0))
+            if not np.allclose(actual, expected, rtol=0, atol=BALANCE_TOLERANCE):
+                mismatches.append(
+                    f"account {account_id}: stored (balance, paid, consumed) {actual} but computed {tuple(expected)}"
+                )
+        for account_id, actual in stored.items():
+            if not np.allclose(actual, 0, rtol=0, atol=BALANCE_TOLERANCE):
+                mismatches.append(f"account {account_id}: stored (balance, paid, consumed) {actual} but not involved")
+        return mismatches
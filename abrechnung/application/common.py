@@ -12,13 +12,13 @@ async def _get_or_create_tag_ids(*, conn: asyncpg.Connection, group_id: int, tag
         tags,
     )
     tag_ids = [t["id"] for t in tag_rows]
-    existing_tag_names = [t["name"] for t in tag_rows]
-    for t in tags:
-        if t not in existing_tag_names:
-            tag_id = await conn.fetchval(
-                "insert into tag (group_id, name) values ($1, $2) returning id",
-                group_id,
-                t,
-            )
-            tag_ids.append(tag_id)
+    existing_tag_names = {t["name"] for t in tag_rows}
+    new_tags = list(dict.fromkeys(t for t in tags if t not in existing_tag_names))
+    if new_tags:
+        new_tag_rows = await conn.fetch(
+            "insert into tag (group_id, name) select $1, name from unnest($2::varchar(255)[]) as name returning id",
+            group_id,
+            new_tags,
+        )
+        tag_ids.extend(t["id"] for t in new_tag_rows)
     return tag_ids
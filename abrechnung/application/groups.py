@@ -5,14 +5,16 @@ import asyncpg
 from abrechnung.core.auth import check_group_permissions, create_group_log
 from abrechnung.core.errors import InvalidCommand, NotFoundError
 from abrechnung.core.service import Service
-from abrechnung.domain.accounts import AccountType
+from abrechnung.domain.accounts import AccountType, ClearingAccount, PersonalAccount
 from abrechnung.domain.groups import (
     Group,
+    GroupChanges,
     GroupInvite,
     GroupLog,
     GroupMember,
     GroupPreview,
 )
+from abrechnung.domain.transactions import Transaction
 from abrechnung.domain.users import User
 from abrechnung.framework.database import Connection
 from abrechnung.framework.decorators import with_db_transaction
@@ -136,6 +138,8 @@ class GroupService(Service):
             "",
             user.id,
         )
+        # commit the revision to have all associated constraints and triggers run
+        await conn.execute("update account_revision set created_at = now() where id = $1", revision_id)
         return account_id
 
     @with_db_transaction
@@ -434,6 +438,49 @@ class GroupService(Service):
             group_id,
         )
 
+    @with_db_transaction
+    async def list_changes(self, *, conn: Connection, user: User, group_id: int, since: int = 0) -> GroupChanges:
+        await check_group_permissions(conn=conn, group_id=group_id, user=user)
+        seq = await conn.fetchval("select last_seq from group_change_sequence where group_id = $1", group_id)
+
+        transactions = await conn.fetch_many(
+            Transaction,
+            "select ts.transaction_id as id, ts.type, ts.group_id, ts.last_changed, ts.value, ts.currency_symbol, "
+            "   ts.currency_conversion_rate, ts.name, ts.description, ts.billed_at, ts.deleted, ts.creditor_shares, "
+            "   ts.debitor_shares, ts.tags, ts.positions, ts.files "
+            "from transaction t join transaction_state ts on t.id = ts.transaction_id "
+            "where t.group_id = $1 and t.change_seq > $2 and t.change_seq <= $3",
+            group_id,
+            since,
+            seq or 0,
+        )
+        for transaction in transactions:
+            for attachment in transaction.files:
+                attachment.host_url = self.cfg.service.api_url
+
+        changed_account_ids = await conn.fetch(
+            "select id from account where group_id = $1 and change_seq > $2 and change_seq <= $3",
+            group_id,
+            since,
+            seq or 0,
+        )
+        accounts = []
+        if changed_account_ids:
+            rows = await conn.fetch(
+                "select * from full_account_state_valid_at_for_ids($1::int[])",
+                [row["id"] for row in changed_account_ids],
+            )
+            accounts = [
+                (
+                    ClearingAccount.model_validate(dict(row))
+                    if row["type"] == AccountType.clearing.value
+                    else PersonalAccount.model_validate(dict(row))
+                )
+                for row in rows
+            ]
+
+        return GroupChanges(seq=seq or 0, transactions=transactions, accounts=accounts)
+
     @with_db_transaction
     async def send_group_message(self, *, conn: Connection, user: User, group_id: int, message: str):
         await check_group_permissions(conn=conn, group_id=group_id, user=user, can_write=True)
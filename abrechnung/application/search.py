@@ -0,0 +1,31 @@
+from abrechnung.core.auth import check_group_permissions
+from abrechnung.core.service import Service
+from abrechnung.domain.search import SearchHit
+from abrechnung.domain.users import User
+from abrechnung.framework.database import Connection
+from abrechnung.framework.decorators import with_db_transaction
+
+
+class SearchService(Service):
+    @with_db_transaction
+    async def search(self, *, conn: Connection, user: User, group_id: int, query: str, limit: int) -> list[SearchHit]:
+        """
+        Search the current state of all transactions and accounts in a group, every word of the query has to match
+        the start of a word in a transaction's or account's name, tags, description or purchase item names.
+        Hits are ordered by relevance, matches in names and tags rank higher than in descriptions and purchase items.
+        """
+        await check_group_permissions(conn=conn, group_id=group_id, user=user)
+        return await conn.fetch_many(
+            SearchHit,
+            "select "
+            "   case when sd.transaction_id is not null then 'transaction' else 'account' end as type, "
+            "   coalesce(sd.transaction_id, sd.account_id) as id, "
+            "   ts_rank(sd.document, q.query) as rank "
+            "from search_document sd, search_prefix_query($2) q(query) "
+            "where sd.group_id = $1 and sd.document @@ q.query "
+            "order by rank desc, type, id "
+            "limit $3",
+            group_id,
+            query,
+            limit,
+        )
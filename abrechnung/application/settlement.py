@@ -0,0 +1,174 @@
+import heapq
+from collections import defaultdict
+
+from abrechnung.core.errors import InvalidCommand
+from abrechnung.domain.balances import (
+    SettlementMode,
+    SettlementPlan,
+    SettlementTransfer,
+)
+
+# balances are settled in integer cents such that accounts with exactly opposite balances can be matched reliably
+SETTLEMENT_PRECISION = 100
+# the exact minimum transfer solver enumerates all subsets of accounts with a non-zero balance
+MAX_MIN_TRANSFERS_ACCOUNTS = 14
+
+# (paying account, receiving account, amount in cents)
+_Transfer = tuple[int, int, int]
+
+
+class _SettlementSide:
+    """
+    The remaining amounts of either all creditors or all debitors, accessible both by the largest amount via a heap
+    and by exact amount. Heap entries are invalidated lazily once the amount of an account changes.
+    """
+
+    def __init__(self, amounts: dict[int, int]):
+        self.amounts = dict(amounts)
+        self.by_amount: dict[int, set[int]] = defaultdict(set)
+        for account_id, amount in self.amounts.items():
+            self.by_amount[amount].add(account_id)
+        self.heap = [(-amount, account_id) for account_id, amount in self.amounts.items()]
+        heapq.heapify(self.heap)
+
+    def __bool__(self) -> bool:
+        return bool(self.amounts)
+
+    def pop_exact(self, amount: int) -> int | None:
+        account_ids = self.by_amount.get(amount)
+        if not account_ids:
+            return None
+        account_id = min(account_ids)
+        self.remove(account_id)
+        return account_id
+
+    def pop_largest(self) -> tuple[int, int]:
+        while True:
+            amount, account_id = heapq.heappop(self.heap)
+            if self.amounts.get(account_id) == -amount:
+                self.remove(account_id)
+                return account_id, -amount
+
+    def remove(self, account_id: int):
+        amount = self.amounts.pop(account_id)
+        self.by_amount[amount].discard(account_id)
+
+    def push(self, account_id: int, amount: int):
+        self.amounts[account_id] = amount
+        self.by_amount[amount].add(account_id)
+        heapq.heappush(self.heap, (-amount, account_id))
+
+
+def _settle_greedy(balances: dict[int, int]) -> list[_Transfer]:
+    """
+    Settle the given balances by repeatedly matching the largest creditor with the largest debitor. Accounts with
+    exactly opposite (remaining) balances are always settled with each other directly, every transfer therefore
+    settles at least one account.
+    """
+    creditors = _SettlementSide({account_id: amount for account_id, amount in balances.items() if amount > 0})
+    debitors = _SettlementSide({account_id: -amount for account_id, amount in balances.items() if amount < 0})
+    transfers: list[_Transfer] = []
+
+    for debitor_id, amount in sorted(debitors.amounts.items()):
+        creditor_id = creditors.pop_exact(amount)
+        if creditor_id is not None:
+            debitors.remove(debitor_id)
+            transfers.append((debitor_id, creditor_id, amount))
+
+    while creditors and debitors:
+        creditor_id, credit = creditors.pop_largest()
+        debitor_id, debit = debitors.pop_largest()
+        amount = min(credit, debit)
+        transfers.append((debitor_id, creditor_id, amount))
+
+        if credit > amount:
+            remaining_id, remaining, side, other_side = creditor_id, credit - amount, creditors, debitors
+        elif debit > amount:
+            remaining_id, remaining, side, other_side = debitor_id, debit - amount, debitors, creditors
+        else:
+            continue
+
+        match_id = other_side.pop_exact(remaining)
+        if match_id is None:
+            side.push(remaining_id, remaining)
+        elif side is creditors:
+            transfers.append((match_id, remaining_id, remaining))
+        else:
+            transfers.append((remaining_id, match_id, remaining))
+
+    return transfers
+
+
+def _settle_min_transfers(balances: dict[int, int]) -> list[_Transfer]:
+    """
+    Settle the given balances with the minimum number of transfers. A set of n accounts whose balances sum up to zero
+    can always be settled with n - 1 transfers, the minimum is therefore reached by partitioning the accounts into
+    the maximum number of zero-sum subsets, which are found by dynamic programming over all subsets of accounts.
+    """
+    account_ids = sorted(account_id for account_id, amount in balances.items() if amount != 0)
+    n_accounts = len(account_ids)
+    if n_accounts > MAX_MIN_TRANSFERS_ACCOUNTS:
+        raise InvalidCommand(
+            f"the minimum number of transfers can only be computed for up to {MAX_MIN_TRANSFERS_ACCOUNTS} accounts "
+            f"with a non-zero balance, this group has {n_accounts}"
+        )
+
+    n_subsets = 1 << n_accounts
+    subset_sums = [0] * n_subsets
+    for subset in range(1, n_subsets):
+        lowest = (subset & -subset).bit_length() - 1
+        subset_sums[subset] = subset_sums[subset & (subset - 1)] + balances[account_ids[lowest]]
+
+    # max_groups[subset] is the maximum number of zero-sum groups the accounts of the subset can be ordered into
+    max_groups = [0] * n_subsets
+    for subset in range(1, n_subsets):
+        best = 0
+        remaining = subset
+        while remaining:
+            bit = remaining & -remaining
+            best = max(best, max_groups[subset ^ bit])
+            remaining ^= bit
+        max_groups[subset] = best + (1 if subset_sums[subset] == 0 else 0)
+
+    # walk back from the full set, every zero-sum subset on the way closes one group
+    groups: list[list[int]] = []
+    current_group: list[int] = []
+    subset = n_subsets - 1
+    while subset:
+        if subset_sums[subset] == 0 and current_group:
+            groups.append(current_group)
+            current_group = []
+        remaining = subset
+        while remaining:
+            bit = remaining & -remaining
+            target = max_groups[subset] - (1 if subset_sums[subset] == 0 else 0)
+            if max_groups[subset ^ bit] == target:
+                current_group.append(account_ids[bit.bit_length() - 1])
+                subset ^= bit
+                break
+            remaining ^= bit
+    if current_group:
+        groups.append(current_group)
+
+    transfers: list[_Transfer] = []
+    for group in groups:
+        transfers.extend(_settle_greedy({account_id: balances[account_id] for account_id in group}))
+    return transfers
+
+
+def compute_settlement(balances: dict[int, float], mode: SettlementMode = SettlementMode.greedy) -> SettlementPlan:
+    """
+    Compute a plan of transfers which settles all given account balances, i.e. after which all balances are zero.
+    Accounts with a positive balance receive money, accounts with a negative balance pay.
+    """
+    cents = {account_id: round(balance * SETTLEMENT_PRECISION) for account_id, balance in balances.items()}
+    if mode == SettlementMode.min_transfers:
+        transfers = _settle_min_transfers(cents)
+    else:
+        transfers = _settle_greedy(cents)
+
+    return [
+        SettlementTransfer(creditor_id=creditor_id, debitor_id=debitor_id, payment_amount=amount / SETTLEMENT_PRECISION)
+        for creditor_id, debitor_id, amount in transfers
+        if amount != 0
+    ]
@@ -1,6 +1,10 @@
 import base64
-from datetime import datetime
-from typing import Optional, Union
+import binascii
+import csv
+import io
+import json
+from datetime import date, datetime
+from typing import Any, AsyncIterator, Callable, Optional, Union
 
 import asyncpg
 
@@ -13,7 +17,10 @@ from abrechnung.domain.transactions import (
     NewTransaction,
     NewTransactionPosition,
     Transaction,
+    TransactionExport,
+    TransactionFilter,
     TransactionPosition,
+    TransactionSortOrder,
     TransactionType,
     UpdateFile,
     UpdateTransaction,
@@ -22,6 +29,154 @@ from abrechnung.domain.users import User
 from abrechnung.framework.database import Connection
 from abrechnung.framework.decorators import with_db_transaction
 
+# number of bytes fetched from the database at once when streaming file attachments
+FILE_CHUNK_SIZE = 256 * 1024
+
+# number of transactions fetched from the database at once when exporting transactions
+EXPORT_BATCH_SIZE = 500
+# size in bytes up to which exported rows are buffered before being handed to the client
+EXPORT_CHUNK_SIZE = 64 * 1024
+
+# builds the json representation of a Transaction from a row of the full transaction state, $1 is the api host url
+TRANSACTION_JSON = (
+    "json_build_object("
+    "   'id', t.id, 'group_id', t.group_id, 'type', t.type, 'name', t.name, 'description', t.description, "
+    "   'value', t.value, 'currency_symbol', t.currency_symbol, "
+    "   'currency_conversion_rate', t.currency_conversion_rate, "
+    "   'billed_at', t.billed_at, 'tags', t.tags, 'deleted', t.deleted, 'creditor_shares', t.creditor_shares, "
+    "   'debitor_shares', t.debitor_shares, 'last_changed', t.last_changed, "
+    "   'positions', ("
+    "       select coalesce(json_agg(json_build_object("
+    "           'id', p -> 'id', 'name', p -> 'name', 'price', p -> 'price', "
+    "           'communist_shares', p -> 'communist_shares', "
+    "           'usages', p -> 'usages', 'deleted', p -> 'deleted'"
+    "       )), '[]'::json) "
+    "       from json_array_elements(t.positions) p"
+    "   ), "
+    "   'files', ("
+    "       select coalesce(json_agg(json_build_object("
+    "           'id', f -> 'id', 'filename', f -> 'filename', 'blob_id', f -> 'blob_id', "
+    "           'mime_type', f -> 'mime_type', "
+    "           'host_url', $1::text, 'deleted', f -> 'deleted'"
+    "       )), '[]'::json) "
+    "       from json_array_elements(t.files) f"
+    "   )"
+    ")"
+)
+
+
+# maps the fields transactions can be sorted by to their column and type in the full transaction state as well as
+# the parser of the textual column values stored in pagination cursors
+_SORT_COLUMNS: dict[str, tuple[str, str, Callable[[str], Any]]] = {
+    "billed_at": ("t.billed_at", "date", date.fromisoformat),
+    "last_changed": ("t.last_changed", "timestamptz", datetime.fromisoformat),
+    "value": ("t.value", "double precision", float),
+    "name": ("t.name", "text", str),
+}
+
+
+def _sort_column(sort: TransactionSortOrder) -> tuple[str, str, bool]:
+    """returns the column, its type and whether to sort descending"""
+    field, _, direction = sort.value.rpartition("_")
+    column, column_type, _ = _SORT_COLUMNS[field]
+    return column, column_type, direction == "desc"
+
+
+def _encode_transaction_cursor(sort: TransactionSortOrder, sort_value: Any, transaction_id: int) -> str:
+    """encode the value of the sort column, independent of the database's text representation of it"""
+    sort_value = sort_value.isoformat() if hasattr(sort_value, "isoformat") else str(sort_value)
+    payload = json.dumps([sort.value, sort_value, transaction_id])
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii")
+
+
+def _decode_transaction_cursor(sort: TransactionSortOrder, cursor: str) -> tuple[Any, int]:
+    """returns the value of the sort column, parsed to its python type, and the id of the last transaction"""
+    try:
+        cursor_sort, sort_value, transaction_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        if not isinstance(sort_value, str) or not isinstance(transaction_id, int):
+            raise ValueError
+    except (ValueError, TypeError, binascii.Error):
+        raise InvalidCommand("Invalid pagination cursor")
+    if cursor_sort != sort.value:
+        raise InvalidCommand("Pagination cursor does not match the requested sort order")
+
+    _, _, parse_sort_value = _SORT_COLUMNS[sort.value.rpartition("_")[0]]
+    try:
+        return parse_sort_value(sort_value), transaction_id
+    except ValueError:
+        raise InvalidCommand("Invalid pagination cursor")
+
+
+def make_transaction_cursor(transaction: Transaction, sort: TransactionSortOrder) -> str:
+    """returns the cursor to continue listing transactions after the given one"""
+    field = sort.value.rpartition("_")[0]
+    return _encode_transaction_cursor(sort, getattr(transaction, field), transaction.id)
+
+
+def _transaction_list_query(
+    args: list[Any],
+    *,
+    group_id: int,
+    valid_at: Optional[datetime],
+    min_last_changed: Optional[datetime],
+    additional_transactions: Optional[list[int]],
+    filters: Optional[TransactionFilter],
+    sort: TransactionSortOrder,
+    cursor: Optional[str],
+) -> tuple[str, str]:
+    """
+    build the from and where as well as the order by clause of a query listing the transactions of a group,
+    query parameters are appended to args
+    """
+
+    def param(value: Any) -> str:
+        args.append(value)
+        return f"${len(args)}"
+
+    group = param(group_id)
+    source = f"full_transaction_state_valid_at_for_group({group}, coalesce({param(valid_at)}::timestamptz, now())) t"
+    conditions = []
+    if min_last_changed:
+        # if a minimum last changed value is specified we must also return all transactions the current
+        # user has pending changes with to properly sync state across different devices of the user
+        conditions.append(
+            f"(t.last_changed >= {param(min_last_changed)} or t.id = any({param(additional_transactions)}::int[]))"
+        )
+
+    if filters is not None:
+        if filters.tags:
+            conditions.append(f"t.tags && {param(filters.tags)}::varchar(255)[]")
+        if filters.account_id is not None:
+            account_id = param(filters.account_id)
+            conditions.append(
+                f"({account_id}::int = any(t.involved_accounts) or exists("
+                f"   select from json_array_elements(t.positions) p "
+                f"   where not (p ->> 'deleted')::boolean and p -> 'usages' -> ({account_id}::int)::text is not null"
+                f"))"
+            )
+        if filters.type is not None:
+            conditions.append(f"t.type = {param(filters.type.value)}")
+        if filters.billed_from is not None:
+            conditions.append(f"t.billed_at >= {param(filters.billed_from)}")
+        if filters.billed_to is not None:
+            conditions.append(f"t.billed_at <= {param(filters.billed_to)}")
+        if filters.search:
+            escaped = filters.search.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+            pattern = param(f"%{escaped}%")
+            conditions.append(f"(t.name ilike {pattern} or t.description ilike {pattern})")
+
+    column, column_type, descending = _sort_column(sort)
+    if cursor is not None:
+        sort_value, transaction_id = _decode_transaction_cursor(sort, cursor)
+        operator = "<" if descending else ">"
+        conditions.append(
+            f"({column}, t.id) {operator} ({param(sort_value)}::{column_type}, {param(transaction_id)}::int)"
+        )
+
+    direction = "desc" if descending else "asc"
+    where = f"where {' and '.join(conditions)}" if conditions else ""
+    return f"from {source} {where}", f"order by {column} {direction}, t.id {direction}"
+
 
 class TransactionService(Service):
     @staticmethod
@@ -60,44 +215,119 @@ class TransactionService(Service):
         conn: Connection,
         user: User,
         group_id: int,
+        valid_at: Optional[datetime] = None,
         min_last_changed: Optional[datetime] = None,
         additional_transactions: Optional[list[int]] = None,
+        filters: Optional[TransactionFilter] = None,
+        sort: TransactionSortOrder = TransactionSortOrder.billed_at_desc,
+        limit: Optional[int] = None,
+        cursor: Optional[str] = None,
     ) -> list[Transaction]:
+        """
+        list the transactions of a group matching the given filters, as of valid_at if given.
+
+        If a limit is given at most limit transactions are returned, the next page starts after the cursor
+        obtained from make_transaction_cursor for the last returned transaction.
+        """
         await check_group_permissions(conn=conn, group_id=group_id, user=user)
 
-        if min_last_changed:
-            # if a minimum last changed value is specified we must also return all transactions the current
-            # user has pending changes with to properly sync state across different devices of the user
-            transactions = await conn.fetch_many(
-                Transaction,
-                "select * "
-                "from full_transaction_state_valid_at(now()) "
-                "where group_id = $1 "
-                "   and (last_changed >= $2 or (($3::int[]) is not null and id = any($3::int[])))",
-                group_id,
-                min_last_changed,
-                additional_transactions,
-            )
-        else:
-            transactions = await conn.fetch_many(
-                Transaction,
-                "select * " "from full_transaction_state_valid_at(now()) " "where group_id = $1",
-                group_id,
-            )
+        args: list[Any] = []
+        from_where, order_by = _transaction_list_query(
+            args,
+            group_id=group_id,
+            valid_at=valid_at,
+            min_last_changed=min_last_changed,
+            additional_transactions=additional_transactions,
+            filters=filters,
+            sort=sort,
+            cursor=cursor,
+        )
+        transactions = await conn.fetch_many(
+            Transaction,
+            f"select t.* {from_where} {order_by} limit {'$' + str(len(args) + 1)}",
+            *args,
+            limit,
+        )
         for transaction in transactions:
             for attachment in transaction.files:
                 attachment.host_url = self.cfg.service.api_url
         return transactions
 
     @with_db_transaction
-    async def get_transaction(self, *, conn: Connection, user: User, transaction_id: int) -> Transaction:
+    async def list_transactions_json(
+        self,
+        *,
+        conn: Connection,
+        user: User,
+        group_id: int,
+        valid_at: Optional[datetime] = None,
+        min_last_changed: Optional[datetime] = None,
+        additional_transactions: Optional[list[int]] = None,
+        filters: Optional[TransactionFilter] = None,
+        sort: TransactionSortOrder = TransactionSortOrder.billed_at_desc,
+        limit: Optional[int] = None,
+        cursor: Optional[str] = None,
+    ) -> tuple[str, Optional[str]]:
+        """
+        same as list_transactions but returns the transactions as a serialized json array built by the database,
+        skipping the parsing into and serialization of pydantic models for large groups.
+
+        Also returns the cursor of the next page if there are more transactions than the given limit.
+        """
+        await check_group_permissions(conn=conn, group_id=group_id, user=user)
+
+        args: list[Any] = [self.cfg.service.api_url]
+        from_where, order_by = _transaction_list_query(
+            args,
+            group_id=group_id,
+            valid_at=valid_at,
+            min_last_changed=min_last_changed,
+            additional_transactions=additional_transactions,
+            filters=filters,
+            sort=sort,
+            cursor=cursor,
+        )
+        column, _, _ = _sort_column(sort)
+        limit_param = f"${len(args) + 1}"
+        # one more row than requested is fetched to determine whether there is a next page
+        page = await conn.fetchrow(
+            f"with page as ("
+            f"   select t.*, {column} as sort_value, row_number() over ({order_by}) as page_row "
+            f"   {from_where} {order_by} limit {limit_param}::int + 1"
+            f") "
+            f"select "
+            f"   coalesce("
+            f"       json_agg({TRANSACTION_JSON} order by t.page_row) "
+            f"           filter (where {limit_param}::int is null or t.page_row <= {limit_param}::int), "
+            f"       '[]'::json"
+            f"   )::text as transactions, "
+            f"   max(t.sort_value) filter (where t.page_row = {limit_param}::int) as last_sort_value, "
+            f"   max(t.id) filter (where t.page_row = {limit_param}::int) as last_id, "
+            f"   count(*) > {limit_param}::int as has_more "
+            f"from page t",
+            *args,
+            limit,
+        )
+        next_cursor = None
+        if page["has_more"]:
+            next_cursor = _encode_transaction_cursor(sort, page["last_sort_value"], page["last_id"])
+        return page["transactions"], next_cursor
+
+    @with_db_transaction
+    async def get_transaction(
+        self, *, conn: Connection, user: User, transaction_id: int, valid_at: Optional[datetime] = None
+    ) -> Transaction:
         group_id = await self._check_transaction_permissions(conn=conn, user=user, transaction_id=transaction_id)
-        transaction = await conn.fetch_one(
+        transaction = await conn.fetch_maybe_one(
             Transaction,
-            "select * " "from full_transaction_state_valid_at(now()) " "where group_id = $1 and id = $2",
+            "select * from full_transaction_state_valid_at_for_ids(array[$2]::int[], coalesce($3, now())) "
+            "where group_id = $1",
             group_id,
             transaction_id,
+            valid_at,
         )
+        if transaction is None:
+            raise NotFoundError(f"transaction did not exist at {valid_at}")
         for attachment in transaction.files:
             attachment.host_url = self.cfg.service.api_url
         return transaction
@@ -112,13 +342,13 @@ class TransactionService(Service):
     ):
         if len(tag_ids) <= 0:
             return
-        for tag_id in tag_ids:
-            await conn.execute(
-                "insert into transaction_to_tag (transaction_id, revision_id, tag_id) " "values ($1, $2, $3)",
-                transaction_id,
-                revision_id,
-                tag_id,
-            )
+        await conn.execute(
+            "insert into transaction_to_tag (transaction_id, revision_id, tag_id) "
+            "select $1, $2, tag_id from unnest($3::int[]) as tag_id",
+            transaction_id,
+            revision_id,
+            tag_ids,
+        )
 
     async def _add_file_to_revision(
         self, *, conn: Connection, revision_id: int, transaction_id: int, attachment: NewFile
@@ -157,7 +387,7 @@ class TransactionService(Service):
             raise InvalidCommand(f"Dots '.' are not allowed in file names")
 
         blob_id = await conn.fetchval(
-            "select blob_id from file_state_valid_at(now()) where id = $1 and transaction_id = $2",
+            "select blob_id from file_state_valid_at_for_transactions(array[$2]::int[]) where id = $1",
             attachment.id,
             transaction_id,
         )
@@ -260,6 +490,163 @@ class TransactionService(Service):
     ) -> int:
         return await self._create_transaction(conn=conn, user=user, group_id=group_id, transaction=transaction)
 
+    @staticmethod
+    async def _allocate_ids(conn: asyncpg.Connection, table: str, n: int) -> list[int]:
+        rows = await conn.fetch(
+            "select nextval(pg_get_serial_sequence($1, 'id')) as id from generate_series(1, $2)", table, n
+        )
+        return [row["id"] for row in rows]
+
+    @with_db_transaction
+    async def create_transactions_bulk(
+        self,
+        *,
+        conn: Connection,
+        user: User,
+        group_id: int,
+        transactions: list[NewTransaction],
+    ) -> list[int]:
+        """
+        Create many transactions at once, e.g. when importing from other applications.
+
+        All transactions are validated together and written with a fixed number of set based statements,
+        the returned transaction ids are in the same order as the given transactions.
+        """
+        await check_group_permissions(conn=conn, group_id=group_id, user=user, can_write=True)
+        if len(transactions) == 0:
+            return []
+
+        referenced_accounts = set()
+        for transaction in transactions:
+            referenced_accounts.update(transaction.creditor_shares.keys())
+            referenced_accounts.update(transaction.debitor_shares.keys())
+            for position in transaction.new_positions:
+                referenced_accounts.update(position.usages.keys())
+        existing_accounts = await conn.fetch(
+            "select account_id from account_state_valid_at_for_ids($2::int[]) where group_id = $1 and not deleted",
+            group_id,
+            list(referenced_accounts),
+        )
+        if len(existing_accounts) != len(referenced_accounts):
+            raise InvalidCommand("one of the accounts referenced by a transaction does not exist in this group")
+
+        transaction_ids = await self._allocate_ids(conn, "transaction", len(transactions))
+        revision_ids = await self._allocate_ids(conn, "transaction_revision", len(transactions))
+
+        await conn.execute(
+            "insert into transaction (id, group_id, type) "
+            "select t.id, $1, t.type from unnest($2::int[], $3::text[]) as t(id, type)",
+            group_id,
+            transaction_ids,
+            [t.type.value for t in transactions],
+        )
+        await conn.execute(
+            "insert into transaction_revision (id, user_id, transaction_id) "
+            "select r.id, $1, r.transaction_id from unnest($2::bigint[], $3::int[]) as r(id, transaction_id)",
+            user.id,
+            revision_ids,
+            transaction_ids,
+        )
+        await conn.execute(
+            "insert into transaction_history "
+            "   (id, revision_id, currency_symbol, currency_conversion_rate, value, name, description, billed_at) "
+            "select * from unnest("
+            "   $1::int[], $2::bigint[], $3::text[], $4::double precision[], $5::double precision[], $6::text[], "
+            "   $7::text[], $8::date[]"
+            ")",
+            transaction_ids,
+            revision_ids,
+            [t.currency_symbol for t in transactions],
+            [t.currency_conversion_rate for t in transactions],
+            [t.value for t in transactions],
+            [t.name for t in transactions],
+            [t.description for t in transactions],
+            [t.billed_at for t in transactions],
+        )
+
+        tag_names = list({tag for t in transactions for tag in t.tags})
+        await _get_or_create_tag_ids(conn=conn, group_id=group_id, tags=tag_names)
+        tag_rows = await conn.fetch(
+            "select id, name from tag where group_id = $1 and name = any($2::varchar(255)[])", group_id, tag_names
+        )
+        tag_ids = {row["name"]: row["id"] for row in tag_rows}
+        tags = [
+            (transaction_id, revision_id, tag_ids[tag])
+            for transaction_id, revision_id, t in zip(transaction_ids, revision_ids, transactions)
+            for tag in set(t.tags)
+        ]
+        await conn.execute(
+            "insert into transaction_to_tag (transaction_id, revision_id, tag_id) "
+            "select * from unnest($1::int[], $2::bigint[], $3::int[])",
+            [t[0] for t in tags],
+            [t[1] for t in tags],
+            [t[2] for t in tags],
+        )
+
+        for table, shares_attr in (("debitor_share", "debitor_shares"), ("creditor_share", "creditor_shares")):
+            shares = [
+                (transaction_id, revision_id, account_id, value)
+                for transaction_id, revision_id, t in zip(transaction_ids, revision_ids, transactions)
+                for account_id, value in getattr(t, shares_attr).items()
+            ]
+            await conn.execute(
+                f"insert into {table} (transaction_id, revision_id, account_id, shares) "
+                "select * from unnest($1::int[], $2::bigint[], $3::int[], $4::double precision[])",
+                [s[0] for s in shares],
+                [s[1] for s in shares],
+                [s[2] for s in shares],
+                [s[3] for s in shares],
+            )
+
+        positions = [
+            (transaction_id, revision_id, position)
+            for transaction_id, revision_id, t in zip(transaction_ids, revision_ids, transactions)
+            for position in t.new_positions
+        ]
+        if positions:
+            item_ids = await self._allocate_ids(conn, "purchase_item", len(positions))
+            await conn.execute(
+                "insert into purchase_item (id, transaction_id) select * from unnest($1::int[], $2::int[])",
+                item_ids,
+                [p[0] for p in positions],
+            )
+            await conn.execute(
+                "insert into purchase_item_history (id, revision_id, name, price, communist_shares) "
+                "select * from unnest($1::int[], $2::bigint[], $3::text[], $4::double precision[], "
+                "   $5::double precision[])",
+                item_ids,
+                [p[1] for p in positions],
+                [p[2].name for p in positions],
+                [p[2].price for p in positions],
+                [p[2].communist_shares for p in positions],
+            )
+            usages = [
+                (item_id, revision_id, account_id, value)
+                for item_id, (_, revision_id, position) in zip(item_ids, positions)
+                for account_id, value in position.usages.items()
+            ]
+            await conn.execute(
+                "insert into purchase_item_usage (item_id, revision_id, account_id, share_amount) "
+                "select * from unnest($1::int[], $2::bigint[], $3::int[], $4::double precision[])",
+                [u[0] for u in usages],
+                [u[1] for u in usages],
+                [u[2] for u in usages],
+                [u[3] for u in usages],
+            )
+
+        for transaction_id, revision_id, t in zip(transaction_ids, revision_ids, transactions):
+            for attachment in t.new_files:
+                await self._add_file_to_revision(
+                    conn=conn, revision_id=revision_id, transaction_id=transaction_id, attachment=attachment
+                )
+
+        # commit all revisions at once to have all associated constraints run
+        await conn.execute(
+            "update transaction_revision set created_at = now() where id = any($1::bigint[])", revision_ids
+        )
+
+        return transaction_ids
+
     @staticmethod
     async def _put_transaction_debitor_shares(
         conn: asyncpg.Connection,
@@ -269,21 +656,21 @@ class TransactionService(Service):
         debitor_shares: dict[int, float],
     ):
         n_accounts = await conn.fetchval(
-            "select count(*) from account_state_valid_at() "
-            "where group_id = $1 and account_id = any($2::int[]) and not deleted",
+            "select count(*) from account_state_valid_at_for_ids($2::int[]) where group_id = $1 and not deleted",
             group_id,
             list(debitor_shares.keys()),
         )
         if len(debitor_shares.keys()) != n_accounts:
             raise InvalidCommand("one of the accounts referenced by a debitor share does not exist in this group")
-        for account_id, value in debitor_shares.items():
-            await conn.execute(
-                "insert into debitor_share(transaction_id, revision_id, account_id, shares) " "values ($1, $2, $3, $4)",
-                transaction_id,
-                revision_id,
-                account_id,
-                value,
-            )
+        await conn.execute(
+            "insert into debitor_share(transaction_id, revision_id, account_id, shares) "
+            "select $1, $2, s.account_id, s.shares "
+            "from unnest($3::int[], $4::double precision[]) as s(account_id, shares)",
+            transaction_id,
+            revision_id,
+            list(debitor_shares.keys()),
+            list(debitor_shares.values()),
+        )
 
     @staticmethod
     async def _put_transaction_creditor_shares(
@@ -294,27 +681,24 @@ class TransactionService(Service):
         creditor_shares: dict[int, float],
     ):
         n_accounts = await conn.fetchval(
-            "select count(*) from account_state_valid_at() "
-            "where group_id = $1 and account_id = any($2::int[]) and not deleted",
+            "select count(*) from account_state_valid_at_for_ids($2::int[]) where group_id = $1 and not deleted",
             group_id,
             list(creditor_shares.keys()),
         )
         if len(creditor_shares.keys()) != n_accounts:
             raise InvalidCommand("one of the accounts referenced by a creditor share does not exist in this group")
-        for account_id, value in creditor_shares.items():
-            await conn.execute(
-                "insert into creditor_share(transaction_id, revision_id, account_id, shares) "
-                "values ($1, $2, $3, $4)",
-                transaction_id,
-                revision_id,
-                account_id,
-                value,
-            )
+        await conn.execute(
+            "insert into creditor_share(transaction_id, revision_id, account_id, shares) "
+            "select $1, $2, s.account_id, s.shares "
+            "from unnest($3::int[], $4::double precision[]) as s(account_id, shares)",
+            transaction_id,
+            revision_id,
+            list(creditor_shares.keys()),
+            list(creditor_shares.values()),
+        )
 
-    @with_db_transaction
-    async def read_file_contents(
-        self, *, conn: Connection, user: User, file_id: int, blob_id: int
-    ) -> tuple[str, bytes]:
+    @staticmethod
+    async def _check_file_access(conn: Connection, user: User, file_id: int, blob_id: int):
         perms = await conn.fetchrow(
             "select f.id "
             "from group_membership gm "
@@ -329,11 +713,140 @@ class TransactionService(Service):
         if not perms:
             raise InvalidCommand("File not found")
 
-        blob = await conn.fetchrow("select content, mime_type from blob where id = $1", blob_id)
+    @with_db_transaction
+    async def get_file_metadata(self, *, conn: Connection, user: User, file_id: int, blob_id: int) -> tuple[str, int]:
+        """returns the mime type and size in bytes of a file attachment without loading its contents"""
+        await self._check_file_access(conn=conn, user=user, file_id=file_id, blob_id=blob_id)
+
+        blob = await conn.fetchrow("select mime_type, octet_length(content) as size from blob where id = $1", blob_id)
         if not blob:
             raise InvalidCommand("File not found")
 
-        return blob["mime_type"], blob["content"]
+        return blob["mime_type"], blob["size"]
+
+    async def read_file_chunks(
+        self, *, blob_id: int, start: int, end: int, chunk_size: int = FILE_CHUNK_SIZE
+    ) -> AsyncIterator[bytes]:
+        """
+        yield the bytes start to end (inclusive) of a blob in chunks of at most chunk_size bytes.
+
+        Access to the blob has to be checked beforehand via get_file_metadata. A database connection is only held
+        while fetching a single chunk such that slow clients do not block the connection pool.
+        """
+        offset = start
+        while offset <= end:
+            length = min(chunk_size, end - offset + 1)
+            async with self.db_pool.acquire() as conn:
+                # substring on bytea is 1-indexed
+                chunk = await conn.fetchval(
+                    "select substring(content from $2 for $3) from blob where id = $1",
+                    blob_id,
+                    offset + 1,
+                    length,
+                )
+            if not chunk:
+                return
+            yield chunk
+            offset += len(chunk)
+
+    @with_db_transaction
+    async def prepare_transaction_export(self, *, conn: Connection, user: User, group_id: int) -> TransactionExport:
+        """check access to a group and load the accounts it exports its transactions to"""
+        await check_group_permissions(conn=conn, group_id=group_id, user=user)
+        rows = await conn.fetch(
+            "select id, name from full_account_state_valid_at_for_group($1) where not deleted order by id",
+            group_id,
+        )
+        return TransactionExport(group_id=group_id, accounts={row["id"]: row["name"] for row in rows})
+
+    async def export_transactions_csv(
+        self, *, export: TransactionExport, batch_size: int = EXPORT_BATCH_SIZE
+    ) -> AsyncIterator[bytes]:
+        """
+        yield the transactions of a group as CSV, one row per transaction ordered by billing date with the balance
+        effect of the transaction on every account of the group.
+
+        Access to the group has to be checked beforehand via prepare_transaction_export. The transactions are read
+        in keyset paginated batches and written in chunks such that memory usage does not depend on the group size,
+        a database connection is only held while fetching a single batch such that slow clients do not block the
+        connection pool.
+        """
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(
+            [
+                "ID",
+                "Date",
+                "Payer",
+                "Name",
+                "Description",
+                "Currency",
+                "Currency Conversion Rate",
+                "Tags",
+                "Value",
+                "Positions",
+                *export.accounts.values(),
+            ]
+        )
+
+        last_billed_at, last_transaction_id = date.min, 0
+        while True:
+            async with self.db_pool.acquire() as conn:
+                rows = await conn.fetch(
+                    "select "
+                    "   ts.transaction_id, ts.billed_at, ts.name, ts.description, ts.currency_symbol, "
+                    "   ts.currency_conversion_rate, ts.tags, ts.value, ts.creditor_shares, "
+                    "   ("
+                    "       select coalesce(json_agg(json_build_object('name', p -> 'name', 'price', p -> 'price')), "
+                    "           '[]'::json) "
+                    "       from json_array_elements(ts.positions) p where not (p ->> 'deleted')::boolean"
+                    "   ) as positions, "
+                    "   ("
+                    "       select coalesce(json_object_agg("
+                    "           tbe.account_id, tbe.common_creditors - tbe.positions - tbe.common_debitors"
+                    "       ), '{}'::json) "
+                    "       from transaction_balance_effect tbe where tbe.transaction_id = ts.transaction_id"
+                    "   ) as balance_effects "
+                    "from transaction_state ts "
+                    "where ts.group_id = $1 and not ts.deleted and (ts.billed_at, ts.transaction_id) > ($2, $3) "
+                    "order by ts.billed_at, ts.transaction_id "
+                    "limit $4",
+                    export.group_id,
+                    last_billed_at,
+                    last_transaction_id,
+                    batch_size,
+                )
+
+            for row in rows:
+                balance_effects = row["balance_effects"]
+                writer.writerow(
+                    [
+                        row["transaction_id"],
+                        row["billed_at"].isoformat(),
+                        ", ".join(export.accounts.get(int(account_id), "") for account_id in row["creditor_shares"]),
+                        row["name"],
+                        row["description"],
+                        row["currency_symbol"],
+                        row["currency_conversion_rate"],
+                        ",".join(row["tags"]),
+                        f"{row['value']:.2f}",
+                        "; ".join(f"{p['name']}: {p['price']:.2f}" for p in row["positions"]),
+                        *(
+                            f"{balance_effects[str(account_id)]:.2f}" if str(account_id) in balance_effects else ""
+                            for account_id in export.accounts
+                        ),
+                    ]
+                )
+                if buffer.tell() >= EXPORT_CHUNK_SIZE:
+                    yield buffer.getvalue().encode("utf-8")
+                    buffer.seek(0)
+                    buffer.truncate()
+
+            if len(rows) < batch_size:
+                break
+            last_billed_at, last_transaction_id = rows[-1]["billed_at"], rows[-1]["transaction_id"]
+
+        yield buffer.getvalue().encode("utf-8")
 
     @staticmethod
     async def _put_position_usages(
@@ -344,22 +857,21 @@ class TransactionService(Service):
         usages: dict[int, float],
     ):
         n_accounts = await conn.fetchval(
-            "select count(*) from account_state_valid_at() "
-            "where group_id = $1 and account_id = any($2::int[]) and not deleted",
+            "select count(*) from account_state_valid_at_for_ids($2::int[]) where group_id = $1 and not deleted",
             group_id,
             list(usages.keys()),
         )
         if len(usages.keys()) != n_accounts:
             raise InvalidCommand("one of the accounts referenced by a position usage does not exist in this group")
-        for account_id, value in usages.items():
-            await conn.execute(
-                "insert into purchase_item_usage(item_id, revision_id, account_id, share_amount) "
-                "values ($1, $2, $3, $4)",
-                item_id,
-                revision_id,
-                account_id,
-                value,
-            )
+        await conn.execute(
+            "insert into purchase_item_usage(item_id, revision_id, account_id, share_amount) "
+            "select $1, $2, u.account_id, u.share_amount "
+            "from unnest($3::int[], $4::double precision[]) as u(account_id, share_amount)",
+            item_id,
+            revision_id,
+            list(usages.keys()),
+            list(usages.values()),
+        )
 
     async def _put_transaction_position(
         self,
@@ -588,6 +1100,8 @@ class TransactionService(Service):
                 position=position,
             )
 
+        await self._commit_revision(conn=conn, revision_id=revision_id)
+
     @with_db_transaction
     async def delete_transaction(self, *, conn: Connection, user: User, transaction_id: int):
         group_id = await self._check_transaction_permissions(
@@ -599,8 +1113,7 @@ class TransactionService(Service):
 
         row = await conn.fetchrow(
             "select name, description, revision_id, deleted "
-            "from transaction_state_valid_at() "
-            "where transaction_id = $1",
+            "from transaction_state_valid_at_for_ids(array[$1]::int[])",
             transaction_id,
         )
         if row is None:
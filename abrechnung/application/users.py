@@ -1,5 +1,8 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
-from typing import Optional
+from typing import Callable, Optional, TypeVar
 
 from asyncpg.pool import Pool
 from email_validator import EmailNotValidError, validate_email
@@ -8,7 +11,7 @@ from passlib.context import CryptContext
 from pydantic import BaseModel
 
 from abrechnung.config import Config
-from abrechnung.core.errors import InvalidCommand, NotFoundError
+from abrechnung.core.errors import InvalidCommand, NotFoundError, TooManyRequests
 from abrechnung.core.service import Service
 from abrechnung.domain.users import Session, User
 from abrechnung.framework.database import Connection
@@ -16,6 +19,11 @@ from abrechnung.framework.decorators import with_db_transaction
 
 ALGORITHM = "HS256"
 
+T = TypeVar("T")
+
+_FAILED_LOGIN_SWEEP_THRESHOLD = 10000
+_USER_CACHE_SWEEP_THRESHOLD = 10000
+
 
 class InvalidPassword(Exception):
     pass
@@ -59,12 +67,66 @@ class UserService(Service):
 
         self.pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+        # cache of users authenticated via a session, maps (session_id, user_id) to (expiry timestamp, user).
+        # entries are evicted through the 'user_cache' notification channel whenever a user or their sessions change.
+        self._user_cache: dict[tuple[int, int], tuple[float, User]] = {}
+        # incremented on every invalidation to not cache users which were loaded before an invalidation happened
+        self._user_cache_generation = 0
+
+        # bcrypt is deliberately slow, hashing therefore happens on a bounded thread pool to not block the event loop
+        self._password_executor = ThreadPoolExecutor(
+            max_workers=self.cfg.api.password_hashing_workers, thread_name_prefix="password-hashing"
+        )
+        self._pending_password_operations = 0
+        # maps (client address, user id) to the timestamps of recent failed login attempts of that client, the user id
+        # is None for attempts with unknown usernames
+        self._failed_logins: dict[tuple[Optional[str], Optional[int]], list[float]] = {}
+
     def _hash_password(self, password: str) -> str:
         return self.pwd_context.hash(password)
 
     def _check_password(self, password: str, hashed_password: str) -> bool:
         return self.pwd_context.verify(password, hashed_password)
 
+    async def _run_password_operation(self, func: Callable[..., T], *args) -> T:
+        """run a password hashing function on the hashing thread pool, rejecting it if too many are already queued"""
+        if self._pending_password_operations >= self.cfg.api.max_pending_password_operations:
+            raise TooManyRequests("Too many concurrent password operations, please try again later")
+
+        self._pending_password_operations += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._password_executor, func, *args)
+        finally:
+            self._pending_password_operations -= 1
+
+    async def _hash_password_async(self, password: str) -> str:
+        return await self._run_password_operation(self._hash_password, password)
+
+    async def _check_password_async(self, password: str, hashed_password: str) -> bool:
+        return await self._run_password_operation(self._check_password, password, hashed_password)
+
+    def shutdown(self):
+        self._password_executor.shutdown(wait=False, cancel_futures=True)
+
+    def _recent_failed_logins(self, key: tuple[Optional[str], Optional[int]]) -> list[float]:
+        cutoff = time.time() - self.cfg.api.failed_login_window.total_seconds()
+        attempts = [ts for ts in self._failed_logins.get(key, []) if ts > cutoff]
+        if attempts:
+            self._failed_logins[key] = attempts
+        else:
+            self._failed_logins.pop(key, None)
+        return attempts
+
+    def _record_failed_login(self, key: tuple[Optional[str], Optional[int]]):
+        if len(self._failed_logins) >= _FAILED_LOGIN_SWEEP_THRESHOLD:
+            # evict stale entries to bound memory usage when many different clients fail to login
+            for stale_key in list(self._failed_logins):
+                self._recent_failed_logins(stale_key)
+
+        attempts = self._recent_failed_logins(key)
+        attempts.append(time.time())
+        self._failed_logins[key] = attempts
+
     def _create_access_token(self, user_id: int, session_id: int):
         data = {
             "user_id": user_id,
@@ -83,18 +145,60 @@ class UserService(Service):
         except JWTError:
             raise PermissionError
 
+    def invalidate_user_cache(self, user_id: int):
+        self._user_cache_generation += 1
+        for key in [key for key in self._user_cache if key[1] == user_id]:
+            del self._user_cache[key]
+
+    def _sweep_user_cache(self):
+        """evict expired entries, sessions which were abandoned are never looked up again"""
+        now = time.time()
+        for key in [key for key, (cache_until, _) in self._user_cache.items() if cache_until <= now]:
+            del self._user_cache[key]
+        # too many active sessions, evict the ones which were cached first
+        while len(self._user_cache) >= _USER_CACHE_SWEEP_THRESHOLD:
+            del self._user_cache[next(iter(self._user_cache))]
+
+    def on_user_cache_notification(self, connection, pid: int, channel: str, payload: str):
+        """called by psql whenever a user or one of their sessions changed, payload is the user id"""
+        del connection, pid, channel  # unused
+        self.invalidate_user_cache(user_id=int(payload))
+
     @with_db_transaction
-    async def get_user_from_token(self, *, conn: Connection, token: str) -> User:
+    async def _get_user_from_session(self, *, conn: Connection, session_id: int, user_id: int) -> tuple[User, float]:
+        """returns the user along with the timestamp up to which the session may be cached"""
+        valid_until = await conn.fetchrow(
+            "select valid_until from session "
+            "where id = $1 and user_id = $2 and (valid_until is null or valid_until > now())",
+            session_id,
+            user_id,
+        )
+        if not valid_until:
+            raise PermissionError
+        user = await self._get_user(conn=conn, user_id=user_id)
+
+        cache_until = time.time() + self.cfg.api.user_cache_ttl.total_seconds()
+        if valid_until["valid_until"] is not None:
+            cache_until = min(cache_until, valid_until["valid_until"].timestamp())
+        return user, cache_until
+
+    async def get_user_from_token(self, *, token: str) -> User:
         token_metadata = self.decode_jwt_payload(token)
+        cache_key = (token_metadata.session_id, token_metadata.user_id)
+
+        cached = self._user_cache.get(cache_key)
+        if cached is not None and cached[0] > time.time():
+            return cached[1].model_copy(deep=True)
 
-        sess = await conn.fetchval(
-            "select id from session " "where id = $1 and user_id = $2 and valid_until is null or valid_until > now()",
-            token_metadata.session_id,
-            token_metadata.user_id,
+        generation = self._user_cache_generation
+        user, cache_until = await self._get_user_from_session(
+            session_id=token_metadata.session_id, user_id=token_metadata.user_id
         )
-        if not sess:
-            raise PermissionError
-        return await self._get_user(conn=conn, user_id=token_metadata.user_id)
+        if self.cfg.api.user_cache_ttl.total_seconds() > 0 and generation == self._user_cache_generation:
+            if len(self._user_cache) >= _USER_CACHE_SWEEP_THRESHOLD:
+                self._sweep_user_cache()
+            self._user_cache[cache_key] = (cache_until, user.model_copy(deep=True))
+        return user
 
     async def _verify_user_password(self, user_id: int, password: str) -> bool:
         async with self.db_pool.acquire() as conn:
@@ -108,27 +212,42 @@ class UserService(Service):
             if user["deleted"] or user["pending"]:
                 return False
 
-            return self._check_password(password, user["hashed_password"])
+            return await self._check_password_async(password, user["hashed_password"])
 
     @with_db_transaction
     async def login_user(
-        self, *, conn: Connection, username: str, password: str, session_name: str
+        self,
+        *,
+        conn: Connection,
+        username: str,
+        password: str,
+        session_name: str,
+        client_address: Optional[str] = None,
     ) -> tuple[int, int, str]:
         """
         validate whether a given user can login
 
+        Failed logins are limited per client address and user, failed attempts of other clients never lock a user out.
         If successful return the user id, a new session id and a session token
         """
         user = await conn.fetchrow(
             "select id, hashed_password, pending, deleted from usr where username = $1 or email = $1",
             username,
         )
+        failed_login_key = (client_address, user["id"] if user is not None else None)
+        if len(self._recent_failed_logins(failed_login_key)) >= self.cfg.api.max_failed_logins:
+            raise TooManyRequests("Too many failed login attempts, please try again later")
+
         if user is None:
+            self._record_failed_login(failed_login_key)
             raise InvalidCommand(f"Login failed")
 
-        if not self._check_password(password, user["hashed_password"]):
+        if not await self._check_password_async(password, user["hashed_password"]):
+            self._record_failed_login(failed_login_key)
             raise InvalidCommand(f"Login failed")
 
+        self._failed_logins.pop(failed_login_key, None)
+
         if user["deleted"]:
             raise InvalidCommand(f"User is not permitted to login")
 
@@ -141,6 +260,7 @@ class UserService(Service):
             session_name,
         )
         access_token = self._create_access_token(user_id=user["id"], session_id=session_id)
+        self.invalidate_user_cache(user_id=user["id"])
 
         return user["id"], session_id, access_token
 
@@ -153,11 +273,12 @@ class UserService(Service):
         )
         if sess_id is None:
             raise InvalidCommand(f"Already logged out")
+        self.invalidate_user_cache(user_id=user.id)
 
     @with_db_transaction
     async def demo_register_user(self, *, conn: Connection, username: str, email: str, password: str) -> int:
         await _check_user_exists(conn=conn, username=username, email=email)
-        hashed_password = self._hash_password(password)
+        hashed_password = await self._hash_password_async(password)
         user_id = await conn.fetchval(
             "insert into usr (username, email, hashed_password, pending) values ($1, $2, $3, false) returning id",
             username,
@@ -228,7 +349,7 @@ class UserService(Service):
                 f"Only users with emails out of the following domains are " f"allowed: {self.valid_email_domains}"
             )
 
-        hashed_password = self._hash_password(password)
+        hashed_password = await self._hash_password_async(password)
         user_id = await conn.fetchval(
             "insert into usr (username, email, hashed_password, is_guest_user, pending) values ($1, $2, $3, $4, $5) returning id",
             username,
@@ -261,6 +382,7 @@ class UserService(Service):
 
         await conn.execute("delete from pending_registration where user_id = $1", user_id)
         await conn.execute("update usr set pending = false where id = $1", user_id)
+        self.invalidate_user_cache(user_id=user_id)
 
         return user_id
 
@@ -298,6 +420,7 @@ class UserService(Service):
         )
         if not sess_id:
             raise NotFoundError(f"no such session found with id {session_id}")
+        self.invalidate_user_cache(user_id=user.id)
 
     @with_db_transaction
     async def rename_session(self, *, conn: Connection, user: User, session_id: int, name: str):
@@ -309,6 +432,7 @@ class UserService(Service):
         )
         if not sess_id:
             raise NotFoundError(f"no such session found with id {session_id}")
+        self.invalidate_user_cache(user_id=user.id)
 
     @with_db_transaction
     async def change_password(self, *, conn: Connection, user: User, old_password: str, new_password: str):
@@ -316,7 +440,7 @@ class UserService(Service):
         if not valid_pw:
             raise InvalidPassword
 
-        hashed_password = self._hash_password(new_password)
+        hashed_password = await self._hash_password_async(new_password)
         await conn.execute(
             "update usr set hashed_password = $1 where id = $2",
             hashed_password,
@@ -354,6 +478,7 @@ class UserService(Service):
 
         await conn.execute("delete from pending_email_change where user_id = $1", user_id)
         await conn.execute("update usr set email = $2 where id = $1", user_id, row["new_email"])
+        self.invalidate_user_cache(user_id=user_id)
 
         return user_id
 
@@ -380,7 +505,7 @@ class UserService(Service):
             raise PermissionError
 
         await conn.execute("delete from pending_password_recovery where user_id = $1", user_id)
-        hashed_password = self._hash_password(password=new_password)
+        hashed_password = await self._hash_password_async(password=new_password)
         await conn.execute(
             "update usr set hashed_password = $2 where id = $1",
             user_id,
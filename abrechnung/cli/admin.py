@@ -1,8 +1,13 @@
 import asyncio
+from pathlib import Path
+from typing import Annotated, Optional
 
 import typer
 
 from abrechnung.admin import create_user as create_user_
+from abrechnung.admin import export_transactions as export_transactions_
+from abrechnung.admin import import_transactions as import_transactions_
+from abrechnung.admin import rebuild_balances as rebuild_balances_
 
 admin_cli = typer.Typer()
 
@@ -20,3 +25,40 @@ def create_user(
             no_email_confirmation=no_email_confirmation,
         )
     )
+
+
+@admin_cli.command(help="Import transactions from a JSON file containing a list of new transactions")
+def import_transactions(ctx: typer.Context, user_id: int, group_id: int, transactions_file: Path):
+    asyncio.run(
+        import_transactions_(
+            config=ctx.obj.config,
+            user_id=user_id,
+            group_id=group_id,
+            transactions_file=transactions_file,
+        )
+    )
+
+
+@admin_cli.command(help="Export the transactions of a group as CSV file")
+def export_transactions(ctx: typer.Context, user_id: int, group_id: int, output_file: Path):
+    asyncio.run(
+        export_transactions_(
+            config=ctx.obj.config,
+            user_id=user_id,
+            group_id=group_id,
+            output_file=output_file,
+        )
+    )
+
+
+@admin_cli.command(
+    help="Rebuild the stored account balances from scratch and verify them against the transaction history"
+)
+def rebuild_balances(
+    ctx: typer.Context,
+    group_id: Annotated[Optional[int], typer.Option(help="Only process this group instead of all groups")] = None,
+    verify_only: Annotated[bool, typer.Option(help="Only verify the stored balances without rebuilding them")] = False,
+):
+    consistent = asyncio.run(rebuild_balances_(config=ctx.obj.config, group_id=group_id, verify_only=verify_only))
+    if not consistent:
+        raise typer.Exit(1)
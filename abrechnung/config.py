@@ -31,6 +31,24 @@ class ApiConfig(BaseModel):
     id: str = "default"
     max_uploadable_file_size: int = 1024
     enable_cors: bool = True
+    # comma separated addresses of reverse proxies whose X-Forwarded-For headers are trusted to determine client
+    # addresses, e.g. for limiting failed logins per client. "*" trusts all, only use it if the api is not reachable
+    # other than through the proxy
+    forwarded_allow_ips: str = "127.0.0.1"
+    # maximum number of messages waiting to be sent to a single websocket client
+    websocket_send_queue_size: int = 100
+    # how long users authenticated via a session token are cached in memory, set to 0 to disable caching
+    user_cache_ttl: timedelta = timedelta(seconds=60)
+    # number of threads hashing and verifying passwords, i.e. the maximum number of concurrent bcrypt operations
+    password_hashing_workers: int = 2
+    # maximum number of password operations waiting for or running on the hashing threads before rejecting new ones
+    max_pending_password_operations: int = 32
+    # number of failed logins of a client for a user within failed_login_window after which further attempts of that
+    # client are rejected
+    max_failed_logins: int = 10
+    failed_login_window: timedelta = timedelta(minutes=5)
+    # minimum size in bytes of pre-serialized json responses to be gzip compressed
+    compression_minimum_size: int = 1024
 
 
 class RegistrationConfig(BaseModel):
@@ -50,6 +68,17 @@ class EmailConfig(BaseModel):
     port: int
     mode: Literal["local", "smtp-ssl", "smtp", "smtp-starttls"] = "smtp"
     auth: Optional[AuthConfig] = None
+    # number of mails sent concurrently, each over its own reusable connection to the mail server
+    max_concurrent_sends: int = 4
+    # failed mails are retried after retry_backoff, doubling with every further attempt up to max_retry_backoff.
+    # after max_attempts failed attempts a mail is given up on
+    max_attempts: int = 8
+    retry_backoff: timedelta = timedelta(seconds=30)
+    max_retry_backoff: timedelta = timedelta(hours=1)
+    # maximum number of mails claimed for sending by a single mailer at a time, claimed mails are not picked up by
+    # other mailers until lease_timeout has passed
+    batch_size: int = 100
+    lease_timeout: timedelta = timedelta(minutes=5)
 
 
 class Config(BaseSettings):
@@ -4,3 +4,7 @@ class NotFoundError(Exception):
 
 class InvalidCommand(Exception):
     pass
+
+
+class TooManyRequests(Exception):
+    pass
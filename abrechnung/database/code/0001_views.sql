@@ -237,3 +237,102 @@ create or replace view aggregated_file_history as
                 LEFT JOIN blob ON blob.id = fh.blob_id
             WINDOW wnd AS (PARTITION BY f.id ORDER BY tr.created_at)
         ) sub WINDOW outer_window AS (PARTITION BY sub.id, sub.id_partition ORDER BY sub.revision_id);
+
+-- latest state of each transaction computed from its history, used to keep the transaction_state table up to date.
+-- filtering by transaction_id only touches the history of the selected transactions.
+create or replace view transaction_state_from_history as
+    select
+        t.id                                                                                       as transaction_id,
+        t.group_id,
+        t.type,
+        last_revision.id                                                                           as revision_id,
+        last_revision.user_id                                                                      as changed_by,
+        last_revision.created_at,
+        last_revision.created_at                                                                   as last_changed,
+        details.value,
+        details.currency_symbol,
+        details.currency_conversion_rate,
+        details.name,
+        details.description,
+        details.billed_at,
+        details.deleted,
+        coalesce(csaj.n_shares, 0::double precision)                                               as n_creditor_shares,
+        coalesce(csaj.shares, json_build_object())                                                 as creditor_shares,
+        coalesce(dsaj.n_shares, 0::double precision)                                               as n_debitor_shares,
+        coalesce(dsaj.shares, json_build_object())                                                 as debitor_shares,
+        coalesce(csaj.involved_accounts, array []::int[]) || coalesce(dsaj.involved_accounts, array []::int[]) as involved_accounts,
+        coalesce(tt.tag_names, array []::varchar(255)[])                                           as tags,
+        coalesce(positions.json_state, '[]'::json)                                                 as positions,
+        coalesce(files.json_state, '[]'::json)                                                     as files
+    from
+        transaction t
+        join lateral (
+            select tr.id, tr.user_id, tr.created_at
+            from transaction_revision tr
+            where tr.transaction_id = t.id
+            order by tr.created_at desc, tr.id desc
+            limit 1
+        ) last_revision on true
+        join lateral (
+            select th.*
+            from transaction_history th join transaction_revision tr on th.revision_id = tr.id
+            where th.id = t.id
+            order by tr.created_at desc, tr.id desc
+            limit 1
+        ) details on true
+        left join creditor_shares_as_json csaj on csaj.transaction_id = t.id and csaj.revision_id = details.revision_id
+        left join debitor_shares_as_json dsaj on dsaj.transaction_id = t.id and dsaj.revision_id = details.revision_id
+        left join transaction_tags tt on tt.transaction_id = t.id and tt.revision_id = details.revision_id
+        left join lateral (
+            select
+                json_agg(json_build_object(
+                    'id', pi.id,
+                    'revision_id', last_revision.id,
+                    'transaction_id', t.id,
+                    'changed_by', last_revision.user_id,
+                    'created_at', last_revision.created_at,
+                    'name', pih.name,
+                    'price', pih.price,
+                    'communist_shares', pih.communist_shares,
+                    'deleted', pih.deleted,
+                    'n_usages', coalesce(piu.n_usages, 0::double precision),
+                    'usages', coalesce(piu.usages, json_build_object()),
+                    'involved_accounts', coalesce(piu.involved_accounts, array []::int[])
+                )) as json_state
+            from
+                purchase_item pi
+                join lateral (
+                    select h.*
+                    from purchase_item_history h join transaction_revision tr on h.revision_id = tr.id
+                    where h.id = pi.id
+                    order by tr.created_at desc, tr.id desc
+                    limit 1
+                ) pih on true
+                left join purchase_item_usages_as_json piu on piu.item_id = pi.id and piu.revision_id = pih.revision_id
+            where pi.transaction_id = t.id
+        ) positions on true
+        left join lateral (
+            select
+                json_agg(json_build_object(
+                    'id', f.id,
+                    'revision_id', last_revision.id,
+                    'transaction_id', t.id,
+                    'changed_by', last_revision.user_id,
+                    'created_at', last_revision.created_at,
+                    'filename', fh.filename,
+                    'mime_type', blob.mime_type,
+                    'blob_id', fh.blob_id,
+                    'deleted', fh.deleted
+                )) as json_state
+            from
+                file f
+                join lateral (
+                    select h.*
+                    from file_history h join transaction_revision tr on h.revision_id = tr.id
+                    where h.id = f.id
+                    order by tr.created_at desc, tr.id desc
+                    limit 1
+                ) fh on true
+                left join blob on blob.id = fh.blob_id
+            where f.transaction_id = t.id
+        ) files on true;
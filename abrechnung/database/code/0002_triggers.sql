@@ -94,9 +94,12 @@ begin
     if NEW is null then
         call notify_user('session', OLD.user_id, OLD.user_id::bigint,
                          json_build_object('element_id', OLD.user_id, 'session_id', OLD.id));
+        -- evict the user from the authentication caches of all api instances
+        perform pg_notify('user_cache', OLD.user_id::text);
     else
         call notify_user('session', NEW.user_id, NEW.user_id::bigint,
                          json_build_object('element_id', NEW.user_id, 'session_id', NEW.id));
+        perform pg_notify('user_cache', NEW.user_id::text);
     end if;
     return NULL;
 end;
@@ -162,9 +165,12 @@ begin
     if NEW is null then
         call notify_user('user', OLD.id, OLD.id::bigint,
                          json_build_object('element_id', OLD.id));
+        -- evict the user from the authentication caches of all api instances
+        perform pg_notify('user_cache', OLD.id::text);
     else
         call notify_user('user', NEW.id, NEW.id::bigint,
                          json_build_object('element_id', NEW.id));
+        perform pg_notify('user_cache', NEW.id::text);
     end if;
     return NULL;
 end;
@@ -198,282 +204,167 @@ create trigger group_log_update_trig
     for each row
 execute function group_log_updated();
 
-create or replace function transaction_history_updated() returns trigger as
+-- all changes to transactions, their shares, positions and files happen in the scope of a transaction revision.
+-- we therefore only notify on changes to revisions, once per (group, transaction) and statement, instead of
+-- emitting a notification for every single history, share, position, usage and file row.
+create or replace function transaction_revisions_changed() returns trigger as
 $$
 <<locals>> declare
-    group_id       grp.id%TYPE;
-    transaction_id integer;
+    changed record;
 begin
-    -- A deletion should not be possible therefore NEW should never be NULL
-    if NEW is null then
-        select
-            transaction.group_id,
-            transaction.id
-        into locals.group_id, locals.transaction_id
-        from
-            transaction
-        where
-                transaction.id = OLD.id;
-    else
-        select
-            transaction.group_id,
-            transaction.id
-        into locals.group_id, locals.transaction_id
-        from
-            transaction
-        where
-                transaction.id = NEW.id;
-    end if;
-
-    call notify_group('transaction', locals.group_id, locals.group_id::bigint,
-                      json_build_object('element_id', locals.group_id, 'transaction_id', locals.transaction_id));
-    return NULL;
-end;
-$$ language plpgsql;
-
-create trigger transaction_history_update_trig
-    after insert or update or delete
-    on transaction_history
-    for each row
-execute function transaction_history_updated();
-
-create or replace function transaction_share_updated() returns trigger as
-$$
-<<locals>> declare
-    group_id       grp.id%TYPE;
-    transaction_id integer;
-begin
-    -- A deletion should not be possible therefore NEW should never be NULL
-    if NEW is null then
-        select
-            transaction.group_id,
-            transaction.id
-        into locals.group_id, locals.transaction_id
-        from
-            transaction
-            join transaction_history th on transaction.id = th.id
-        where th.revision_id = OLD.revision_id and th.id = OLD.transaction_id;
-    else
-        select
-            transaction.group_id,
-            transaction.id
-        into locals.group_id, locals.transaction_id
-        from
-            transaction
-            join transaction_history th on transaction.id = th.id
-        where th.revision_id = NEW.revision_id and th.id = NEW.transaction_id;
-    end if;
-
-    call notify_group('transaction', locals.group_id, locals.group_id::bigint,
-                      json_build_object('element_id', locals.group_id, 'transaction_id', locals.transaction_id));
-    return NULL;
-end;
-$$ language plpgsql;
-
-create trigger creditor_share_trig
-    after insert or update or delete
-    on creditor_share
-    for each row
-execute function transaction_share_updated();
-
-create trigger debitor_share_trig
-    after insert or update or delete
-    on debitor_share
-    for each row
-execute function transaction_share_updated();
+    for changed in select distinct
+                       t.group_id,
+                       t.id as transaction_id
+                   from
+                       changed_revisions cr
+                       join transaction t on t.id = cr.transaction_id loop
+        call notify_group('transaction', changed.group_id, changed.group_id::bigint,
+                          json_build_object('element_id', changed.group_id, 'transaction_id', changed.transaction_id, 'deleted', false));
+    end loop;
 
-create or replace function purchase_item_updated() returns trigger as
-$$
-<<locals>> declare
-    group_id       grp.id%TYPE;
-    transaction_id integer;
-begin
-    -- A deletion should not be possible therefore NEW should never be NULL
-    if NEW is null then return null; end if;
-
-    select
-        transaction.group_id,
-        transaction.id
-    into locals.group_id, locals.transaction_id
-    from
-        transaction
-        join purchase_item pi on transaction.id = pi.transaction_id
-    where
-            pi.id = NEW.id;
-
-    call notify_group('transaction', locals.group_id, locals.group_id::bigint,
-                      json_build_object('element_id', locals.group_id, 'transaction_id', locals.transaction_id));
     return null;
 end;
 $$ language plpgsql;
 
-create trigger purchase_item_trig
-    after insert or update or delete
-    on purchase_item_history
-    for each row
-execute function purchase_item_updated();
+create trigger transaction_revision_insert_trig
+    after insert
+    on transaction_revision
+    referencing new table as changed_revisions
+    for each statement
+execute function transaction_revisions_changed();
+
+create trigger transaction_revision_update_trig
+    after update
+    on transaction_revision
+    referencing new table as changed_revisions
+    for each statement
+execute function transaction_revisions_changed();
 
-create or replace function purchase_item_usage_updated() returns trigger as
+create or replace function transaction_revisions_deleted() returns trigger as
 $$
 <<locals>> declare
-    group_id       grp.id%TYPE;
-    transaction_id integer;
+    deleted record;
 begin
-    if NEW is null then
-        select
-            transaction.group_id,
-            transaction.id
-        into locals.group_id, locals.transaction_id
-        from
-            transaction
-            join purchase_item pi on transaction.id = pi.transaction_id
-        where
-                pi.id = OLD.item_id;
-    else
-        select
-            transaction.group_id,
-            transaction.id
-        into locals.group_id, locals.transaction_id
-        from
-            transaction
-            join purchase_item pi on transaction.id = pi.transaction_id
-        where
-                pi.id = NEW.item_id;
-    end if;
-
+    for deleted in select distinct
+                       dr.user_id,
+                       t.group_id,
+                       t.id as transaction_id
+                   from
+                       deleted_revisions dr
+                       join transaction t on t.id = dr.transaction_id loop
+        call notify_user('transaction', deleted.user_id, deleted.group_id::bigint,
+                         json_build_object('element_id', deleted.group_id, 'transaction_id', deleted.transaction_id, 'deleted', true));
+    end loop;
 
-    call notify_group('transaction', locals.group_id, locals.group_id::bigint,
-                      json_build_object('element_id', locals.group_id, 'transaction_id', locals.transaction_id));
     return null;
 end;
 $$ language plpgsql;
 
-create trigger purchase_item_usage_trig
-    after insert or update or delete
-    on purchase_item_usage
-    for each row
-execute function purchase_item_usage_updated();
+create trigger transaction_revision_delete_trig
+    after delete
+    on transaction_revision
+    referencing old table as deleted_revisions
+    for each statement
+execute function transaction_revisions_deleted();
 
-create or replace function transaction_revision_updated() returns trigger as
+-- committing a revision touches its created_at, afterwards the transaction is marked as changed in its group
+-- and its materialized state, the accounts it references, its balance effect and its search document are refreshed
+create or replace function transaction_revision_committed() returns trigger as
 $$
-<<locals>> declare
-    group_id       grp.id%TYPE;
-    transaction_id integer;
 begin
-    select
-        t.group_id,
-        t.id
-    into locals.group_id, locals.transaction_id
-    from
-        transaction t
-    where t.id = (case when NEW is null then OLD.transaction_id else NEW.transaction_id end);
-
-    if NEW is null then
-        call notify_user('transaction', OLD.user_id, locals.group_id::bigint,
-                         json_build_object('element_id', locals.group_id, 'transaction_id', locals.transaction_id, 'deleted', true));
-    else
-        call notify_group('transaction', locals.group_id, locals.group_id::bigint,
-                          json_build_object('element_id', locals.group_id, 'transaction_id', locals.transaction_id, 'deleted', false));
-    end if;
+    update transaction t set change_seq = next_group_change_seq(t.group_id) where t.id = NEW.transaction_id;
+    call update_transaction_state(NEW.transaction_id);
+    call update_transaction_account_references(NEW.transaction_id);
+    call update_transaction_balance_effect(NEW.transaction_id);
+    call update_transaction_search_document(NEW.transaction_id);
 
     return null;
 end;
 $$ language plpgsql;
 
-create trigger transaction_revision_trig
-    after insert or update or delete
+create trigger transaction_revision_commit_trig
+    after update of created_at
     on transaction_revision
     for each row
-execute function transaction_revision_updated();
+execute function transaction_revision_committed();
 
-create or replace function account_history_updated() returns trigger as
+-- committing a revision touches its created_at, afterwards the account is marked as changed in its group and the
+-- accounts referenced by its clearing shares as well as its search document are updated
+create or replace function account_revision_committed() returns trigger as
 $$
-<<locals>> declare
-    group_id   grp.id%TYPE;
-    account_id integer;
 begin
-    -- A deletion should not be possible therefore NEW should never be NULL
-    if NEW is null then
-        select account.group_id, account.id
-        into locals.group_id, locals.account_id
-        from account
-        where account.id = OLD.id;
-    else
-        select account.group_id, account.id
-        into locals.group_id, locals.account_id
-        from account
-        where account.id = NEW.id;
-    end if;
+    update account a set change_seq = next_group_change_seq(a.group_id) where a.id = NEW.account_id;
+    call update_clearing_account_references(NEW.account_id);
+    call update_account_search_document(NEW.account_id);
 
-    call notify_group('account', locals.group_id, locals.group_id::bigint,
-                      json_build_object('element_id', locals.group_id, 'account_id', locals.account_id));
-    return NULL;
+    return null;
 end;
 $$ language plpgsql;
 
-create trigger account_history_update_trig
-    after insert or update or delete
-    on account_history
+create trigger account_revision_commit_trig
+    after update of created_at
+    on account_revision
     for each row
-execute function account_history_updated();
+execute function account_revision_committed();
 
-create or replace function account_revision_updated() returns trigger as
+-- analogous to transactions, account changes are only notified once per (group, account) and statement
+create or replace function account_revisions_changed() returns trigger as
 $$
 <<locals>> declare
-    group_id       grp.id%TYPE;
-    account_id integer;
+    changed record;
 begin
-    select
-        a.group_id,
-        a.id
-    into locals.group_id, locals.account_id
-    from
-        account a
-    where a.id = (case when NEW is null then OLD.account_id else NEW.account_id end);
-
-    -- A deletion should only be able to occur for uncommitted revisions
-    if NEW is null then
-        call notify_user('account', OLD.user_id, locals.group_id::bigint,
-                         json_build_object('element_id', locals.group_id, 'account_id', locals.account_id, 'deleted', true));
-    else
-        call notify_group('account', locals.group_id, locals.group_id::bigint,
-                          json_build_object('element_id', locals.group_id, 'account_id', locals.account_id, 'deleted', false));
-    end if;
+    for changed in select distinct
+                       a.group_id,
+                       a.id as account_id
+                   from
+                       changed_revisions cr
+                       join account a on a.id = cr.account_id loop
+        call notify_group('account', changed.group_id, changed.group_id::bigint,
+                          json_build_object('element_id', changed.group_id, 'account_id', changed.account_id, 'deleted', false));
+    end loop;
 
     return null;
 end;
 $$ language plpgsql;
 
-create trigger account_revision_trig
-    after insert or update or delete
+create trigger account_revision_insert_trig
+    after insert
     on account_revision
-    for each row
-execute function account_revision_updated();
+    referencing new table as changed_revisions
+    for each statement
+execute function account_revisions_changed();
 
-create or replace function file_history_updated() returns trigger as
+create trigger account_revision_update_trig
+    after update
+    on account_revision
+    referencing new table as changed_revisions
+    for each statement
+execute function account_revisions_changed();
+
+-- A deletion should only be able to occur for uncommitted revisions
+create or replace function account_revisions_deleted() returns trigger as
 $$
 <<locals>> declare
-    group_id       grp.id%TYPE;
-    transaction_id integer;
+    deleted record;
 begin
-    select
-        transaction.group_id,
-        transaction.id
-    into locals.group_id, locals.transaction_id
-    from
-        transaction
-        join file f on transaction.id = f.transaction_id
-    where
-            f.id = (case when NEW is null then OLD.id else NEW.id end);
-
-    call notify_group('transaction', locals.group_id, locals.group_id::bigint,
-                      json_build_object('element_id', locals.group_id, 'transaction_id', locals.transaction_id));
+    for deleted in select distinct
+                       dr.user_id,
+                       a.group_id,
+                       a.id as account_id
+                   from
+                       deleted_revisions dr
+                       join account a on a.id = dr.account_id loop
+        call notify_user('account', deleted.user_id, deleted.group_id::bigint,
+                         json_build_object('element_id', deleted.group_id, 'account_id', deleted.account_id, 'deleted', true));
+    end loop;
+
     return null;
 end;
 $$ language plpgsql;
 
-create trigger file_history_trig
-    after insert or update or delete
-    on file_history
-    for each row
-execute function file_history_updated();
+create trigger account_revision_delete_trig
+    after delete
+    on account_revision
+    referencing old table as deleted_revisions
+    for each statement
+execute function account_revisions_deleted();
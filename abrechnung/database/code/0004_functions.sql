@@ -483,7 +483,33 @@ create or replace function transaction_state_valid_at(
     language sql
 as
 $$
-select distinct on (acth.transaction_id)
+-- the current state is materialized in transaction_state, only queries into the past go through the history
+select
+    ts.revision_id,
+    ts.transaction_id,
+    ts.changed_by,
+    ts.created_at,
+    ts.group_id,
+    ts.type,
+    ts.value,
+    ts.currency_symbol,
+    ts.currency_conversion_rate,
+    ts.name,
+    ts.description,
+    ts.billed_at,
+    ts.deleted,
+    ts.n_creditor_shares,
+    ts.creditor_shares,
+    ts.n_debitor_shares,
+    ts.debitor_shares,
+    ts.involved_accounts,
+    ts.tags
+from
+    transaction_state ts
+where
+    transaction_state_valid_at.valid_at >= now()
+union all
+(select distinct on (acth.transaction_id)
     acth.revision_id,
     acth.transaction_id,
     acth.user_id as changed_by,
@@ -506,9 +532,10 @@ select distinct on (acth.transaction_id)
 from
     aggregated_transaction_history acth
 where
-    acth.created_at <= transaction_state_valid_at.valid_at
+    transaction_state_valid_at.valid_at < now()
+        and acth.created_at <= transaction_state_valid_at.valid_at
 order by
-    acth.transaction_id, acth.created_at desc
+    acth.transaction_id, acth.created_at desc)
 $$;
 
 create or replace function full_transaction_state_valid_at(
@@ -539,6 +566,31 @@ create or replace function full_transaction_state_valid_at(
     language sql
 as
 $$
+select
+    ts.transaction_id as id,
+    ts.type,
+    ts.group_id,
+    ts.last_changed,
+    ts.value,
+    ts.currency_symbol,
+    ts.currency_conversion_rate,
+    ts.name,
+    ts.description,
+    ts.billed_at,
+    ts.deleted,
+    ts.n_creditor_shares,
+    ts.creditor_shares,
+    ts.n_debitor_shares,
+    ts.debitor_shares,
+    ts.involved_accounts,
+    ts.tags,
+    ts.positions,
+    ts.files
+from
+    transaction_state ts
+where
+    full_transaction_state_valid_at.valid_at >= now()
+union all
 select
     t.id,
     t.type,
@@ -585,4 +637,910 @@ from
             file_state_valid_at(full_transaction_state_valid_at.valid_at) cfsva
         group by cfsva.transaction_id
     ) aggregated_files on t.id = aggregated_files.transaction_id
+where
+    full_transaction_state_valid_at.valid_at < now()
+$$;
+
+-- the following *_for_ids and *_for_group variants compute the same state as the functions above for a subset of
+-- accounts or transactions only. instead of aggregating the whole history of all groups and filtering afterwards they
+-- look up the latest revision of every selected element, such that their cost only depends on the size of a group.
+create or replace function account_state_valid_at_for_ids(
+    account_ids integer[],
+    valid_at    timestamptz = now()
+)
+    returns table (
+        account_id         int,
+        revision_id        bigint,
+        type               text,
+        changed_by         int,
+        group_id           int,
+        created_at         timestamptz,
+        name               text,
+        description        text,
+        owning_user_id     int,
+        date_info          date,
+        deleted            bool,
+        n_clearing_shares  int,
+        clearing_shares    json,
+        involved_accounts  int[],
+        tags               varchar(255)[]
+    )
+    stable
+    language sql
+as
+$$
+select
+    a.id                                               as account_id,
+    last_revision.id                                   as revision_id,
+    a.type,
+    last_revision.user_id                              as changed_by,
+    a.group_id,
+    last_revision.created_at,
+    details.name,
+    details.description,
+    details.owning_user_id,
+    details.date_info,
+    details.deleted,
+    coalesce(cas.n_shares, 0)                          as n_clearing_shares,
+    coalesce(cas.shares, json_build_object())          as clearing_shares,
+    coalesce(cas.involved_accounts, array []::int[])   as involved_accounts,
+    coalesce(tags.tag_names, array []::varchar(255)[]) as tags
+from
+    account a
+    join lateral (
+        select ar.id, ar.user_id, ar.created_at
+        from account_revision ar
+        where ar.account_id = a.id and ar.created_at <= account_state_valid_at_for_ids.valid_at
+        order by ar.created_at desc, ar.id desc
+        limit 1
+    ) last_revision on true
+    join lateral (
+        select ah.*
+        from account_history ah join account_revision ar on ah.revision_id = ar.id
+        where ah.id = a.id and ar.created_at <= account_state_valid_at_for_ids.valid_at
+        order by ar.created_at desc, ar.id desc
+        limit 1
+    ) details on true
+    left join lateral (
+        select
+            sum(s.shares)                                  as n_shares,
+            array_agg(s.share_account_id)                  as involved_accounts,
+            json_object_agg(s.share_account_id, s.shares)  as shares
+        from clearing_account_share s
+        where s.account_id = a.id and s.revision_id = details.revision_id
+    ) cas on true
+    left join lateral (
+        select array_agg(tag.name) as tag_names
+        from account_to_tag att join tag on att.tag_id = tag.id
+        where att.account_id = a.id and att.revision_id = details.revision_id
+    ) tags on true
+where
+    a.id = any(account_state_valid_at_for_ids.account_ids)
+$$;
+
+create or replace function account_state_valid_at_for_group(
+    group_id integer,
+    valid_at timestamptz = now()
+)
+    returns table (
+        account_id         int,
+        revision_id        bigint,
+        type               text,
+        changed_by         int,
+        group_id           int,
+        created_at         timestamptz,
+        name               text,
+        description        text,
+        owning_user_id     int,
+        date_info          date,
+        deleted            bool,
+        n_clearing_shares  int,
+        clearing_shares    json,
+        involved_accounts  int[],
+        tags               varchar(255)[]
+    )
+    stable
+    language sql
+as
+$$
+select *
+from
+    account_state_valid_at_for_ids(
+        array(select e.id from account e where e.group_id = account_state_valid_at_for_group.group_id),
+        account_state_valid_at_for_group.valid_at
+    )
+$$;
+
+create or replace function full_account_state_valid_at_for_ids(
+    account_ids integer[],
+    valid_at    timestamptz = now()
+)
+    returns table (
+        id                integer,
+        type              text,
+        group_id          integer,
+        last_changed      timestamptz,
+        changed_by        int,
+        name              text,
+        description       text,
+        owning_user_id    int,
+        date_info         date,
+        deleted           bool,
+        n_clearing_shares int,
+        clearing_shares   json,
+        involved_accounts int[],
+        tags              varchar(255)[]
+    )
+    stable
+    language sql
+as
+$$
+select
+    details.account_id as id,
+    details.type,
+    details.group_id,
+    details.created_at as last_changed,
+    details.changed_by,
+    details.name,
+    details.description,
+    details.owning_user_id,
+    details.date_info,
+    details.deleted,
+    details.n_clearing_shares,
+    details.clearing_shares,
+    details.involved_accounts,
+    details.tags
+from
+    account_state_valid_at_for_ids(
+        full_account_state_valid_at_for_ids.account_ids, full_account_state_valid_at_for_ids.valid_at
+    ) details
+$$;
+
+create or replace function full_account_state_valid_at_for_group(
+    group_id integer,
+    valid_at timestamptz = now()
+)
+    returns table (
+        id                integer,
+        type              text,
+        group_id          integer,
+        last_changed      timestamptz,
+        changed_by        int,
+        name              text,
+        description       text,
+        owning_user_id    int,
+        date_info         date,
+        deleted           bool,
+        n_clearing_shares int,
+        clearing_shares   json,
+        involved_accounts int[],
+        tags              varchar(255)[]
+    )
+    stable
+    language sql
+as
+$$
+select *
+from
+    full_account_state_valid_at_for_ids(
+        array(select e.id from account e where e.group_id = full_account_state_valid_at_for_group.group_id),
+        full_account_state_valid_at_for_group.valid_at
+    )
+$$;
+
+create or replace function transaction_position_state_valid_at_for_transactions(
+    transaction_ids integer[],
+    valid_at        timestamptz = now()
+)
+    returns table (
+        id                      integer,
+        revision_id             bigint,
+        transaction_id          integer,
+        changed_by              integer,
+        created_at              timestamptz,
+        name                    text,
+        price                   double precision,
+        communist_shares        double precision,
+        deleted                 boolean,
+        n_usages                integer,
+        usages                  json,
+        involved_accounts       integer[]
+    )
+    stable
+    language sql
+as
+$$
+select
+    pi.id,
+    pih.revision_id,
+    pi.transaction_id,
+    pih.user_id                                        as changed_by,
+    pih.created_at,
+    pih.name,
+    pih.price,
+    pih.communist_shares,
+    pih.deleted,
+    coalesce(usages.n_usages, 0)                       as n_usages,
+    coalesce(usages.usages, json_build_object())       as usages,
+    coalesce(usages.involved_accounts, array []::int[]) as involved_accounts
+from
+    purchase_item pi
+    join lateral (
+        select h.*, tr.user_id, tr.created_at
+        from purchase_item_history h join transaction_revision tr on h.revision_id = tr.id
+        where h.id = pi.id and tr.created_at <= transaction_position_state_valid_at_for_transactions.valid_at
+        order by tr.created_at desc, tr.id desc
+        limit 1
+    ) pih on true
+    left join lateral (
+        select
+            sum(u.share_amount)                            as n_usages,
+            array_agg(u.account_id)                        as involved_accounts,
+            json_object_agg(u.account_id, u.share_amount)  as usages
+        from purchase_item_usage u
+        where u.item_id = pi.id and u.revision_id = pih.revision_id
+    ) usages on true
+where
+    pi.transaction_id = any(transaction_position_state_valid_at_for_transactions.transaction_ids)
+$$;
+
+create or replace function file_state_valid_at_for_transactions(
+    transaction_ids integer[],
+    valid_at        timestamptz = now()
+)
+    returns table (
+        id                  integer,
+        revision_id         bigint,
+        transaction_id      integer,
+        changed_by          integer,
+        created_at          timestamptz,
+        filename            text,
+        mime_type           text,
+        blob_id             integer,
+        deleted             boolean
+    )
+    stable
+    language sql
+as
+$$
+select
+    f.id,
+    fh.revision_id,
+    f.transaction_id,
+    fh.user_id as changed_by,
+    fh.created_at,
+    fh.filename,
+    blob.mime_type,
+    fh.blob_id,
+    fh.deleted
+from
+    file f
+    join lateral (
+        select h.*, tr.user_id, tr.created_at
+        from file_history h join transaction_revision tr on h.revision_id = tr.id
+        where h.id = f.id and tr.created_at <= file_state_valid_at_for_transactions.valid_at
+        order by tr.created_at desc, tr.id desc
+        limit 1
+    ) fh on true
+    left join blob on blob.id = fh.blob_id
+where
+    f.transaction_id = any(file_state_valid_at_for_transactions.transaction_ids)
+$$;
+
+create or replace function transaction_state_valid_at_for_ids(
+    transaction_ids integer[],
+    valid_at        timestamptz = now()
+)
+    returns table (
+        revision_id              bigint,
+        transaction_id           integer,
+        changed_by               integer,
+        created_at               timestamptz,
+        group_id                 integer,
+        type                     text,
+        value                    double precision,
+        currency_symbol          text,
+        currency_conversion_rate double precision,
+        name                     text,
+        description              text,
+        billed_at                date,
+        deleted                  boolean,
+        n_creditor_shares        integer,
+        creditor_shares          json,
+        n_debitor_shares         integer,
+        debitor_shares           json,
+        involved_accounts        integer[],
+        tags                     varchar(255)[]
+    )
+    stable
+    language sql
+as
+$$
+select
+    ts.revision_id,
+    ts.transaction_id,
+    ts.changed_by,
+    ts.created_at,
+    ts.group_id,
+    ts.type,
+    ts.value,
+    ts.currency_symbol,
+    ts.currency_conversion_rate,
+    ts.name,
+    ts.description,
+    ts.billed_at,
+    ts.deleted,
+    ts.n_creditor_shares,
+    ts.creditor_shares,
+    ts.n_debitor_shares,
+    ts.debitor_shares,
+    ts.involved_accounts,
+    ts.tags
+from
+    transaction_state ts
+where
+    transaction_state_valid_at_for_ids.valid_at >= now()
+        and ts.transaction_id = any(transaction_state_valid_at_for_ids.transaction_ids)
+union all
+select
+    last_revision.id                                   as revision_id,
+    t.id                                               as transaction_id,
+    last_revision.user_id                              as changed_by,
+    last_revision.created_at,
+    t.group_id,
+    t.type,
+    details.value,
+    details.currency_symbol,
+    details.currency_conversion_rate,
+    details.name,
+    details.description,
+    details.billed_at,
+    details.deleted,
+    coalesce(cs.n_shares, 0)                           as n_creditor_shares,
+    coalesce(cs.shares, json_build_object())           as creditor_shares,
+    coalesce(ds.n_shares, 0)                           as n_debitor_shares,
+    coalesce(ds.shares, json_build_object())           as debitor_shares,
+    coalesce(cs.involved_accounts, array []::int[]) || coalesce(ds.involved_accounts, array []::int[]) as involved_accounts,
+    coalesce(tags.tag_names, array []::varchar(255)[]) as tags
+from
+    transaction t
+    join lateral (
+        select tr.id, tr.user_id, tr.created_at
+        from transaction_revision tr
+        where tr.transaction_id = t.id and tr.created_at <= transaction_state_valid_at_for_ids.valid_at
+        order by tr.created_at desc, tr.id desc
+        limit 1
+    ) last_revision on true
+    join lateral (
+        select th.*
+        from transaction_history th join transaction_revision tr on th.revision_id = tr.id
+        where th.id = t.id and tr.created_at <= transaction_state_valid_at_for_ids.valid_at
+        order by tr.created_at desc, tr.id desc
+        limit 1
+    ) details on true
+    left join lateral (
+        select sum(s.shares) as n_shares, array_agg(s.account_id) as involved_accounts,
+               json_object_agg(s.account_id, s.shares) as shares
+        from creditor_share s
+        where s.transaction_id = t.id and s.revision_id = details.revision_id
+    ) cs on true
+    left join lateral (
+        select sum(s.shares) as n_shares, array_agg(s.account_id) as involved_accounts,
+               json_object_agg(s.account_id, s.shares) as shares
+        from debitor_share s
+        where s.transaction_id = t.id and s.revision_id = details.revision_id
+    ) ds on true
+    left join lateral (
+        select array_agg(tag.name) as tag_names
+        from transaction_to_tag ttt join tag on ttt.tag_id = tag.id
+        where ttt.transaction_id = t.id and ttt.revision_id = details.revision_id
+    ) tags on true
+where
+    transaction_state_valid_at_for_ids.valid_at < now()
+        and t.id = any(transaction_state_valid_at_for_ids.transaction_ids)
 $$;
+
+create or replace function transaction_state_valid_at_for_group(
+    group_id integer,
+    valid_at timestamptz = now()
+)
+    returns table (
+        revision_id              bigint,
+        transaction_id           integer,
+        changed_by               integer,
+        created_at               timestamptz,
+        group_id                 integer,
+        type                     text,
+        value                    double precision,
+        currency_symbol          text,
+        currency_conversion_rate double precision,
+        name                     text,
+        description              text,
+        billed_at                date,
+        deleted                  boolean,
+        n_creditor_shares        integer,
+        creditor_shares          json,
+        n_debitor_shares         integer,
+        debitor_shares           json,
+        involved_accounts        integer[],
+        tags                     varchar(255)[]
+    )
+    stable
+    language sql
+as
+$$
+select *
+from
+    transaction_state_valid_at_for_ids(
+        array(select e.id from transaction e where e.group_id = transaction_state_valid_at_for_group.group_id),
+        transaction_state_valid_at_for_group.valid_at
+    )
+$$;
+
+create or replace function full_transaction_state_valid_at_for_ids(
+    transaction_ids integer[],
+    valid_at        timestamptz = now()
+)
+    returns table (
+        id                          integer,
+        type                        text,
+        group_id                    integer,
+        last_changed                timestamp with time zone,
+        value                       double precision,
+        currency_symbol             text,
+        currency_conversion_rate    double precision,
+        name                        text,
+        description                 text,
+        billed_at                   date,
+        deleted                     boolean,
+        n_creditor_shares           integer,
+        creditor_shares             json,
+        n_debitor_shares            integer,
+        debitor_shares              json,
+        involved_accounts           integer[],
+        tags                        varchar(255)[],
+        positions                   json,
+        files                       json
+    )
+    stable
+    language sql
+as
+$$
+select
+    ts.transaction_id as id,
+    ts.type,
+    ts.group_id,
+    ts.last_changed,
+    ts.value,
+    ts.currency_symbol,
+    ts.currency_conversion_rate,
+    ts.name,
+    ts.description,
+    ts.billed_at,
+    ts.deleted,
+    ts.n_creditor_shares,
+    ts.creditor_shares,
+    ts.n_debitor_shares,
+    ts.debitor_shares,
+    ts.involved_accounts,
+    ts.tags,
+    ts.positions,
+    ts.files
+from
+    transaction_state ts
+where
+    full_transaction_state_valid_at_for_ids.valid_at >= now()
+        and ts.transaction_id = any(full_transaction_state_valid_at_for_ids.transaction_ids)
+union all
+select
+    details.transaction_id as id,
+    details.type,
+    details.group_id,
+    greatest(
+        details.created_at,
+        aggregated_positions.created_at,
+        aggregated_files.created_at
+    ) as last_changed,
+    details.value,
+    details.currency_symbol,
+    details.currency_conversion_rate,
+    details.name,
+    details.description,
+    details.billed_at,
+    details.deleted,
+    details.n_creditor_shares,
+    details.creditor_shares,
+    details.n_debitor_shares,
+    details.debitor_shares,
+    details.involved_accounts,
+    details.tags,
+    coalesce(aggregated_positions.json_state, '[]'::json) as positions,
+    coalesce(aggregated_files.json_state, '[]'::json)     as files
+from
+    transaction_state_valid_at_for_ids(
+        full_transaction_state_valid_at_for_ids.transaction_ids, full_transaction_state_valid_at_for_ids.valid_at
+    ) details
+    left join (
+        select
+            p.transaction_id,
+            json_agg(p)        as json_state,
+            max(p.created_at) as created_at
+        from
+            transaction_position_state_valid_at_for_transactions(
+                full_transaction_state_valid_at_for_ids.transaction_ids,
+                full_transaction_state_valid_at_for_ids.valid_at
+            ) p
+        group by p.transaction_id
+    ) aggregated_positions on details.transaction_id = aggregated_positions.transaction_id
+    left join (
+        select
+            f.transaction_id,
+            json_agg(f)        as json_state,
+            max(f.created_at) as created_at
+        from
+            file_state_valid_at_for_transactions(
+                full_transaction_state_valid_at_for_ids.transaction_ids,
+                full_transaction_state_valid_at_for_ids.valid_at
+            ) f
+        group by f.transaction_id
+    ) aggregated_files on details.transaction_id = aggregated_files.transaction_id
+where
+    full_transaction_state_valid_at_for_ids.valid_at < now()
+$$;
+
+create or replace function full_transaction_state_valid_at_for_group(
+    group_id integer,
+    valid_at timestamptz = now()
+)
+    returns table (
+        id                          integer,
+        type                        text,
+        group_id                    integer,
+        last_changed                timestamp with time zone,
+        value                       double precision,
+        currency_symbol             text,
+        currency_conversion_rate    double precision,
+        name                        text,
+        description                 text,
+        billed_at                   date,
+        deleted                     boolean,
+        n_creditor_shares           integer,
+        creditor_shares             json,
+        n_debitor_shares            integer,
+        debitor_shares              json,
+        involved_accounts           integer[],
+        tags                        varchar(255)[],
+        positions                   json,
+        files                       json
+    )
+    stable
+    language sql
+as
+$$
+-- the current state is read from transaction_state directly such that this function can be inlined into queries
+-- and filters, sorting and limits are pushed down onto the indexes of transaction_state
+select
+    ts.transaction_id as id,
+    ts.type,
+    ts.group_id,
+    ts.last_changed,
+    ts.value,
+    ts.currency_symbol,
+    ts.currency_conversion_rate,
+    ts.name,
+    ts.description,
+    ts.billed_at,
+    ts.deleted,
+    ts.n_creditor_shares,
+    ts.creditor_shares,
+    ts.n_debitor_shares,
+    ts.debitor_shares,
+    ts.involved_accounts,
+    ts.tags,
+    ts.positions,
+    ts.files
+from
+    transaction_state ts
+where
+    full_transaction_state_valid_at_for_group.valid_at >= now()
+        and ts.group_id = full_transaction_state_valid_at_for_group.group_id
+union all
+select *
+from
+    full_transaction_state_valid_at_for_ids(
+        array(select e.id from transaction e where e.group_id = full_transaction_state_valid_at_for_group.group_id),
+        full_transaction_state_valid_at_for_group.valid_at
+    )
+where
+    full_transaction_state_valid_at_for_group.valid_at < now()
+$$;
+
+-- recomputes the materialized current state of a single transaction from its history
+create or replace procedure update_transaction_state(
+    transaction_id integer
+) as
+$$
+begin
+    delete from transaction_state ts where ts.transaction_id = update_transaction_state.transaction_id;
+
+    insert into transaction_state (
+        transaction_id, group_id, type, revision_id, changed_by, created_at, last_changed, value, currency_symbol,
+        currency_conversion_rate, name, description, billed_at, deleted, n_creditor_shares, creditor_shares,
+        n_debitor_shares, debitor_shares, involved_accounts, tags, positions, files
+    )
+    select
+        tsfh.transaction_id, tsfh.group_id, tsfh.type, tsfh.revision_id, tsfh.changed_by, tsfh.created_at,
+        tsfh.last_changed, tsfh.value, tsfh.currency_symbol, tsfh.currency_conversion_rate, tsfh.name,
+        tsfh.description, tsfh.billed_at, tsfh.deleted, tsfh.n_creditor_shares, tsfh.creditor_shares,
+        tsfh.n_debitor_shares, tsfh.debitor_shares, tsfh.involved_accounts, tsfh.tags, tsfh.positions, tsfh.files
+    from
+        transaction_state_from_history tsfh
+    where
+        tsfh.transaction_id = update_transaction_state.transaction_id;
+end
+$$ language plpgsql;
+
+-- rebuilds the accounts referenced by the current state of a transaction, either via its shares or position usages
+create or replace procedure update_transaction_account_references(
+    transaction_id integer
+) as
+$$
+begin
+    delete from account_reference ar
+    where ar.referenced_by_transaction_id = update_transaction_account_references.transaction_id;
+
+    insert into account_reference (account_id, group_id, referenced_by_transaction_id)
+    select distinct
+        refs.account_id,
+        ts.group_id,
+        ts.transaction_id
+    from
+        transaction_state ts
+        cross join lateral (
+            select unnest(ts.involved_accounts) as account_id
+            union
+            select json_array_elements_text(p -> 'involved_accounts')::integer
+            from json_array_elements(ts.positions) p
+            where not (p ->> 'deleted')::boolean
+        ) refs
+    where
+        ts.transaction_id = update_transaction_account_references.transaction_id
+        and not ts.deleted;
+end
+$$ language plpgsql;
+
+-- rebuilds the accounts referenced by the clearing shares of the latest committed state of an account
+create or replace procedure update_clearing_account_references(
+    account_id integer
+) as
+$$
+begin
+    delete from account_reference ar
+    where ar.referenced_by_account_id = update_clearing_account_references.account_id;
+
+    insert into account_reference (account_id, group_id, referenced_by_account_id)
+    select distinct
+        cas.share_account_id,
+        a.group_id,
+        a.id
+    from
+        account a
+        join lateral (
+            select ah.revision_id, ah.deleted
+            from account_history ah join account_revision ar on ah.revision_id = ar.id
+            where ah.id = a.id
+            order by ar.created_at desc, ar.id desc
+            limit 1
+        ) last_history on true
+        join clearing_account_share cas on cas.account_id = a.id and cas.revision_id = last_history.revision_id
+    where
+        a.id = update_clearing_account_references.account_id
+        and not last_history.deleted;
+end
+$$ language plpgsql;
+
+-- rebuilds the full text search document of the latest committed state of a transaction
+create or replace procedure update_transaction_search_document(
+    transaction_id integer
+) as
+$$
+begin
+    delete from search_document sd
+    where sd.transaction_id = update_transaction_search_document.transaction_id;
+
+    insert into search_document (group_id, transaction_id, document)
+    select
+        ts.group_id,
+        ts.transaction_id,
+        setweight(to_tsvector('simple', ts.name), 'A') ||
+        setweight(to_tsvector('simple', array_to_string(ts.tags, ' ')), 'A') ||
+        setweight(to_tsvector('simple', ts.description), 'B') ||
+        setweight(to_tsvector('simple', coalesce(positions.names, '')), 'C')
+    from
+        transaction_state ts
+        left join lateral (
+            select string_agg(p ->> 'name', ' ') as names
+            from json_array_elements(ts.positions) p
+            where not (p ->> 'deleted')::boolean
+        ) positions on true
+    where
+        ts.transaction_id = update_transaction_search_document.transaction_id
+        and not ts.deleted;
+end
+$$ language plpgsql;
+
+-- rebuilds the full text search document of the latest committed state of an account
+create or replace procedure update_account_search_document(
+    account_id integer
+) as
+$$
+begin
+    delete from search_document sd
+    where sd.account_id = update_account_search_document.account_id;
+
+    insert into search_document (group_id, account_id, document)
+    select
+        a.group_id,
+        a.account_id,
+        setweight(to_tsvector('simple', a.name), 'A') ||
+        setweight(to_tsvector('simple', array_to_string(a.tags, ' ')), 'A') ||
+        setweight(to_tsvector('simple', a.description), 'B')
+    from
+        account_state_valid_at_for_ids(array [update_account_search_document.account_id]) a
+    where
+        not a.deleted;
+end
+$$ language plpgsql;
+
+-- computes the effect of the latest committed state of a transaction on the balances of all accounts involved in it,
+-- mirrors compute_transaction_balance_effect in the backend. deleted transactions have no effect.
+create or replace function transaction_balance_effect_from_state(
+    transaction_id integer
+)
+    returns table (
+        account_id       integer,
+        positions        double precision,
+        common_creditors double precision,
+        common_debitors  double precision
+    )
+    stable
+    language sql
+as
+$$
+with live_transaction as (
+    select ts.*
+    from transaction_state ts
+    where ts.transaction_id = transaction_balance_effect_from_state.transaction_id and not ts.deleted
+),
+position as (
+    select
+        p.price,
+        p.communist_shares,
+        p.usages,
+        -- the part of a position not covered by usages is billed to its communist shares
+        case when p.communist_shares + p.n_usages > 0 then p.price / (p.communist_shares + p.n_usages) else 0 end
+            as price_per_share
+    from
+        live_transaction lt
+        cross join json_to_recordset(lt.positions) as p(
+            price double precision, communist_shares double precision, n_usages double precision, usages json,
+            deleted boolean
+        )
+    where
+        not p.deleted
+),
+remaining as (
+    -- whatever is not covered by position usages is split among the debitors
+    select lt.value - coalesce((select sum(p.price - p.price_per_share * p.communist_shares) from position p), 0) as value
+    from live_transaction lt
+),
+contribution as (
+    select u.key::integer as account_id, p.price_per_share * u.value::double precision as positions,
+           0::double precision as common_creditors, 0::double precision as common_debitors
+    from position p cross join json_each_text(p.usages) u
+    union all
+    select c.key::integer, 0,
+           case when lt.n_creditor_shares > 0 then lt.value / lt.n_creditor_shares * c.value::double precision else 0 end,
+           0
+    from live_transaction lt cross join json_each_text(lt.creditor_shares) c
+    union all
+    select d.key::integer, 0, 0,
+           case when lt.n_debitor_shares > 0 then r.value / lt.n_debitor_shares * d.value::double precision else 0 end
+    from live_transaction lt cross join remaining r cross join json_each_text(lt.debitor_shares) d
+)
+select c.account_id, sum(c.positions), sum(c.common_creditors), sum(c.common_debitors)
+from contribution c
+group by c.account_id;
+$$;
+
+-- replaces the committed balance effect of a transaction, the previous effect is taken back from the balances of the
+-- accounts involved before the effect of the latest committed state is added onto them
+create or replace procedure update_transaction_balance_effect(
+    transaction_id integer
+) as
+$$
+begin
+    update account_balance ab
+    set
+        balance = ab.balance - (tbe.common_creditors - tbe.positions - tbe.common_debitors),
+        total_paid = ab.total_paid - tbe.common_creditors,
+        total_consumed = ab.total_consumed - (tbe.positions + tbe.common_debitors)
+    from
+        transaction_balance_effect tbe
+    where
+        tbe.transaction_id = update_transaction_balance_effect.transaction_id
+        and ab.account_id = tbe.account_id;
+
+    delete from transaction_balance_effect tbe
+    where tbe.transaction_id = update_transaction_balance_effect.transaction_id;
+
+    insert into transaction_balance_effect (
+        transaction_id, account_id, group_id, billed_at, positions, common_creditors, common_debitors
+    )
+    select
+        ts.transaction_id, e.account_id, ts.group_id, ts.billed_at, e.positions, e.common_creditors,
+        e.common_debitors
+    from
+        transaction_state ts
+        cross join transaction_balance_effect_from_state(ts.transaction_id) e
+    where
+        ts.transaction_id = update_transaction_balance_effect.transaction_id;
+
+    insert into account_balance (account_id, group_id, balance, total_paid, total_consumed)
+    select
+        tbe.account_id,
+        tbe.group_id,
+        tbe.common_creditors - tbe.positions - tbe.common_debitors,
+        tbe.common_creditors,
+        tbe.positions + tbe.common_debitors
+    from
+        transaction_balance_effect tbe
+    where
+        tbe.transaction_id = update_transaction_balance_effect.transaction_id
+    on conflict (account_id) do update
+    set
+        balance = account_balance.balance + excluded.balance,
+        total_paid = account_balance.total_paid + excluded.total_paid,
+        total_consumed = account_balance.total_consumed + excluded.total_consumed;
+end
+$$ language plpgsql;
+
+-- recomputes the committed balance effects and account balances of a group from scratch
+create or replace procedure rebuild_group_balances(
+    group_id integer
+) as
+$$
+<<locals>> declare
+    transaction_id integer;
+begin
+    delete from transaction_balance_effect tbe where tbe.group_id = rebuild_group_balances.group_id;
+    delete from account_balance ab where ab.group_id = rebuild_group_balances.group_id;
+
+    for locals.transaction_id in select t.id from transaction t where t.group_id = rebuild_group_balances.group_id loop
+        call update_transaction_balance_effect(locals.transaction_id);
+    end loop;
+end
+$$ language plpgsql;
+
+-- turns a free text search string into a tsquery matching all of its words as prefixes, e.g. 'rent mar' matches
+-- documents containing words starting with 'rent' and 'mar'
+create or replace function search_prefix_query(
+    search text
+) returns tsquery as
+$$
+select
+    coalesce(to_tsquery('simple', string_agg(quote_literal(lexeme) || ':*', ' & ')), ''::tsquery)
+from
+    unnest(tsvector_to_array(to_tsvector('simple', search_prefix_query.search))) lexeme;
+$$ language sql immutable;
+
+-- increments the change sequence of a group, returns the new sequence number
+create or replace function next_group_change_seq(
+    group_id integer
+) returns bigint as
+$$
+    insert into group_change_sequence (group_id, last_seq)
+    values (next_group_change_seq.group_id, 1)
+    on conflict (group_id) do update set last_seq = group_change_sequence.last_seq + 1
+    returning last_seq;
+$$ language sql;
@@ -0,0 +1,149 @@
+-- revision: 48ff170a
+-- requires: 04424b59
+
+-- holds the latest committed state of every transaction, including its shares, tags, positions and files.
+-- rows are kept up to date by a trigger on transaction_revision which fires whenever a revision is committed.
+-- the *_state_valid_at functions only go through the aggregated history views for queries into the past.
+create table if not exists transaction_state (
+    transaction_id           integer primary key references transaction (id) on delete cascade,
+    group_id                 integer          not null references grp (id) on delete cascade,
+    type                     text             not null references transaction_type (name),
+
+    -- latest revision of this transaction
+    revision_id              bigint           not null references transaction_revision (id) on delete cascade,
+    changed_by               integer          not null references usr (id) on delete restrict,
+    created_at               timestamptz      not null,
+    last_changed             timestamptz      not null,
+
+    value                    double precision not null,
+    currency_symbol          text             not null,
+    currency_conversion_rate double precision not null,
+    name                     text             not null,
+    description              text             not null,
+    billed_at                date             not null,
+    deleted                  bool             not null,
+
+    n_creditor_shares        double precision not null,
+    creditor_shares          json             not null,
+    n_debitor_shares         double precision not null,
+    debitor_shares           json             not null,
+    involved_accounts        integer[]        not null,
+    tags                     varchar(255)[]   not null,
+    positions                json             not null,
+    files                    json             not null
+);
+
+create index transaction_state_group_id_idx on transaction_state (group_id);
+
+-- lookups of the latest revision / history entry of a single transaction or its items
+create index transaction_revision_transaction_id_created_at_idx on transaction_revision (transaction_id, created_at);
+create index purchase_item_transaction_id_idx on purchase_item (transaction_id);
+create index file_transaction_id_idx on file (transaction_id);
+
+-- initial population, mirrors the transaction_state_from_history view
+insert into transaction_state (
+    transaction_id, group_id, type, revision_id, changed_by, created_at, last_changed, value, currency_symbol,
+    currency_conversion_rate, name, description, billed_at, deleted, n_creditor_shares, creditor_shares,
+    n_debitor_shares, debitor_shares, involved_accounts, tags, positions, files
+)
+select
+    t.id,
+    t.group_id,
+    t.type,
+    last_revision.id,
+    last_revision.user_id,
+    last_revision.created_at,
+    last_revision.created_at,
+    details.value,
+    details.currency_symbol,
+    details.currency_conversion_rate,
+    details.name,
+    details.description,
+    details.billed_at,
+    details.deleted,
+    coalesce(cs.n_shares, 0),
+    coalesce(cs.shares, json_build_object()),
+    coalesce(ds.n_shares, 0),
+    coalesce(ds.shares, json_build_object()),
+    coalesce(cs.involved_accounts, array []::int[]) || coalesce(ds.involved_accounts, array []::int[]),
+    coalesce(tt.tag_names, array []::varchar(255)[]),
+    coalesce(positions.json_state, '[]'::json),
+    coalesce(files.json_state, '[]'::json)
+from
+    transaction t
+    join lateral (
+        select tr.id, tr.user_id, tr.created_at
+        from transaction_revision tr
+        where tr.transaction_id = t.id
+        order by tr.created_at desc, tr.id desc
+        limit 1
+    ) last_revision on true
+    join lateral (
+        select th.*
+        from transaction_history th join transaction_revision tr on th.revision_id = tr.id
+        where th.id = t.id
+        order by tr.created_at desc, tr.id desc
+        limit 1
+    ) details on true
+    left join lateral (
+        select sum(s.shares) as n_shares, array_agg(s.account_id) as involved_accounts,
+               json_object_agg(s.account_id, s.shares) as shares
+        from creditor_share s
+        where s.transaction_id = t.id and s.revision_id = details.revision_id
+    ) cs on true
+    left join lateral (
+        select sum(s.shares) as n_shares, array_agg(s.account_id) as involved_accounts,
+               json_object_agg(s.account_id, s.shares) as shares
+        from debitor_share s
+        where s.transaction_id = t.id and s.revision_id = details.revision_id
+    ) ds on true
+    left join lateral (
+        select array_agg(tag.name) as tag_names
+        from transaction_to_tag ttt join tag on ttt.tag_id = tag.id
+        where ttt.transaction_id = t.id and ttt.revision_id = details.revision_id
+    ) tt on true
+    left join lateral (
+        select
+            json_agg(json_build_object(
+                'id', pi.id, 'revision_id', last_revision.id, 'transaction_id', t.id,
+                'changed_by', last_revision.user_id, 'created_at', last_revision.created_at, 'name', pih.name,
+                'price', pih.price, 'communist_shares', pih.communist_shares, 'deleted', pih.deleted,
+                'n_usages', coalesce(usages.n_usages, 0), 'usages', coalesce(usages.usages, json_build_object()),
+                'involved_accounts', coalesce(usages.involved_accounts, array []::int[])
+            )) as json_state
+        from
+            purchase_item pi
+            join lateral (
+                select h.*
+                from purchase_item_history h join transaction_revision tr on h.revision_id = tr.id
+                where h.id = pi.id
+                order by tr.created_at desc, tr.id desc
+                limit 1
+            ) pih on true
+            left join lateral (
+                select sum(u.share_amount) as n_usages, array_agg(u.account_id) as involved_accounts,
+                       json_object_agg(u.account_id, u.share_amount) as usages
+                from purchase_item_usage u
+                where u.item_id = pi.id and u.revision_id = pih.revision_id
+            ) usages on true
+        where pi.transaction_id = t.id
+    ) positions on true
+    left join lateral (
+        select
+            json_agg(json_build_object(
+                'id', f.id, 'revision_id', last_revision.id, 'transaction_id', t.id,
+                'changed_by', last_revision.user_id, 'created_at', last_revision.created_at,
+                'filename', fh.filename, 'mime_type', blob.mime_type, 'blob_id', fh.blob_id, 'deleted', fh.deleted
+            )) as json_state
+        from
+            file f
+            join lateral (
+                select h.*
+                from file_history h join transaction_revision tr on h.revision_id = tr.id
+                where h.id = f.id
+                order by tr.created_at desc, tr.id desc
+                limit 1
+            ) fh on true
+            left join blob on blob.id = fh.blob_id
+        where f.transaction_id = t.id
+    ) files on true;
@@ -0,0 +1,23 @@
+-- revision: 9720d91e
+-- requires: 48ff170a
+
+-- per group counter of committed changes to transactions and accounts, used as cursor for incremental syncs.
+-- it is incremented when a transaction or account revision is committed, the row lock taken by the increment
+-- serializes concurrent commits within a group such that sequence numbers become visible in order.
+create table if not exists group_change_sequence (
+    group_id integer primary key references grp (id) on delete cascade,
+    last_seq bigint  not null default 0
+);
+
+-- sequence number of the last committed change to a transaction / account
+alter table transaction add column change_seq bigint not null default 0;
+alter table account add column change_seq bigint not null default 0;
+
+create index transaction_group_id_change_seq_idx on transaction (group_id, change_seq);
+create index account_group_id_change_seq_idx on account (group_id, change_seq);
+
+-- everything which exists so far counts as the first change of each group
+update transaction set change_seq = 1;
+update account set change_seq = 1;
+insert into group_change_sequence (group_id, last_seq)
+select id, 1 from grp;
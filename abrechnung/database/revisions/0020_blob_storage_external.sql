@@ -0,0 +1,6 @@
+-- revision: 7f46400a
+-- requires: 9720d91e
+
+-- store file contents uncompressed out of line such that ranges of a blob can be read without detoasting all of it.
+-- attachments are mostly images or pdfs which are already compressed, only affects newly written blobs.
+alter table blob alter column content set storage external;
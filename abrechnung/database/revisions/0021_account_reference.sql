@@ -0,0 +1,57 @@
+-- revision: 60132fdf
+-- requires: 7f46400a
+
+-- reverse index of which committed transactions (via their shares or position usages) and clearing accounts reference
+-- an account. rows are maintained by the revision commit triggers and replace scanning the state of all transactions
+-- and accounts when checking whether an account can be deleted.
+create table if not exists account_reference (
+    account_id                   integer not null references account (id) on delete cascade,
+    group_id                     integer not null references grp (id) on delete cascade,
+    referenced_by_transaction_id integer references transaction (id) on delete cascade,
+    referenced_by_account_id     integer references account (id) on delete cascade,
+
+    constraint account_reference_single_referrer check (
+        (referenced_by_transaction_id is null) != (referenced_by_account_id is null)
+    )
+);
+
+create index account_reference_account_id_idx on account_reference (account_id);
+create index account_reference_transaction_id_idx on account_reference (referenced_by_transaction_id);
+create index account_reference_referencing_account_id_idx on account_reference (referenced_by_account_id);
+
+-- initial population, mirrors the update_transaction_account_references procedure
+insert into account_reference (account_id, group_id, referenced_by_transaction_id)
+select distinct
+    refs.account_id,
+    ts.group_id,
+    ts.transaction_id
+from
+    transaction_state ts
+    cross join lateral (
+        select unnest(ts.involved_accounts) as account_id
+        union
+        select json_array_elements_text(p -> 'involved_accounts')::integer
+        from json_array_elements(ts.positions) p
+        where not (p ->> 'deleted')::boolean
+    ) refs
+where
+    not ts.deleted;
+
+-- initial population, mirrors the update_clearing_account_references procedure
+insert into account_reference (account_id, group_id, referenced_by_account_id)
+select distinct
+    cas.share_account_id,
+    a.group_id,
+    a.id
+from
+    account a
+    join lateral (
+        select ah.revision_id, ah.deleted
+        from account_history ah join account_revision ar on ah.revision_id = ar.id
+        where ah.id = a.id
+        order by ar.created_at desc, ar.id desc
+        limit 1
+    ) last_history on true
+    join clearing_account_share cas on cas.account_id = a.id and cas.revision_id = last_history.revision_id
+where
+    not last_history.deleted;
@@ -0,0 +1,7 @@
+-- revision: e3e32428
+-- requires: 60132fdf
+
+-- lookups of the latest revision of a single account, analogous to transaction_revision_transaction_id_created_at_idx.
+-- together with the (group_id, change_seq) indexes on account and transaction and the (id, revision_id) primary keys
+-- of the history tables this backs the group and id scoped state functions.
+create index account_revision_account_id_created_at_idx on account_revision (account_id, created_at);
@@ -0,0 +1,14 @@
+-- revision: 7233722e
+-- requires: e3e32428
+
+-- keyset pagination of the transactions of a group in the supported sort orders
+create index transaction_state_group_id_billed_at_idx on transaction_state (group_id, billed_at, transaction_id);
+create index transaction_state_group_id_last_changed_idx on transaction_state (group_id, last_changed, transaction_id);
+create index transaction_state_group_id_value_idx on transaction_state (group_id, value, transaction_id);
+create index transaction_state_group_id_name_idx on transaction_state (group_id, name, transaction_id);
+
+-- filtering by tags
+create index transaction_state_tags_idx on transaction_state using gin (tags);
+
+-- superseded by the composite indexes above
+drop index transaction_state_group_id_idx;
@@ -0,0 +1,63 @@
+-- revision: 5b0e9c1d
+-- requires: 7233722e
+
+-- full text search documents over the latest committed state of transactions (name, tags, description and the names
+-- of their purchase items) and accounts (name, tags and description). rows are maintained by the revision commit
+-- triggers, deleted transactions and accounts have no search document.
+create table if not exists search_document (
+    group_id       integer  not null references grp (id) on delete cascade,
+    transaction_id integer references transaction (id) on delete cascade,
+    account_id     integer references account (id) on delete cascade,
+    document       tsvector not null,
+
+    constraint search_document_single_object check ((transaction_id is null) != (account_id is null))
+);
+
+create unique index search_document_transaction_id_idx on search_document (transaction_id);
+create unique index search_document_account_id_idx on search_document (account_id);
+create index search_document_group_id_idx on search_document (group_id);
+create index search_document_document_idx on search_document using gin (document);
+
+-- initial population, mirrors the update_transaction_search_document procedure
+insert into search_document (group_id, transaction_id, document)
+select
+    ts.group_id,
+    ts.transaction_id,
+    setweight(to_tsvector('simple', ts.name), 'A') ||
+    setweight(to_tsvector('simple', array_to_string(ts.tags, ' ')), 'A') ||
+    setweight(to_tsvector('simple', ts.description), 'B') ||
+    setweight(to_tsvector('simple', coalesce(positions.names, '')), 'C')
+from
+    transaction_state ts
+    left join lateral (
+        select string_agg(p ->> 'name', ' ') as names
+        from json_array_elements(ts.positions) p
+        where not (p ->> 'deleted')::boolean
+    ) positions on true
+where
+    not ts.deleted;
+
+-- initial population, mirrors the update_account_search_document procedure
+insert into search_document (group_id, account_id, document)
+select
+    a.group_id,
+    a.id,
+    setweight(to_tsvector('simple', last_history.name), 'A') ||
+    setweight(to_tsvector('simple', coalesce(tags.names, '')), 'A') ||
+    setweight(to_tsvector('simple', last_history.description), 'B')
+from
+    account a
+    join lateral (
+        select ah.revision_id, ah.name, ah.description, ah.deleted
+        from account_history ah join account_revision ar on ah.revision_id = ar.id
+        where ah.id = a.id
+        order by ar.created_at desc, ar.id desc
+        limit 1
+    ) last_history on true
+    left join lateral (
+        select string_agg(tag.name, ' ') as names
+        from account_to_tag att join tag on att.tag_id = tag.id
+        where att.account_id = a.id and att.revision_id = last_history.revision_id
+    ) tags on true
+where
+    not last_history.deleted;
@@ -0,0 +1,25 @@
+-- revision: 9d3a6e21
+-- requires: 5b0e9c1d
+
+-- failed mail deliveries are retried with an exponential backoff written to mail_next_attempt. once the number of
+-- attempts is exhausted or the mail server permanently rejected the mail the row is dead-lettered by setting
+-- mail_failed_at, mail_next_attempt is then NULL as well.
+alter table pending_registration add column mail_attempts integer not null default 0;
+alter table pending_registration add column mail_failed_at timestamptz;
+alter table pending_registration add column mail_last_error text;
+
+alter table pending_password_recovery add column mail_attempts integer not null default 0;
+alter table pending_password_recovery add column mail_failed_at timestamptz;
+alter table pending_password_recovery add column mail_last_error text;
+
+alter table pending_email_change add column mail_attempts integer not null default 0;
+alter table pending_email_change add column mail_failed_at timestamptz;
+alter table pending_email_change add column mail_last_error text;
+
+-- lookup of due and next scheduled mail deliveries
+create index pending_registration_mail_next_attempt_idx on pending_registration (mail_next_attempt)
+    where mail_next_attempt is not null;
+create index pending_password_recovery_mail_next_attempt_idx on pending_password_recovery (mail_next_attempt)
+    where mail_next_attempt is not null;
+create index pending_email_change_mail_next_attempt_idx on pending_email_change (mail_next_attempt)
+    where mail_next_attempt is not null;
@@ -0,0 +1,105 @@
+-- revision: c41f7a58
+-- requires: 9d3a6e21
+
+-- committed effect of every non-deleted transaction on the accounts involved in it, one row per (transaction, account).
+-- the effect of the previous state of a transaction is taken back from account_balance when a new revision of it is
+-- committed, rows are maintained by the transaction revision commit trigger.
+create table if not exists transaction_balance_effect (
+    transaction_id   integer          not null references transaction (id) on delete cascade,
+    account_id       integer          not null references account (id) on delete cascade,
+    group_id         integer          not null references grp (id) on delete cascade,
+    positions        double precision not null,
+    common_creditors double precision not null,
+    common_debitors  double precision not null,
+
+    primary key (transaction_id, account_id)
+);
+
+create index transaction_balance_effect_group_id_idx on transaction_balance_effect (group_id);
+
+-- sum of the committed transaction balance effects per account, i.e. the balances before clearing accounts are resolved
+create table if not exists account_balance (
+    account_id     integer primary key references account (id) on delete cascade,
+    group_id       integer          not null references grp (id) on delete cascade,
+    balance        double precision not null,
+    total_paid     double precision not null,
+    total_consumed double precision not null
+);
+
+create index account_balance_group_id_idx on account_balance (group_id);
+
+-- initial population, mirrors the transaction_balance_effect_from_state function
+insert into transaction_balance_effect (
+    transaction_id, account_id, group_id, positions, common_creditors, common_debitors
+)
+with live_transaction as (
+    select ts.* from transaction_state ts where not ts.deleted
+),
+position as (
+    select
+        lt.transaction_id,
+        p.price,
+        p.communist_shares,
+        p.usages,
+        case when p.communist_shares + p.n_usages > 0 then p.price / (p.communist_shares + p.n_usages) else 0 end
+            as price_per_share
+    from
+        live_transaction lt
+        cross join json_to_recordset(lt.positions) as p(
+            price double precision, communist_shares double precision, n_usages double precision, usages json,
+            deleted boolean
+        )
+    where
+        not p.deleted
+),
+remaining as (
+    select
+        lt.transaction_id,
+        lt.value - coalesce(sum(p.price - p.price_per_share * p.communist_shares), 0) as value
+    from
+        live_transaction lt
+        left join position p on p.transaction_id = lt.transaction_id
+    group by
+        lt.transaction_id, lt.value
+),
+contribution as (
+    select p.transaction_id, u.key::integer as account_id, p.price_per_share * u.value::double precision as positions,
+           0::double precision as common_creditors, 0::double precision as common_debitors
+    from position p cross join json_each_text(p.usages) u
+    union all
+    select lt.transaction_id, c.key::integer, 0,
+           case when lt.n_creditor_shares > 0 then lt.value / lt.n_creditor_shares * c.value::double precision else 0 end,
+           0
+    from live_transaction lt cross join json_each_text(lt.creditor_shares) c
+    union all
+    select lt.transaction_id, d.key::integer, 0, 0,
+           case when lt.n_debitor_shares > 0 then r.value / lt.n_debitor_shares * d.value::double precision else 0 end
+    from
+        live_transaction lt
+        join remaining r on r.transaction_id = lt.transaction_id
+        cross join json_each_text(lt.debitor_shares) d
+)
+select
+    c.transaction_id,
+    c.account_id,
+    lt.group_id,
+    sum(c.positions),
+    sum(c.common_creditors),
+    sum(c.common_debitors)
+from
+    contribution c
+    join live_transaction lt on lt.transaction_id = c.transaction_id
+group by
+    c.transaction_id, c.account_id, lt.group_id;
+
+insert into account_balance (account_id, group_id, balance, total_paid, total_consumed)
+select
+    tbe.account_id,
+    tbe.group_id,
+    sum(tbe.common_creditors - tbe.positions - tbe.common_debitors),
+    sum(tbe.common_creditors),
+    sum(tbe.positions + tbe.common_debitors)
+from
+    transaction_balance_effect tbe
+group by
+    tbe.account_id, tbe.group_id;
@@ -0,0 +1,16 @@
+-- revision: e8b2d4f1
+-- requires: c41f7a58
+
+-- transaction_balance_effect doubles as per account ledger of balance changes ordered by the billing date of the
+-- transactions, used to serve the balance history of an account without loading all transactions of its group.
+alter table transaction_balance_effect add column billed_at date;
+
+update transaction_balance_effect tbe
+set billed_at = ts.billed_at
+from transaction_state ts
+where ts.transaction_id = tbe.transaction_id;
+
+alter table transaction_balance_effect alter column billed_at set not null;
+
+create index transaction_balance_effect_account_id_billed_at_idx
+    on transaction_balance_effect (account_id, billed_at, transaction_id);
@@ -0,0 +1,72 @@
+from datetime import date
+from enum import Enum
+from typing import Optional
+
+from pydantic import BaseModel
+
+
+class TransactionAccountBalance(BaseModel):
+    total: float = 0.0
+    positions: float = 0.0
+    common_creditors: float = 0.0
+    common_debitors: float = 0.0
+
+
+# maps account IDs to the effect a single transaction has on their balance
+TransactionBalanceEffect = dict[int, TransactionAccountBalance]
+
+
+class AccountBalance(BaseModel):
+    balance: float = 0.0
+    before_clearing: float = 0.0
+    total_consumed: float = 0.0
+    total_paid: float = 0.0
+    # maps account IDs to the amount a clearing account redistributed to them
+    clearing_resolution: dict[int, float] = {}
+
+
+AccountBalanceMap = dict[int, AccountBalance]
+
+
+class SettlementMode(Enum):
+    # heap based greedy matching of the largest creditors and debitors, at most one transfer less than accounts
+    greedy = "greedy"
+    # exact minimum number of transfers, only feasible for groups with few accounts with a non-zero balance
+    min_transfers = "min_transfers"
+
+
+class SettlementTransfer(BaseModel):
+    # same semantics as a transfer transaction, the creditor pays the amount to the debitor
+    creditor_id: int
+    debitor_id: int
+    payment_amount: float
+
+
+SettlementPlan = list[SettlementTransfer]
+
+
+class BalanceHistoryInterval(Enum):
+    day = "day"
+    week = "week"
+    month = "month"
+
+
+class BalanceChangeOriginType(Enum):
+    transaction = "transaction"
+    clearing = "clearing"
+
+
+class BalanceChangeOrigin(BaseModel):
+    type: BalanceChangeOriginType
+    id: int
+
+
+class BalanceHistoryEntry(BaseModel):
+    # date of the change, or the first day of the interval when changes are aggregated
+    date: date
+    change: float
+    # running balance of the account including this entry
+    balance: float
+    n_changes: int = 1
+    # the transaction or clearing account causing the change, not set for aggregated changes
+    change_origin: Optional[BalanceChangeOrigin] = None
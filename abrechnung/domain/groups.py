@@ -3,6 +3,9 @@ from typing import Optional
 
 from pydantic import BaseModel
 
+from abrechnung.domain.accounts import Account
+from abrechnung.domain.transactions import Transaction
+
 
 class GroupMember(BaseModel):
     user_id: int
@@ -54,3 +57,11 @@ class GroupPreview(BaseModel):
     invite_single_use: bool
     invite_valid_until: datetime
     invite_description: str
+
+
+class GroupChanges(BaseModel):
+    # change sequence number of the group up to which changes are included, use as 'since' in the next sync
+    seq: int
+    # changed transactions and accounts, deleted ones are included with their 'deleted' flag set
+    transactions: list[Transaction]
+    accounts: list[Account]
@@ -0,0 +1,14 @@
+from enum import Enum
+
+from pydantic import BaseModel
+
+
+class SearchHitType(Enum):
+    transaction = "transaction"
+    account = "account"
+
+
+class SearchHit(BaseModel):
+    type: SearchHitType
+    id: int
+    rank: float
@@ -111,3 +111,32 @@ class Transaction(BaseModel):
 
     positions: list[TransactionPosition]
     files: list[FileAttachment]
+
+
+class TransactionSortOrder(Enum):
+    billed_at_asc = "billed_at_asc"
+    billed_at_desc = "billed_at_desc"
+    last_changed_asc = "last_changed_asc"
+    last_changed_desc = "last_changed_desc"
+    value_asc = "value_asc"
+    value_desc = "value_desc"
+    name_asc = "name_asc"
+    name_desc = "name_desc"
+
+
+class TransactionFilter(BaseModel):
+    # transactions having at least one of the given tags
+    tags: list[str] = []
+    # transactions referencing the given account in one of their shares or position usages
+    account_id: int | None = None
+    type: TransactionType | None = None
+    billed_from: date | None = None
+    billed_to: date | None = None
+    # case insensitive substring match on name and description
+    search: str | None = None
+
+
+class TransactionExport(BaseModel):
+    group_id: int
+    # maps the ids of all accounts of the group to their name, every account gets a column in the export
+    accounts: dict[int, str]
@@ -9,15 +9,26 @@ from starlette.exceptions import HTTPException as StarletteHTTPException
 
 from abrechnung import __version__
 from abrechnung.application.accounts import AccountService
+from abrechnung.application.balances import BalanceService
 from abrechnung.application.groups import GroupService
+from abrechnung.application.search import SearchService
 from abrechnung.application.transactions import TransactionService
 from abrechnung.application.users import UserService
 from abrechnung.config import Config
-from abrechnung.core.errors import InvalidCommand, NotFoundError
+from abrechnung.core.errors import InvalidCommand, NotFoundError, TooManyRequests
 from abrechnung.framework.database import create_db_pool
 
 from .middleware import ContextMiddleware
-from .routers import accounts, auth, common, groups, transactions, websocket
+from .routers import (
+    accounts,
+    auth,
+    balances,
+    common,
+    groups,
+    search,
+    transactions,
+    websocket,
+)
 from .routers.websocket import NotificationManager
 
 
@@ -39,6 +50,8 @@ class Api:
         self.api.include_router(groups.router)
         self.api.include_router(auth.router)
         self.api.include_router(accounts.router)
+        self.api.include_router(balances.router)
+        self.api.include_router(search.router)
         self.api.include_router(common.router)
         self.api.include_router(websocket.router)
         self.api.add_middleware(
@@ -47,6 +60,7 @@ class Api:
             allow_credentials=True,
             allow_methods=["*"],
             allow_headers=["*"],
+            expose_headers=["X-Next-Cursor"],
         )
 
         bad_request_handler = self.make_generic_exception_handler(status.HTTP_400_BAD_REQUEST)
@@ -60,6 +74,9 @@ class Api:
             bad_request_handler,
         )
         self.api.add_exception_handler(InvalidCommand, bad_request_handler)
+        self.api.add_exception_handler(
+            TooManyRequests, self.make_generic_exception_handler(status.HTTP_429_TOO_MANY_REQUESTS)
+        )
         self.api.add_exception_handler(StarletteHTTPException, self._http_exception_handler)
 
         self.uvicorn_config = uvicorn.Config(
@@ -67,16 +84,19 @@ class Api:
             host=config.api.host,
             port=config.api.port,
             log_level=logging.root.level,
+            proxy_headers=True,
+            forwarded_allow_ips=config.api.forwarded_allow_ips,
         )
 
     @staticmethod
-    def _format_error_message(code: int, message: str):
+    def _format_error_message(code: int, message: str, headers: dict[str, str] | None = None):
         return JSONResponse(
             status_code=code,
             content={
                 "code": code,
                 "msg": message,
             },
+            headers=headers,
         )
 
     def make_generic_exception_handler(self, status_code: int):
@@ -87,7 +107,7 @@ class Api:
 
     async def _http_exception_handler(self, request: Request, exc: Exception):
         if isinstance(exc, StarletteHTTPException):
-            return self._format_error_message(exc.status_code, exc.detail)
+            return self._format_error_message(exc.status_code, exc.detail, exc.headers)
 
     async def _setup(self):
         self.db_pool = await create_db_pool(self.cfg.database)
@@ -95,9 +115,12 @@ class Api:
         self.transaction_service = TransactionService(db_pool=self.db_pool, config=self.cfg)
         self.account_service = AccountService(db_pool=self.db_pool, config=self.cfg)
         self.group_service = GroupService(db_pool=self.db_pool, config=self.cfg)
+        self.balance_service = BalanceService(db_pool=self.db_pool, config=self.cfg)
+        self.search_service = SearchService(db_pool=self.db_pool, config=self.cfg)
         self.notification_manager = NotificationManager(config=self.cfg)
 
         await self.notification_manager.initialize(db_pool=self.db_pool)
+        await self.notification_manager.add_listener("user_cache", self.user_service.on_user_cache_notification)
 
         self.api.add_middleware(
             ContextMiddleware,
@@ -107,11 +130,14 @@ class Api:
             transaction_service=self.transaction_service,
             account_service=self.account_service,
             group_service=self.group_service,
+            balance_service=self.balance_service,
+            search_service=self.search_service,
             notification_manager=self.notification_manager,
         )
 
     async def _teardown(self):
         await self.notification_manager.teardown()
+        self.user_service.shutdown()
         await self.db_pool.close()
 
     async def run(self):
@@ -2,7 +2,9 @@ import asyncpg
 from fastapi import Depends, Request
 
 from abrechnung.application.accounts import AccountService
+from abrechnung.application.balances import BalanceService
 from abrechnung.application.groups import GroupService
+from abrechnung.application.search import SearchService
 from abrechnung.application.transactions import TransactionService
 from abrechnung.application.users import UserService
 from abrechnung.config import Config
@@ -45,3 +47,11 @@ def get_account_service(request: Request) -> AccountService:
 
 def get_transaction_service(request: Request) -> TransactionService:
     return request.state.transaction_service
+
+
+def get_balance_service(request: Request) -> BalanceService:
+    return request.state.balance_service
+
+
+def get_search_service(request: Request) -> SearchService:
+    return request.state.search_service
@@ -6,7 +6,9 @@ from starlette.types import ASGIApp, Receive, Scope, Send
 from starlette.websockets import WebSocket
 
 from abrechnung.application.accounts import AccountService
+from abrechnung.application.balances import BalanceService
 from abrechnung.application.groups import GroupService
+from abrechnung.application.search import SearchService
 from abrechnung.application.transactions import TransactionService
 from abrechnung.application.users import UserService
 from abrechnung.config import Config
@@ -23,6 +25,8 @@ class ContextMiddleware:
         transaction_service: TransactionService,
         account_service: AccountService,
         group_service: GroupService,
+        balance_service: BalanceService,
+        search_service: SearchService,
         notification_manager: NotificationManager,
     ) -> None:
         self.app = app
@@ -33,6 +37,8 @@ class ContextMiddleware:
         self.transaction_service = transaction_service
         self.account_service = account_service
         self.group_service = group_service
+        self.balance_service = balance_service
+        self.search_service = search_service
         self.notification_manager = notification_manager
 
     async def __call__(self, scope: Scope, receive: Receive, send: Send):
@@ -49,6 +55,8 @@ class ContextMiddleware:
         req.state.transaction_service = self.transaction_service
         req.state.account_service = self.account_service
         req.state.group_service = self.group_service
+        req.state.balance_service = self.balance_service
+        req.state.search_service = self.search_service
         req.state.notification_manager = self.notification_manager
 
         await self.app(scope, receive, send)
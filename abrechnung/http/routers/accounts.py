@@ -1,7 +1,7 @@
-from datetime import date
+from datetime import date, datetime
 from typing import List, Optional
 
-from fastapi import APIRouter, Depends, status
+from fastapi import APIRouter, Depends, Request, status
 from pydantic import BaseModel
 
 from abrechnung.application.accounts import AccountService
@@ -9,6 +9,7 @@ from abrechnung.domain.accounts import Account, ClearingShares, NewAccount
 from abrechnung.domain.users import User
 from abrechnung.http.auth import get_current_user
 from abrechnung.http.dependencies import get_account_service
+from abrechnung.http.utils import json_response
 
 router = APIRouter(
     prefix="/api",
@@ -29,10 +30,13 @@ router = APIRouter(
 )
 async def list_accounts(
     group_id: int,
+    request: Request,
+    valid_at: Optional[datetime] = None,
     user: User = Depends(get_current_user),
     account_service: AccountService = Depends(get_account_service),
 ):
-    return await account_service.list_accounts(user=user, group_id=group_id)
+    content = await account_service.list_accounts_json(user=user, group_id=group_id, valid_at=valid_at)
+    return await json_response(request, content)
 
 
 @router.post(
@@ -61,10 +65,11 @@ async def create_account(
 )
 async def get_account(
     account_id: int,
+    valid_at: Optional[datetime] = None,
     user: User = Depends(get_current_user),
     account_service: AccountService = Depends(get_account_service),
 ):
-    return await account_service.get_account(user=user, account_id=account_id)
+    return await account_service.get_account(user=user, account_id=account_id, valid_at=valid_at)
 
 
 @router.post(
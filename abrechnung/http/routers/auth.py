@@ -1,6 +1,6 @@
 from typing import Optional
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordRequestForm
 from pydantic import BaseModel, EmailStr
 
@@ -26,6 +26,7 @@ class Token(BaseModel):
     "/v1/auth/token", summary="login with username and password", response_model=Token, operation_id="get_token"
 )
 async def get_token(
+    request: Request,
     form_data: OAuth2PasswordRequestForm = Depends(),
     user_service: UserService = Depends(get_user_service),
 ):
@@ -33,6 +34,7 @@ async def get_token(
         username=form_data.username,
         password=form_data.password,
         session_name="foobar",  # TODO: FIXME
+        client_address=request.client.host if request.client else None,
     )
 
     return Token(user_id=user_id, access_token=access_token)
@@ -47,12 +49,14 @@ class LoginPayload(BaseModel):
 @router.post("/v1/auth/login", summary="login with username and password", response_model=Token, operation_id="login")
 async def login(
     payload: LoginPayload,
+    request: Request,
     user_service: UserService = Depends(get_user_service),
 ):
     user_id, session_id, access_token = await user_service.login_user(
         username=payload.username,
         password=payload.password,
         session_name=payload.session_name,
+        client_address=request.client.host if request.client else None,
     )
 
     return Token(user_id=user_id, access_token=access_token)
@@ -0,0 +1,71 @@
+from datetime import datetime
+from typing import Optional
+
+from fastapi import APIRouter, Depends, status
+
+from abrechnung.application.balances import BalanceService
+from abrechnung.domain.balances import (
+    AccountBalanceMap,
+    BalanceHistoryEntry,
+    BalanceHistoryInterval,
+    SettlementMode,
+    SettlementPlan,
+)
+from abrechnung.domain.users import User
+from abrechnung.http.auth import get_current_user
+from abrechnung.http.dependencies import get_balance_service
+
+router = APIRouter(
+    prefix="/api",
+    tags=["balances"],
+    responses={
+        status.HTTP_401_UNAUTHORIZED: {"description": "unauthorized"},
+        status.HTTP_403_FORBIDDEN: {"description": "forbidden"},
+        status.HTTP_404_NOT_FOUND: {"description": "Not found"},
+    },
+)
+
+
+@router.get(
+    r"/v1/groups/{group_id}/balances",
+    summary="compute the balances of all accounts in a group",
+    response_model=AccountBalanceMap,
+    operation_id="get_balances",
+)
+async def get_balances(
+    group_id: int,
+    valid_at: Optional[datetime] = None,
+    user: User = Depends(get_current_user),
+    balance_service: BalanceService = Depends(get_balance_service),
+):
+    return await balance_service.get_balances(user=user, group_id=group_id, valid_at=valid_at)
+
+
+@router.get(
+    r"/v1/groups/{group_id}/settlement",
+    summary="compute a plan of transfers which settles the balances of all accounts in a group",
+    response_model=SettlementPlan,
+    operation_id="get_settlement",
+)
+async def get_settlement(
+    group_id: int,
+    mode: SettlementMode = SettlementMode.greedy,
+    user: User = Depends(get_current_user),
+    balance_service: BalanceService = Depends(get_balance_service),
+):
+    return await balance_service.get_settlement(user=user, group_id=group_id, mode=mode)
+
+
+@router.get(
+    r"/v1/accounts/{account_id}/balance_history",
+    summary="compute the running balance of an account over time",
+    response_model=list[BalanceHistoryEntry],
+    operation_id="get_account_balance_history",
+)
+async def get_account_balance_history(
+    account_id: int,
+    interval: Optional[BalanceHistoryInterval] = None,
+    user: User = Depends(get_current_user),
+    balance_service: BalanceService = Depends(get_balance_service),
+):
+    return await balance_service.get_account_balance_history(user=user, account_id=account_id, interval=interval)
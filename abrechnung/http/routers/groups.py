@@ -7,6 +7,7 @@ from pydantic import BaseModel
 from abrechnung.application.groups import GroupService
 from abrechnung.domain.groups import (
     Group,
+    GroupChanges,
     GroupInvite,
     GroupLog,
     GroupMember,
@@ -187,6 +188,21 @@ async def list_log(
     return await group_service.list_log(user=user, group_id=group_id)
 
 
+@router.get(
+    r"/v1/groups/{group_id}/changes",
+    summary="fetch all transactions and accounts changed since the given change sequence number",
+    response_model=GroupChanges,
+    operation_id="list_group_changes",
+)
+async def list_changes(
+    group_id: int,
+    since: int = 0,
+    user: User = Depends(get_current_user),
+    group_service: GroupService = Depends(get_group_service),
+):
+    return await group_service.list_changes(user=user, group_id=group_id, since=since)
+
+
 class GroupMessage(BaseModel):
     message: str
 
@@ -0,0 +1,35 @@
+from fastapi import APIRouter, Depends, Query, status
+
+from abrechnung.application.search import SearchService
+from abrechnung.domain.search import SearchHit
+from abrechnung.domain.users import User
+from abrechnung.http.auth import get_current_user
+from abrechnung.http.dependencies import get_search_service
+
+router = APIRouter(
+    prefix="/api",
+    tags=["search"],
+    responses={
+        status.HTTP_401_UNAUTHORIZED: {"description": "unauthorized"},
+        status.HTTP_403_FORBIDDEN: {"description": "forbidden"},
+        status.HTTP_404_NOT_FOUND: {"description": "Not found"},
+    },
+)
+
+MAX_SEARCH_RESULTS = 200
+
+
+@router.get(
+    r"/v1/groups/{group_id}/search",
+    summary="search the transactions and accounts of a group",
+    response_model=list[SearchHit],
+    operation_id="search",
+)
+async def search(
+    group_id: int,
+    q: str = Query(..., min_length=1),
+    limit: int = Query(50, ge=1, le=MAX_SEARCH_RESULTS),
+    user: User = Depends(get_current_user),
+    search_service: SearchService = Depends(get_search_service),
+):
+    return await search_service.search(user=user, group_id=group_id, query=q, limit=limit)
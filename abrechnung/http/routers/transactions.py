@@ -1,19 +1,36 @@
-from datetime import datetime
+from datetime import date, datetime
 from typing import Optional
 
-from fastapi import APIRouter, Depends, HTTPException, Response, UploadFile, status
+from fastapi import (
+    APIRouter,
+    Depends,
+    HTTPException,
+    Query,
+    Request,
+    Response,
+    UploadFile,
+    status,
+)
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 
 from abrechnung.application.transactions import TransactionService
 from abrechnung.domain.transactions import (
     NewTransaction,
     Transaction,
+    TransactionFilter,
     TransactionPosition,
+    TransactionSortOrder,
+    TransactionType,
     UpdateTransaction,
 )
 from abrechnung.domain.users import User
 from abrechnung.http.auth import get_current_user
 from abrechnung.http.dependencies import get_transaction_service
+from abrechnung.http.utils import json_response
+
+# maximum number of transactions returned in a single page
+MAX_TRANSACTION_PAGE_SIZE = 1000
 
 router = APIRouter(
     prefix="/api",
@@ -29,13 +46,25 @@ router = APIRouter(
 @router.get(
     "/v1/groups/{group_id}/transactions",
     summary="list all transactions in a group",
+    description="If a limit is given the cursor to fetch the next page is returned in the X-Next-Cursor header.",
     response_model=list[Transaction],
     operation_id="list_transactions",
 )
 async def list_transactions(
     group_id: int,
+    request: Request,
+    valid_at: Optional[datetime] = None,
     min_last_changed: Optional[datetime] = None,
     transaction_ids: Optional[str] = None,
+    tags: list[str] = Query([]),
+    account_id: Optional[int] = None,
+    type: Optional[TransactionType] = None,
+    billed_from: Optional[date] = None,
+    billed_to: Optional[date] = None,
+    search: Optional[str] = None,
+    sort: TransactionSortOrder = TransactionSortOrder.billed_at_desc,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_TRANSACTION_PAGE_SIZE),
+    cursor: Optional[str] = None,
     user: User = Depends(get_current_user),
     transaction_service: TransactionService = Depends(get_transaction_service),
 ):
@@ -49,11 +78,45 @@ async def list_transactions(
                 detail="Invalid query param 'transaction_ids', must be a comma separated list of integers",
             )
 
-    return await transaction_service.list_transactions(
+    content, next_cursor = await transaction_service.list_transactions_json(
         user=user,
         group_id=group_id,
+        valid_at=valid_at,
         min_last_changed=min_last_changed,
         additional_transactions=forced_transaction_ids,
+        filters=TransactionFilter(
+            tags=tags,
+            account_id=account_id,
+            type=type,
+            billed_from=billed_from,
+            billed_to=billed_to,
+            search=search,
+        ),
+        sort=sort,
+        limit=limit,
+        cursor=cursor,
+    )
+    headers = {"X-Next-Cursor": next_cursor} if next_cursor is not None else None
+    return await json_response(request, content, headers=headers)
+
+
+@router.get(
+    "/v1/groups/{group_id}/transactions/export",
+    summary="export all transactions in a group as CSV",
+    description="Streams one row per transaction with its balance effect on every account of the group.",
+    operation_id="export_transactions",
+    response_class=StreamingResponse,
+)
+async def export_transactions(
+    group_id: int,
+    user: User = Depends(get_current_user),
+    transaction_service: TransactionService = Depends(get_transaction_service),
+):
+    export = await transaction_service.prepare_transaction_export(user=user, group_id=group_id)
+    return StreamingResponse(
+        transaction_service.export_transactions_csv(export=export),
+        media_type="text/csv; charset=utf-8",
+        headers={"Content-Disposition": f'attachment; filename="transactions-{group_id}.csv"'},
     )
 
 
@@ -78,6 +141,29 @@ async def create_transaction(
     return await transaction_service.get_transaction(user=user, transaction_id=transaction_id)
 
 
+class BulkCreateTransactionsPayload(BaseModel):
+    transactions: list[NewTransaction]
+
+
+@router.post(
+    "/v1/groups/{group_id}/transactions/bulk",
+    summary="create many transactions at once, returns the ids of the created transactions",
+    response_model=list[int],
+    operation_id="create_transactions_bulk",
+)
+async def create_transactions_bulk(
+    group_id: int,
+    payload: BulkCreateTransactionsPayload,
+    user: User = Depends(get_current_user),
+    transaction_service: TransactionService = Depends(get_transaction_service),
+):
+    return await transaction_service.create_transactions_bulk(
+        user=user,
+        group_id=group_id,
+        transactions=payload.transactions,
+    )
+
+
 @router.get(
     "/v1/transactions/{transaction_id}",
     summary="get transaction details",
@@ -86,10 +172,11 @@ async def create_transaction(
 )
 async def get_transaction(
     transaction_id: int,
+    valid_at: Optional[datetime] = None,
     user: User = Depends(get_current_user),
     transaction_service: TransactionService = Depends(get_transaction_service),
 ):
-    return await transaction_service.get_transaction(user=user, transaction_id=transaction_id)
+    return await transaction_service.get_transaction(user=user, transaction_id=transaction_id, valid_at=valid_at)
 
 
 @router.post(
@@ -154,6 +241,46 @@ async def delete_transaction(
     return await transaction_service.get_transaction(user=user, transaction_id=transaction_id)
 
 
+# blobs are immutable, once fetched a file attachment can be cached indefinitely by the client
+FILE_CACHE_CONTROL = "private, max-age=31536000, immutable"
+
+
+def _parse_range_header(range_header: str, size: int) -> Optional[tuple[int, int]]:
+    """
+    parse a single byte range of a http range header into the inclusive start and end offsets.
+
+    Returns None if the header should be ignored, i.e. the whole file is to be sent.
+    """
+    unit, _, ranges = range_header.partition("=")
+    if unit.strip() != "bytes" or "," in ranges:
+        # multipart ranges are not supported, serving the full content is a valid response
+        return None
+
+    start_str, sep, end_str = ranges.strip().partition("-")
+    try:
+        if not sep:
+            return None
+        if start_str == "":
+            # suffix range, the last n bytes
+            suffix_length = int(end_str)
+            if suffix_length <= 0:
+                raise ValueError
+            start, end = max(size - suffix_length, 0), size - 1
+        else:
+            start = int(start_str)
+            end = min(int(end_str), size - 1) if end_str else size - 1
+    except ValueError:
+        return None
+
+    if start < 0 or start > end or start >= size:
+        raise HTTPException(
+            status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+            detail="requested range not satisfiable",
+            headers={"Content-Range": f"bytes */{size}"},
+        )
+    return start, end
+
+
 @router.get(
     "/v1/files/{file_id}/{blob_id}",
     summary="fetch the (binary) contents of a transaction attachment",
@@ -163,13 +290,40 @@ async def delete_transaction(
 async def get_file_contents(
     file_id: int,
     blob_id: int,
+    request: Request,
     user: User = Depends(get_current_user),
     transaction_service: TransactionService = Depends(get_transaction_service),
 ):
-    mime_type, content = await transaction_service.read_file_contents(
+    mime_type, size = await transaction_service.get_file_metadata(
         user=user,
         file_id=file_id,
         blob_id=blob_id,
     )
 
-    return Response(content=content, media_type=mime_type)
+    etag = f'"{blob_id}"'
+    headers = {"ETag": etag, "Cache-Control": FILE_CACHE_CONTROL, "Accept-Ranges": "bytes"}
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        if "*" in tags or etag in tags:
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    start, end = 0, size - 1
+    status_code = status.HTTP_200_OK
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if range_header is not None and size > 0 and (if_range is None or if_range == etag):
+        requested_range = _parse_range_header(range_header, size)
+        if requested_range is not None:
+            start, end = requested_range
+            status_code = status.HTTP_206_PARTIAL_CONTENT
+            headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+
+    headers["Content-Length"] = str(end - start + 1)
+    return StreamingResponse(
+        transaction_service.read_file_chunks(blob_id=blob_id, start=start, end=end),
+        status_code=status_code,
+        media_type=mime_type,
+        headers=headers,
+    )
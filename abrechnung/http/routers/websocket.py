@@ -2,10 +2,12 @@ import asyncio
 import json
 import logging
 import traceback
-from typing import Optional
+from collections import Counter, deque
+from typing import Callable, Optional
 
 import asyncpg
-from fastapi import APIRouter, Request, WebSocket, WebSocketException, status
+from fastapi import APIRouter, WebSocket, WebSocketException, status
+from pydantic import BaseModel
 
 from abrechnung.application.users import UserService
 from abrechnung.config import Config
@@ -17,17 +19,121 @@ router = APIRouter(
 )
 
 
+# interval in seconds in which the notification delivery metrics of this api instance are logged
+METRICS_LOG_INTERVAL = 60
+
+
 def make_error_msg(code: int, msg: str) -> dict:
     return {"type": "error", "data": {"code": code, "msg": msg}}
 
 
+class NotificationMetrics(BaseModel):
+    n_connections: int
+    # number of messages currently waiting to be sent, summed up over / maximum of all connections
+    total_queue_depth: int
+    max_queue_depth: int
+    # notifications dropped due to full send queues since startup
+    n_dropped: int
+    # notifications skipped as an identical one was still waiting to be sent since startup
+    n_coalesced: int
+
+
+class WebsocketSender:
+    """
+    Bounded outgoing message queue of a single websocket connection, drained by its own writer task.
+
+    Sending never blocks and the queue never holds more than max_queue_size messages. Notifications only tell
+    clients that something changed, therefore a notification which is already waiting to be sent is not queued again
+    and on overflow the oldest pending notification is dropped. Responses to client messages are only dropped if the
+    queue is full of responses, i.e. if the client keeps sending messages without reading the responses.
+    """
+
+    def __init__(self, connection_id: int, websocket: WebSocket, max_queue_size: int):
+        self.logger = logging.getLogger(__name__)
+        self.connection_id = connection_id
+        self.websocket = websocket
+        self.max_queue_size = max_queue_size
+
+        # queued messages as tuples of (serialized message, is droppable)
+        self._queue: deque[tuple[str, bool]] = deque()
+        self._queued_notifications: Counter[str] = Counter()
+        self._has_messages = asyncio.Event()
+
+        self.n_dropped = 0
+        self.n_coalesced = 0
+
+        self._writer = asyncio.create_task(self._write_messages())
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._queue)
+
+    def _make_room(self) -> bool:
+        """drop the oldest pending notification if the queue is full, returns whether a message can be queued"""
+        if len(self._queue) < self.max_queue_size:
+            return True
+
+        for i, (queued_message, droppable) in enumerate(self._queue):
+            if droppable:
+                del self._queue[i]
+                self._queued_notifications[queued_message] -= 1
+                self.n_dropped += 1
+                self.logger.warning(f"[{self.connection_id}] tx queue full, dropped oldest notification")
+                return True
+
+        self.n_dropped += 1
+        self.logger.warning(f"[{self.connection_id}] tx queue full of responses, dropped message")
+        return False
+
+    def send_notification(self, message: str):
+        if self._queued_notifications[message] > 0:
+            self.n_coalesced += 1
+            return
+
+        if not self._make_room():
+            return
+
+        self._queue.append((message, True))
+        self._queued_notifications[message] += 1
+        self._has_messages.set()
+
+    def send_response(self, message: str):
+        if not self._make_room():
+            return
+
+        self._queue.append((message, False))
+        self._has_messages.set()
+
+    async def _write_messages(self):
+        try:
+            while True:
+                await self._has_messages.wait()
+                while self._queue:
+                    message, droppable = self._queue.popleft()
+                    if droppable:
+                        self._queued_notifications[message] -= 1
+                    await self.websocket.send_text(message)
+                self._has_messages.clear()
+        except asyncio.CancelledError:
+            pass
+        except Exception as exc:  # the client went away, the receiving side will take care of the cleanup
+            self.logger.debug(f"[{self.connection_id}] failed to send message: {exc}")
+
+    async def close(self):
+        self._writer.cancel()
+        await self._writer
+
+
 class NotificationManager:
     def __init__(self, config: Config):
         self.logger = logging.getLogger(__name__)
         self.config = config
 
-        # map of connection_id to websocket
-        self.active_connections: dict[int, WebSocket] = {}
+        # map of connection_id to the sender of its websocket
+        self.active_connections: dict[int, WebsocketSender] = {}
+        # counters of already disconnected clients
+        self.n_dropped = 0
+        self.n_coalesced = 0
 
         # psql notification channel id,
         # we get this when booting from the db.
@@ -36,6 +142,7 @@ class NotificationManager:
 
         self.db_pool: Optional[asyncpg.Pool] = None
         self.connection: Optional[asyncpg.Connection] = None
+        self._metrics_logger: Optional[asyncio.Task] = None
 
     async def initialize(self, db_pool: asyncpg.Pool):
         self.db_pool = db_pool
@@ -43,8 +150,18 @@ class NotificationManager:
         await self.connection.set_type_codec("json", encoder=json.dumps, decoder=json.loads, schema="pg_catalog")
         await self.connection.set_type_codec("jsonb", encoder=json.dumps, decoder=json.loads, schema="pg_catalog")
         await self._register_forwarder(self.connection, forwarder_id=self.config.api.id)
+        self._metrics_logger = asyncio.create_task(self._log_metrics())
+
+    async def add_listener(self, channel: str, callback: Callable):
+        """listen to an additional psql notification channel on the connection of this forwarder"""
+        if self.connection is None:
+            raise RuntimeError("notification manager has not been initialized")
+        await self.connection.add_listener(channel, callback)
 
     async def teardown(self):
+        if self._metrics_logger is not None:
+            self._metrics_logger.cancel()
+            await asyncio.gather(self._metrics_logger, return_exceptions=True)
         await self._unregister_forwarder(self.connection, forwarder_id=self.config.api.id)
         if self.connection:
             await self.connection.close()
@@ -83,17 +200,39 @@ class NotificationManager:
         payload_json = json.loads(payload)
         event = payload_json.pop("event")
         connections = payload_json["connections"]
-        for connection_id in connections:
-            message = {
+        message = json.dumps(
+            {
                 "type": "notification",
                 "data": {"subscription_type": event, **payload_json["data"]},
             }
-            try:
-                await self.active_connections[connection_id].send_json(message)
-            except KeyError:
-                pass  # websocket
-            except asyncio.QueueFull:
-                self.logger.warning(f"[{connection_id}] tx queue full, skipping notification")
+        )
+        for connection_id in connections:
+            sender = self.active_connections.get(connection_id)
+            if sender is not None:  # the websocket might have been closed in the meantime
+                sender.send_notification(message)
+
+    def send_response(self, connection_id: int, response: dict):
+        self.active_connections[connection_id].send_response(json.dumps(response, default=encode_json))
+
+    def get_metrics(self) -> NotificationMetrics:
+        queue_depths = [sender.queue_depth for sender in self.active_connections.values()]
+        return NotificationMetrics(
+            n_connections=len(self.active_connections),
+            total_queue_depth=sum(queue_depths),
+            max_queue_depth=max(queue_depths, default=0),
+            n_dropped=self.n_dropped + sum(sender.n_dropped for sender in self.active_connections.values()),
+            n_coalesced=self.n_coalesced + sum(sender.n_coalesced for sender in self.active_connections.values()),
+        )
+
+    async def _log_metrics(self):
+        while True:
+            await asyncio.sleep(METRICS_LOG_INTERVAL)
+            metrics = self.get_metrics()
+            self.logger.info(
+                f"websocket delivery: {metrics.n_connections} connections, "
+                f"queue depth total {metrics.total_queue_depth} / max {metrics.max_queue_depth}, "
+                f"{metrics.n_dropped} dropped and {metrics.n_coalesced} coalesced notifications since startup"
+            )
 
     async def _register_forwarder(self, connection: asyncpg.Connection, forwarder_id: str):
         # register at db
@@ -123,12 +262,19 @@ class NotificationManager:
             connection_id = await connection.fetchval("select connection_id from client_connected($1)", self.channel_id)
             self.logger.debug(f"Websocket client connected with id {connection_id}")
 
-        self.active_connections[connection_id] = websocket
+        self.active_connections[connection_id] = WebsocketSender(
+            connection_id=connection_id,
+            websocket=websocket,
+            max_queue_size=self.config.api.websocket_send_queue_size,
+        )
 
         return connection_id
 
     async def disconnect(self, connection_id: int, websocket: WebSocket):
-        del self.active_connections[connection_id]
+        sender = self.active_connections.pop(connection_id)
+        await sender.close()
+        self.n_dropped += sender.n_dropped
+        self.n_coalesced += sender.n_coalesced
 
         if self.db_pool is None:
             raise WebSocketException(code=status.WS_1011_INTERNAL_ERROR)
@@ -139,10 +285,6 @@ class NotificationManager:
         self.logger.debug(f"websocket client with id {connection_id} disconnected")
 
 
-def get_notification_manager(request: Request) -> NotificationManager:
-    return request.state.notification_manager
-
-
 @router.websocket("/v1/ws")
 async def websocket_endpoint(
     ws: WebSocket,
@@ -168,8 +310,7 @@ async def websocket_endpoint(
                 traceback.print_exc()
                 response = make_error_msg(code=status.HTTP_500_INTERNAL_SERVER_ERROR, msg=str(exc))
 
-            serialized_response = json.dumps(response, default=encode_json)
-            await ws.send_text(serialized_response)
+            notification_manager.send_response(connection_id=connection_id, response=response)
     finally:
         await notification_manager.disconnect(connection_id=connection_id, websocket=ws)
 
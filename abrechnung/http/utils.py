@@ -1,6 +1,11 @@
+import gzip
 from datetime import date, datetime
 from uuid import UUID
 
+from starlette.concurrency import run_in_threadpool
+from starlette.requests import Request
+from starlette.responses import Response
+
 
 def encode_json(obj):
     if isinstance(obj, (datetime, date)):
@@ -9,3 +14,32 @@ def encode_json(obj):
         return str(obj)
 
     raise TypeError(f"Type {type(obj)} is not serializable")
+
+
+def _accepts_gzip(accept_encoding: str) -> bool:
+    for encoding in accept_encoding.split(","):
+        name, _, params = encoding.strip().partition(";")
+        if name.strip().lower() not in ("gzip", "*"):
+            continue
+        quality = params.strip().removeprefix("q=")
+        try:
+            return quality == "" or float(quality) > 0
+        except ValueError:
+            return False
+    return False
+
+
+async def json_response(request: Request, content: str, headers: dict[str, str] | None = None) -> Response:
+    """
+    wrap an already serialized json document in a response, compressing it with gzip if the client supports it and
+    the content exceeds the configured minimum size
+    """
+    body = content.encode("utf-8")
+    headers = {**(headers or {}), "Vary": "Accept-Encoding"}
+    minimum_size = request.state.config.api.compression_minimum_size
+    if len(body) >= minimum_size and _accepts_gzip(request.headers.get("accept-encoding", "")):
+        # compressing multiple megabytes takes long enough to stall other requests
+        body = await run_in_threadpool(gzip.compress, body, compresslevel=6)
+        headers["Content-Encoding"] = "gzip"
+
+    return Response(content=body, media_type="application/json", headers=headers)
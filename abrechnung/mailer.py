@@ -1,16 +1,141 @@
 import asyncio
 import email.message
 import email.utils
+import functools
 import itertools
 import logging
+import random
 import smtplib
-from typing import Optional, Type
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Awaitable, Callable, Optional, Type
 
 import asyncpg
 
 from abrechnung.framework.database import Connection, create_db_pool
 
-from .config import Config
+from .config import Config, EmailConfig
+
+# connections which were idle for longer than this many seconds are checked with a NOOP before being reused
+SMTP_HEALTH_CHECK_INTERVAL = 30
+
+
+def _is_permanent_failure(error: Exception) -> bool:
+    """whether the mail server rejected a mail for good such that retrying it is pointless, e.g. unknown recipients"""
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return all(code >= 500 for code, _ in error.recipients.values())
+    if isinstance(error, smtplib.SMTPDataError):
+        return error.smtp_code >= 500
+    return False
+
+
+def _due_mails_query(table: str) -> str:
+    """
+    query locking the tokens of a batch of due mails in the given pending table. rows which are already locked by
+    another mailer instance are skipped, the batch size is given as second query parameter
+    """
+    return (
+        f"select token from {table} "
+        f"where mail_next_attempt is not null and mail_next_attempt < now() and valid_until > now() "
+        f"order by mail_next_attempt "
+        f"limit $2 "
+        f"for update skip locked"
+    )
+
+
+class SMTPConnectionPool:
+    """
+    Thread safe pool of connections to the mail server which are reused across mails.
+
+    Connections are only ever used by one sending thread at a time, connections which were idle for a while are
+    health checked before they are handed out again.
+    """
+
+    def __init__(self, config: EmailConfig):
+        self.config = config
+        self._idle: list[tuple[smtplib.SMTP, float]] = []
+        self._lock = threading.Lock()
+
+    def connect(self) -> smtplib.SMTP:
+        mode = self.config.mode
+
+        if mode == "local":
+            mail_sender_class: Type[smtplib.SMTP] | Type[smtplib.LMTP] | Type[smtplib.SMTP_SSL] = smtplib.LMTP
+        elif mode == "smtp-ssl":
+            mail_sender_class = smtplib.SMTP_SSL
+        else:
+            mail_sender_class = smtplib.SMTP
+
+        connection = mail_sender_class(
+            host=self.config.host,
+            port=self.config.port,
+        )
+        if mode == "smtp-starttls":
+            connection.starttls()
+
+        if self.config.auth:
+            connection.login(
+                user=self.config.auth.username,
+                password=self.config.auth.password,
+            )
+        return connection
+
+    def acquire(self) -> smtplib.SMTP:
+        while True:
+            with self._lock:
+                if not self._idle:
+                    break
+                connection, idle_since = self._idle.pop()
+
+            if time.monotonic() - idle_since < SMTP_HEALTH_CHECK_INTERVAL or self._is_healthy(connection):
+                return connection
+            self._close(connection)
+
+        return self.connect()
+
+    def release(self, connection: smtplib.SMTP):
+        with self._lock:
+            self._idle.append((connection, time.monotonic()))
+
+    def send_message(self, msg: email.message.EmailMessage):
+        connection = self.acquire()
+        try:
+            try:
+                connection.send_message(msg)
+            except smtplib.SMTPServerDisconnected:
+                # the server may have closed an idle connection in the meantime, retry once on a fresh one
+                connection.close()
+                connection = self.connect()
+                connection.send_message(msg)
+        except (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused, smtplib.SMTPDataError):
+            # the server rejected the mail but the connection itself is still usable
+            self.release(connection)
+            raise
+        except BaseException:
+            self._close(connection)
+            raise
+        self.release(connection)
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for connection, _ in idle:
+            self._close(connection)
+
+    @staticmethod
+    def _is_healthy(connection: smtplib.SMTP) -> bool:
+        try:
+            return connection.noop()[0] == 250
+        except (smtplib.SMTPException, OSError):
+            return False
+
+    @staticmethod
+    def _close(connection: smtplib.SMTP):
+        try:
+            connection.quit()
+        except (smtplib.SMTPException, OSError):
+            connection.close()
 
 
 class Mailer:
@@ -18,10 +143,12 @@ class Mailer:
         self.config = config
         self.events: Optional[asyncio.Queue] = None
         self.psql: Connection | None = None
-        self.mailer = None
+        self.db_pool: asyncpg.Pool | None = None
+        self.smtp = SMTPConnectionPool(config.email)
+        self.executor: ThreadPoolExecutor | None = None
         self.logger = logging.getLogger(__name__)
 
-        self.event_handlers = {
+        self.event_handlers: dict[tuple[str, str], Callable[[], Awaitable[None]]] = {
             (
                 "mailer",
                 "pending_registration",
@@ -32,65 +159,115 @@ class Mailer:
             ): self.on_user_password_recovery_notification,
             ("mailer", "pending_email_change"): self.on_user_email_update_notification,
         }
+        # mails currently being sent, identified by their pending action and token
+        self._mails_in_flight: set[tuple[str, str]] = set()
+        self._send_tasks: set[asyncio.Task] = set()
+        # timers re-running a handler once the next failed mail is due to be retried
+        self._wakeups: dict[tuple[str, str], asyncio.TimerHandle] = {}
+        # events whose handler could not claim all due mails as too many mails were already being sent
+        self._claims_pending: set[tuple[str, str]] = set()
 
     async def run(self):
+        self.executor = ThreadPoolExecutor(
+            max_workers=self.config.email.max_concurrent_sends, thread_name_prefix="mailer"
+        )
         # just try to connect to the mailing server once
-        _ = self.get_mailer_instance()
+        self.smtp.release(await asyncio.get_running_loop().run_in_executor(self.executor, self.smtp.connect))
         # only initialize the event queue once we are in a proper async context otherwise weird errors happen
         self.events = asyncio.Queue()
 
         if self.events is None:
             raise RuntimeError("something unexpected happened, self.events is None")
 
-        db_pool = await create_db_pool(self.config.database, n_connections=1)
-        self.psql = await db_pool.acquire()
+        # one connection listens for notifications, the others are used to update mails after they have been sent
+        self.db_pool = await create_db_pool(
+            self.config.database, n_connections=self.config.email.max_concurrent_sends + 1
+        )
+        self.psql = await self.db_pool.acquire()
         assert self.psql is not None
         self.psql.add_termination_listener(self.terminate_callback)
         self.psql.add_log_listener(self.log_callback)
         await self.psql.add_listener("mailer", self.notification_callback)
 
-        # run all of the events manually once
-        for event_handler in self.event_handlers.values():
-            await event_handler()
-
-        # handle events
-        while True:
-            event = await self.events.get()
-            if isinstance(event, StopIteration):
-                break
-            handler = self.event_handlers.get(event)
-            if handler is None:
-                self.logger.info(f"unhandled event {event!r}")
-            else:
-                await handler()
-
-        await self.psql.remove_listener("mailer", self.notification_callback)
-        await self.psql.close()
-        await db_pool.close()
-
-    def get_mailer_instance(self):
-        mode = self.config.email.mode
-
-        if mode == "local":
-            mail_sender_class: Type[smtplib.SMTP] | Type[smtplib.LMTP] | Type[smtplib.SMTP_SSL] = smtplib.LMTP
-        elif mode == "smtp-ssl":
-            mail_sender_class = smtplib.SMTP_SSL
-        else:
-            mail_sender_class = smtplib.SMTP
-
-        mailer = mail_sender_class(
-            host=self.config.email.host,
-            port=self.config.email.port,
-        )
-        if mode == "smtp-starttls":
-            mailer.starttls()
-
-        if self.config.email.auth:
-            mailer.login(
-                user=self.config.email.auth.username,
-                password=self.config.email.auth.password,
-            )
-        return mailer
+        try:
+            # run all of the events manually once
+            for event_handler in self.event_handlers.values():
+                await event_handler()
+
+            # handle events
+            while True:
+                event = await self.events.get()
+                if isinstance(event, StopIteration):
+                    break
+                handler = self.event_handlers.get(event)
+                if handler is None:
+                    self.logger.info(f"unhandled event {event!r}")
+                else:
+                    await handler()
+        finally:
+            for wakeup in self._wakeups.values():
+                wakeup.cancel()
+            for task in self._send_tasks:
+                task.cancel()
+            await asyncio.gather(*self._send_tasks, return_exceptions=True)
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.smtp.close()
+
+            if not self.psql.is_closed():
+                await self.psql.remove_listener("mailer", self.notification_callback)
+                await self.psql.close()
+            await self.db_pool.close()
+
+    async def _process_pending_mails(
+        self, event: tuple[str, str], claim_query: str, send: Callable[[asyncpg.Record], Awaitable[None]]
+    ):
+        """
+        claim a batch of due mails and send them in the background.
+
+        Claiming a mail moves its next attempt lease_timeout into the future such that neither this nor any other
+        mailer instance picks it up again while it is being sent. Should a mailer die while sending, the mail is
+        picked up again once the lease expired. At most batch_size mails are claimed by a mailer at a time.
+        """
+        assert self.db_pool is not None
+        table = event[1]
+        capacity = self.config.email.batch_size - len(self._send_tasks)
+        if capacity <= 0:
+            self._claims_pending.add(event)
+            return
+
+        unsent_mails = await self.db_pool.fetch(claim_query, self.config.email.lease_timeout, capacity)
+        if not unsent_mails:
+            self.logger.info(f"no {table} mails are pending")
+        if len(unsent_mails) >= capacity:
+            # there might be more due mails, claim them once some of the current batch have been sent
+            self._claims_pending.add(event)
+
+        self._start_sending(table, unsent_mails, send)
+        await self._schedule_next_attempt(event, table)
+
+    def _start_sending(self, kind: str, rows: list[asyncpg.Record], send: Callable[[asyncpg.Record], Awaitable[None]]):
+        """
+        send the mails for all given rows in the background such that notifications keep being processed while
+        mails are being sent, the number of concurrent sends is bounded by the mailer threads
+        """
+        for row in rows:
+            key = (kind, str(row["token"]))
+            if key in self._mails_in_flight:
+                continue
+            self._mails_in_flight.add(key)
+            task = asyncio.create_task(send(row))
+            self._send_tasks.add(task)
+            task.add_done_callback(functools.partial(self._on_send_done, key))
+
+    def _on_send_done(self, key: tuple[str, str], task: asyncio.Task):
+        self._mails_in_flight.discard(key)
+        self._send_tasks.discard(task)
+        if self._claims_pending and self.events is not None:
+            for event in self._claims_pending:
+                self.events.put_nowait(event)
+            self._claims_pending.clear()
+        if not task.cancelled() and task.exception() is not None:
+            self.logger.error(f"error while sending {key[0]} mail", exc_info=task.exception())
 
     def notification_callback(self, connection: asyncpg.Connection, pid: int, channel: str, payload: str):
         """runs whenever we get a psql notification"""
@@ -112,17 +289,78 @@ class Mailer:
             self.events.task_done()
         self.events.put_nowait(StopIteration())
 
+    async def _schedule_next_attempt(self, event: tuple[str, str], table: str):
+        """wake up the handler of the given event once the earliest scheduled retry of a failed mail is due"""
+        assert self.db_pool is not None
+        delay = await self.db_pool.fetchval(
+            f"select extract(epoch from min(mail_next_attempt) - now()) from {table} "
+            f"where mail_next_attempt is not null and mail_next_attempt >= now() and valid_until > now()"
+        )
+        if delay is None:
+            return
+
+        loop = asyncio.get_running_loop()
+        when = loop.time() + float(delay)
+        wakeup = self._wakeups.get(event)
+        if wakeup is not None:
+            if wakeup.when() <= when:
+                return
+            wakeup.cancel()
+        self._wakeups[event] = loop.call_at(when, self._on_wakeup, event)
+
+    def _on_wakeup(self, event: tuple[str, str]):
+        self._wakeups.pop(event, None)
+        if self.events is not None:
+            self.events.put_nowait(event)
+
+    def _retry_delay(self, attempts: int) -> float:
+        """exponential backoff in seconds after the given number of failed attempts"""
+        backoff = min(
+            self.config.email.retry_backoff.total_seconds() * 2 ** (attempts - 1),
+            self.config.email.max_retry_backoff.total_seconds(),
+        )
+        # spread out the retries of mails which failed at the same time, e.g. during an outage of the mail server
+        return backoff * random.uniform(0.75, 1.0)
+
+    async def _record_failure(self, table: str, row: asyncpg.Record, error: Exception):
+        assert self.db_pool is not None
+        attempts = row["mail_attempts"] + 1
+        if attempts >= self.config.email.max_attempts or _is_permanent_failure(error):
+            self.logger.error(
+                f"Giving up on sending email to user {row['username']} after {attempts} failed attempts: {error}"
+            )
+            await self.db_pool.execute(
+                f"update {table} "
+                f"set mail_attempts = $2, mail_next_attempt = null, mail_failed_at = now(), mail_last_error = $3 "
+                f"where token = $1",
+                row["token"],
+                attempts,
+                str(error),
+            )
+            return
+
+        delay = self._retry_delay(attempts)
+        self.logger.warning(
+            f"Failed to send email to user {row['username']} (attempt {attempts}), retrying in {delay:.0f}s: {error}"
+        )
+        await self.db_pool.execute(
+            f"update {table} "
+            f"set mail_attempts = $2, mail_next_attempt = now() + make_interval(secs => $3), mail_last_error = $4 "
+            f"where token = $1",
+            row["token"],
+            attempts,
+            delay,
+            str(error),
+        )
+
     async def log_callback(self, connection: asyncpg.Connection, message: str):
         """runs when psql sends a log message"""
         assert connection is self.psql
         self.logger.info(f"psql log message: {message}")
 
-    def send_email(self, *text_lines: str, subject: str, dest_address: str, dest_name: str):
+    async def send_email(self, *text_lines: str, subject: str, dest_address: str, dest_name: str):
         self.logger.info(f"sending email to {dest_address}, subject: {subject}")
 
-        # we do this to not have one long hanging open connection with the mail server
-        mailer = self.get_mailer_instance()
-
         from_addr = self.config.email.address
         msg = email.message.EmailMessage()
         msg.set_content(
@@ -139,7 +377,10 @@ class Mailer:
         msg["From"] = from_addr
         msg["Date"] = email.utils.localtime()
         msg["Message-ID"] = email.utils.make_msgid(domain=from_addr.split("@")[-1])
-        mailer.send_message(msg)  # type: ignore
+
+        # smtplib is blocking, mails are therefore sent on the worker threads which keeps the event loop responsive
+        assert self.executor is not None
+        await asyncio.get_running_loop().run_in_executor(self.executor, self.smtp.send_message, msg)
 
     def greeting_lines(self, name: str):
         return f"Beloved {name},", ""
@@ -148,122 +389,122 @@ class Mailer:
         return "", "Thoughtfully yours", "", f"    {self.config.service.name}"
 
     async def on_pending_registration_notification(self):
-        assert self.psql is not None
-        unsent_mails = await self.psql.fetch(
-            "select usr.id, usr.email, usr.username, pr.token, pr.valid_until "
-            "from pending_registration pr join usr on usr.id = pr.user_id "
-            "where pr.mail_next_attempt is not null and pr.mail_next_attempt < NOW() and pr.valid_until > NOW()"
+        await self._process_pending_mails(
+            ("mailer", "pending_registration"),
+            "update pending_registration pr set mail_next_attempt = now() + $1::interval "
+            "from usr "
+            f"where usr.id = pr.user_id and pr.token in ({_due_mails_query('pending_registration')}) "
+            "returning usr.id, usr.email, usr.username, pr.token, pr.valid_until, pr.mail_attempts",
+            self._send_pending_registration_mail,
         )
 
-        if not unsent_mails:
-            self.logger.info("no pending_registration mails are pending")
-
-        for row in unsent_mails:
-            try:
-                self.send_email(
-                    "it looks like you are attempting to create a user account.",
-                    "",
-                    "To complete your registration, visit",
-                    "",
-                    f"{self.config.service.url}/confirm-registration/{row['token']}",
-                    "",
-                    f"Your request will time out {row['valid_until']}.",
-                    "If you do not want to create a user account, just ignore this email.",
-                    subject="Confirm user account",
-                    dest_address=row["email"],
-                    dest_name=row["username"],
-                )
+    async def _send_pending_registration_mail(self, row: asyncpg.Record):
+        assert self.db_pool is not None
+        try:
+            await self.send_email(
+                "it looks like you are attempting to create a user account.",
+                "",
+                "To complete your registration, visit",
+                "",
+                f"{self.config.service.url}/confirm-registration/{row['token']}",
+                "",
+                f"Your request will time out {row['valid_until']}.",
+                "If you do not want to create a user account, just ignore this email.",
+                subject="Confirm user account",
+                dest_address=row["email"],
+                dest_name=row["username"],
+            )
 
-                await self.psql.execute(
-                    "update pending_registration set mail_next_attempt = null where token = $1",
-                    row["token"],
-                )
-            except smtplib.SMTPException as e:
-                self.logger.warning(f"Failed to send email to user {row['username']} with email {row['email']}: {e}")
+            await self.db_pool.execute(
+                "update pending_registration set mail_next_attempt = null where token = $1",
+                row["token"],
+            )
+        except (smtplib.SMTPException, OSError) as e:
+            await self._record_failure("pending_registration", row, e)
 
     async def on_user_password_recovery_notification(self):
-        assert self.psql is not None
-        unsent_mails = await self.psql.fetch(
-            "select usr.id, usr.username, usr.email, ppr.token, ppr.valid_until "
-            "from pending_password_recovery ppr join usr on usr.id = ppr.user_id "
-            "where ppr.mail_next_attempt is not null and ppr.mail_next_attempt < NOW() and ppr.valid_until > NOW()"
+        await self._process_pending_mails(
+            ("mailer", "pending_password_recovery"),
+            "update pending_password_recovery ppr set mail_next_attempt = now() + $1::interval "
+            "from usr "
+            f"where usr.id = ppr.user_id and ppr.token in ({_due_mails_query('pending_password_recovery')}) "
+            "returning usr.id, usr.username, usr.email, ppr.token, ppr.valid_until, ppr.mail_attempts",
+            self._send_password_recovery_mail,
         )
 
-        if not unsent_mails:
-            self.logger.info("no user_password_recovery mails are pending")
-
-        for row in unsent_mails:
-            try:
-                self.send_email(
-                    "it looks like you forgot your password; how embarrasing.",
-                    "",
-                    "To set a new one, visit",
-                    "",
-                    f"{self.config.service.url}/confirm-password-recovery/{row['token']}",
-                    "",
-                    f"Your request will time out {row['valid_until']}.",
-                    "If you do not want to reset your password, just ignore this email.",
-                    subject="Reset password",
-                    dest_address=row["email"],
-                    dest_name=row["username"],
-                )
+    async def _send_password_recovery_mail(self, row: asyncpg.Record):
+        assert self.db_pool is not None
+        try:
+            await self.send_email(
+                "it looks like you forgot your password; how embarrasing.",
+                "",
+                "To set a new one, visit",
+                "",
+                f"{self.config.service.url}/confirm-password-recovery/{row['token']}",
+                "",
+                f"Your request will time out {row['valid_until']}.",
+                "If you do not want to reset your password, just ignore this email.",
+                subject="Reset password",
+                dest_address=row["email"],
+                dest_name=row["username"],
+            )
 
-                await self.psql.execute(
-                    "update pending_password_recovery set mail_next_attempt = null where token = $1",
-                    row["token"],
-                )
-            except smtplib.SMTPException as e:
-                self.logger.warning(f"Failed to send email to user {row['username']} with email {row['email']}: {e}")
+            await self.db_pool.execute(
+                "update pending_password_recovery set mail_next_attempt = null where token = $1",
+                row["token"],
+            )
+        except (smtplib.SMTPException, OSError) as e:
+            await self._record_failure("pending_password_recovery", row, e)
 
     async def on_user_email_update_notification(self):
-        assert self.psql is not None
-        unsent_mails = await self.psql.fetch(
-            "select usr.id, usr.username, usr.email as old_email, pec.new_email as new_email, pec.token, "
-            "   pec.valid_until "
-            "from pending_email_change pec join usr on usr.id = pec.user_id "
-            "where pec.mail_next_attempt is not null and pec.mail_next_attempt < NOW() and pec.valid_until > NOW()"
+        await self._process_pending_mails(
+            ("mailer", "pending_email_change"),
+            "update pending_email_change pec set mail_next_attempt = now() + $1::interval "
+            "from usr "
+            f"where usr.id = pec.user_id and pec.token in ({_due_mails_query('pending_email_change')}) "
+            "returning usr.id, usr.username, usr.email as old_email, pec.new_email as new_email, pec.token, "
+            "   pec.valid_until, pec.mail_attempts",
+            self._send_email_change_mails,
         )
 
-        if not unsent_mails:
-            self.logger.info("no user_email_update mails are pending")
-
-        for row in unsent_mails:
-            try:
-                self.send_email(
-                    "you want to change your email address",
-                    "",
-                    f"Your current email is: {row['old_email']}",
-                    f"You want to change it to: {row['new_email']}",
-                    "",
-                    "To confirm, see the mail that was sent to the new address.",
-                    "",
-                    f"Your request will time out {row['valid_until']}.",
-                    "If you do not want to change your email, just ignore this email.",
-                    subject="Change email",
-                    dest_address=row["old_email"],
-                    dest_name=row["username"],
-                )
+    async def _send_email_change_mails(self, row: asyncpg.Record):
+        assert self.db_pool is not None
+        try:
+            await self.send_email(
+                "you want to change your email address",
+                "",
+                f"Your current email is: {row['old_email']}",
+                f"You want to change it to: {row['new_email']}",
+                "",
+                "To confirm, see the mail that was sent to the new address.",
+                "",
+                f"Your request will time out {row['valid_until']}.",
+                "If you do not want to change your email, just ignore this email.",
+                subject="Change email",
+                dest_address=row["old_email"],
+                dest_name=row["username"],
+            )
 
-                self.send_email(
-                    "you want to change your email address",
-                    "",
-                    f"Your current email is: {row['old_email']}",
-                    f"You want to change it to: {row['new_email']}",
-                    "",
-                    "To confirm, visit",
-                    "",
-                    f"{self.config.service.url}/confirm-email-change/{row['token']}",
-                    "",
-                    f"Your request will time out {row['valid_until']}.",
-                    "If you do not want to change your email, just ignore this email.",
-                    subject="Change email",
-                    dest_address=row["new_email"],
-                    dest_name=row["username"],
-                )
+            await self.send_email(
+                "you want to change your email address",
+                "",
+                f"Your current email is: {row['old_email']}",
+                f"You want to change it to: {row['new_email']}",
+                "",
+                "To confirm, visit",
+                "",
+                f"{self.config.service.url}/confirm-email-change/{row['token']}",
+                "",
+                f"Your request will time out {row['valid_until']}.",
+                "If you do not want to change your email, just ignore this email.",
+                subject="Change email",
+                dest_address=row["new_email"],
+                dest_name=row["username"],
+            )
 
-                await self.psql.execute(
-                    "update pending_email_change set mail_next_attempt = null where token = $1",
-                    row["token"],
-                )
-            except smtplib.SMTPException as e:
-                self.logger.warning(f"Failed to send email to user {row['username']} with email {row['email']}: {e}")
+            await self.db_pool.execute(
+                "update pending_email_change set mail_next_attempt = null where token = $1",
+                row["token"],
+            )
+        except (smtplib.SMTPException, OSError) as e:
+            await self._record_failure("pending_email_change", row, e)
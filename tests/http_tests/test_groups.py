@@ -1,7 +1,17 @@
+import base64
 from datetime import datetime, timedelta, timezone
-
-from abrechnung.domain.accounts import AccountType, NewAccount
-from abrechnung.domain.transactions import NewTransaction, TransactionType
+from pathlib import Path
+
+from pydantic import TypeAdapter
+
+from abrechnung.domain.accounts import Account, AccountType, NewAccount
+from abrechnung.domain.transactions import (
+    NewFile,
+    NewTransaction,
+    NewTransactionPosition,
+    Transaction,
+    TransactionType,
+)
 from tests.http_tests.common import HTTPAPITest
 
 
@@ -464,3 +474,419 @@ class GroupAPITest(HTTPAPITest):
             {"group-created", "member-joined", "text-message"},
             set([log["type"] for log in logs]),
         )
+
+    async def test_balances(self):
+        group_id = await self.group_service.create_group(
+            user=self.test_user,
+            name="group1",
+            description="description",
+            currency_symbol="€",
+            terms="terms",
+            add_user_account_on_join=False,
+        )
+        account1_id = await self.account_service.create_account(
+            user=self.test_user,
+            group_id=group_id,
+            account=NewAccount(type=AccountType.personal, name="account1"),
+        )
+        account2_id = await self.account_service.create_account(
+            user=self.test_user,
+            group_id=group_id,
+            account=NewAccount(type=AccountType.personal, name="account2"),
+        )
+        before_transaction = await self.db_pool.fetchval("select now()")
+        await self.transaction_service.create_transaction(
+            user=self.test_user,
+            group_id=group_id,
+            transaction=NewTransaction(
+                type=TransactionType.purchase,
+                name="asdf",
+                description="asdf",
+                billed_at=datetime.now().date(),
+                currency_symbol="€",
+                currency_conversion_rate=1.0,
+                tags=[],
+                value=20.0,
+                debitor_shares={account1_id: 1.0, account2_id: 1.0},
+                creditor_shares={account2_id: 1.0},
+            ),
+        )
+
+        resp = await self._get(f"/api/v1/groups/{group_id}/balances")
+        self.assertEqual(200, resp.status_code)
+        balances = resp.json()
+        self.assertEqual({str(account1_id), str(account2_id)}, set(balances.keys()))
+        self.assertEqual(-10.0, balances[str(account1_id)]["balance"])
+        self.assertEqual(10.0, balances[str(account2_id)]["balance"])
+        self.assertEqual(20.0, balances[str(account2_id)]["total_paid"])
+
+        resp = await self._get(
+            f"/api/v1/groups/{group_id}/balances", params={"valid_at": before_transaction.isoformat()}
+        )
+        self.assertEqual(200, resp.status_code)
+        self.assertEqual(0.0, resp.json()[str(account2_id)]["balance"])
+
+        resp = await self._get(f"/api/v1/groups/13333/balances")
+        self.assertEqual(404, resp.status_code)
+
+        resp = await self._get(f"/api/v1/groups/{group_id}/settlement", params={"mode": "min_transfers"})
+        self.assertEqual(200, resp.status_code)
+        self.assertEqual([{"creditor_id": account1_id, "debitor_id": account2_id, "payment_amount": 10.0}], resp.json())
+        resp = await self._get(f"/api/v1/groups/{group_id}/settlement", params={"mode": "foobar"})
+        self.assertEqual(422, resp.status_code)
+
+        resp = await self._get(f"/api/v1/accounts/{account2_id}/balance_history", params={"interval": "month"})
+        self.assertEqual(200, resp.status_code)
+        history = resp.json()
+        self.assertEqual(1, len(history))
+        self.assertEqual(10.0, history[0]["balance"])
+        self.assertIsNone(history[0]["change_origin"])
+        resp = await self._get(f"/api/v1/accounts/13333/balance_history")
+        self.assertEqual(404, resp.status_code)
+
+        resp = await self._get(f"/api/v1/groups/{group_id}/transactions/export")
+        self.assertEqual(200, resp.status_code)
+        self.assertTrue(resp.headers["content-type"].startswith("text/csv"))
+        lines = resp.text.splitlines()
+        self.assertEqual(2, len(lines))
+        self.assertTrue(lines[0].endswith("account1,account2"))
+        self.assertTrue(lines[1].endswith("-10.00,10.00"))
+        resp = await self._get(f"/api/v1/groups/13333/transactions/export")
+        self.assertEqual(404, resp.status_code)
+
+    async def test_create_transactions_bulk(self):
+        group_id = await self.group_service.create_group(
+            user=self.test_user,
+            name="group1",
+            description="description",
+            currency_symbol="€",
+            terms="terms",
+            add_user_account_on_join=False,
+        )
+        account1_id = await self.account_service.create_account(
+            user=self.test_user,
+            group_id=group_id,
+            account=NewAccount(type=AccountType.personal, name="account1"),
+        )
+        account2_id = await self.account_service.create_account(
+            user=self.test_user,
+            group_id=group_id,
+            account=NewAccount(type=AccountType.personal, name="account2"),
+        )
+        transaction = {
+            "type": "transfer",
+            "name": "transfer",
+            "description": "",
+            "billed_at": "2024-01-01",
+            "currency_symbol": "€",
+            "currency_conversion_rate": 1.0,
+            "value": 20.0,
+            "debitor_shares": {account1_id: 1.0},
+            "creditor_shares": {account2_id: 1.0},
+        }
+
+        resp = await self._post(
+            f"/api/v1/groups/{group_id}/transactions/bulk", json={"transactions": [transaction, transaction]}
+        )
+        self.assertEqual(200, resp.status_code)
+        transaction_ids = resp.json()
+        self.assertEqual(2, len(transaction_ids))
+
+        resp = await self._get(f"/api/v1/groups/{group_id}/transactions")
+        self.assertEqual(200, resp.status_code)
+        self.assertEqual(set(transaction_ids), {t["id"] for t in resp.json()})
+
+        transaction["debitor_shares"] = {13333: 1.0}
+        resp = await self._post(f"/api/v1/groups/{group_id}/transactions/bulk", json={"transactions": [transaction]})
+        self.assertEqual(400, resp.status_code)
+
+    async def test_list_changes(self):
+        group_id = await self.group_service.create_group(
+            user=self.test_user,
+            name="group1",
+            description="description",
+            currency_symbol="€",
+            terms="terms",
+            add_user_account_on_join=False,
+        )
+        account1_id = await self.account_service.create_account(
+            user=self.test_user,
+            group_id=group_id,
+            account=NewAccount(type=AccountType.personal, name="account1"),
+        )
+        account2_id = await self.account_service.create_account(
+            user=self.test_user,
+            group_id=group_id,
+            account=NewAccount(type=AccountType.personal, name="account2"),
+        )
+        transaction = NewTransaction(
+            type=TransactionType.transfer,
+            name="asdf",
+            description="asdf",
+            billed_at=datetime.now().date(),
+            currency_symbol="€",
+            currency_conversion_rate=1.0,
+            value=20.0,
+            debitor_shares={account1_id: 1.0},
+            creditor_shares={account2_id: 1.0},
+        )
+        transaction1_id = await self.transaction_service.create_transaction(
+            user=self.test_user, group_id=group_id, transaction=transaction
+        )
+        transaction2_id = await self.transaction_service.create_transaction(
+            user=self.test_user, group_id=group_id, transaction=transaction
+        )
+
+        resp = await self._get(f"/api/v1/groups/{group_id}/changes")
+        self.assertEqual(200, resp.status_code)
+        changes = resp.json()
+        self.assertEqual({transaction1_id, transaction2_id}, {t["id"] for t in changes["transactions"]})
+        self.assertEqual({account1_id, account2_id}, {a["id"] for a in changes["accounts"]})
+        seq = changes["seq"]
+
+        resp = await self._get(f"/api/v1/groups/{group_id}/changes", params={"since": seq})
+        self.assertEqual(200, resp.status_code)
+        self.assertEqual({"seq": seq, "transactions": [], "accounts": []}, resp.json())
+
+        await self.transaction_service.delete_transaction(user=self.test_user, transaction_id=transaction2_id)
+        resp = await self._get(f"/api/v1/groups/{group_id}/changes", params={"since": seq})
+        self.assertEqual(200, resp.status_code)
+        changes = resp.json()
+        self.assertLess(seq, changes["seq"])
+        self.assertEqual(1, len(changes["transactions"]))
+        self.assertEqual(transaction2_id, changes["transactions"][0]["id"])
+        self.assertTrue(changes["transactions"][0]["deleted"])
+        self.assertEqual([], changes["accounts"])
+
+        resp = await self._get(f"/api/v1/groups/13333/changes")
+        self.assertEqual(404, resp.status_code)
+
+    async def test_file_download(self):
+        group_id = await self.group_service.create_group(
+            user=self.test_user,
+            name="group1",
+            description="description",
+            currency_symbol="€",
+            terms="terms",
+            add_user_account_on_join=False,
+        )
+        account_id = await self.account_service.create_account(
+            user=self.test_user,
+            group_id=group_id,
+            account=NewAccount(type=AccountType.personal, name="account1"),
+        )
+        image_content = (Path(__file__).parent.parent / "assets" / "test_image.jpg").read_bytes()
+        transaction_id = await self.transaction_service.create_transaction(
+            user=self.test_user,
+            group_id=group_id,
+            transaction=NewTransaction(
+                type=TransactionType.purchase,
+                name="purchase",
+                description="",
+                value=10,
+                currency_symbol="€",
+                currency_conversion_rate=1.0,
+                billed_at=datetime.now().date(),
+                creditor_shares={account_id: 1.0},
+                debitor_shares={account_id: 1.0},
+                new_files=[
+                    NewFile(
+                        filename="receipt",
+                        mime_type="image/jpeg",
+                        content=base64.b64encode(image_content).decode("ascii"),
+                    )
+                ],
+            ),
+        )
+        transaction = await self.transaction_service.get_transaction(user=self.test_user, transaction_id=transaction_id)
+        file = transaction.files[0]
+        url = f"/api/v1/files/{file.id}/{file.blob_id}"
+
+        resp = await self._get(url)
+        self.assertEqual(200, resp.status_code)
+        self.assertEqual(image_content, resp.content)
+        self.assertEqual("image/jpeg", resp.headers["content-type"])
+        self.assertEqual(str(len(image_content)), resp.headers["content-length"])
+        etag = resp.headers["etag"]
+        self.assertIn("immutable", resp.headers["cache-control"])
+
+        resp = await self._get(url, headers={"If-None-Match": etag})
+        self.assertEqual(304, resp.status_code)
+        self.assertEqual(b"", resp.content)
+
+        resp = await self._get(url, headers={"Range": "bytes=10-19"})
+        self.assertEqual(206, resp.status_code)
+        self.assertEqual(image_content[10:20], resp.content)
+        self.assertEqual(f"bytes 10-19/{len(image_content)}", resp.headers["content-range"])
+
+        resp = await self._get(url, headers={"Range": "bytes=-5"})
+        self.assertEqual(206, resp.status_code)
+        self.assertEqual(image_content[-5:], resp.content)
+
+        resp = await self._get(url, headers={"Range": f"bytes={len(image_content)}-"})
+        self.assertEqual(416, resp.status_code)
+        self.assertEqual(f"bytes */{len(image_content)}", resp.headers["content-range"])
+
+        # ranges are ignored if the file changed in the meantime
+        resp = await self._get(url, headers={"Range": "bytes=10-19", "If-Range": '"1337"'})
+        self.assertEqual(200, resp.status_code)
+        self.assertEqual(image_content, resp.content)
+
+        resp = await self._get(f"/api/v1/files/{file.id}/{file.blob_id + 1}")
+        self.assertEqual(400, resp.status_code)
+
+    async def test_list_serialized_by_database(self):
+        group_id = await self.group_service.create_group(
+            user=self.test_user,
+            name="group1",
+            description="description",
+            currency_symbol="€",
+            terms="terms",
+            add_user_account_on_join=False,
+        )
+        account_id = await self.account_service.create_account(
+            user=self.test_user,
+            group_id=group_id,
+            account=NewAccount(type=AccountType.personal, name="account1"),
+        )
+        await self.account_service.create_account(
+            user=self.test_user,
+            group_id=group_id,
+            account=NewAccount(
+                type=AccountType.clearing,
+                name="clearing",
+                date_info=datetime.now().date(),
+                tags=["tag"],
+                clearing_shares={account_id: 1.0},
+            ),
+        )
+        image_content = (Path(__file__).parent.parent / "assets" / "test_image.jpg").read_bytes()
+        for i in range(10):
+            await self.transaction_service.create_transaction(
+                user=self.test_user,
+                group_id=group_id,
+                transaction=NewTransaction(
+                    type=TransactionType.purchase,
+                    name=f"purchase {i}",
+                    description="",
+                    value=10.5,
+                    currency_symbol="€",
+                    currency_conversion_rate=1.0,
+                    billed_at=datetime.now().date(),
+                    tags=["foo", "bar"],
+                    creditor_shares={account_id: 1.0},
+                    debitor_shares={account_id: 1.0},
+                    new_positions=[NewTransactionPosition(name="item", price=2, communist_shares=1, usages={})],
+                    new_files=(
+                        [
+                            NewFile(
+                                filename="receipt",
+                                mime_type="image/jpeg",
+                                content=base64.b64encode(image_content).decode("ascii"),
+                            )
+                        ]
+                        if i == 0
+                        else []
+                    ),
+                ),
+            )
+
+        resp = await self._get(f"/api/v1/groups/{group_id}/transactions", headers={"Accept-Encoding": "gzip"})
+        self.assertEqual(200, resp.status_code)
+        self.assertEqual("gzip", resp.headers["content-encoding"])
+        transactions = TypeAdapter(list[Transaction]).validate_python(resp.json())
+        expected = await self.transaction_service.list_transactions(user=self.test_user, group_id=group_id)
+        self.assertEqual(
+            sorted(expected, key=lambda t: t.id),
+            sorted(transactions, key=lambda t: t.id),
+        )
+
+        resp = await self._get(f"/api/v1/groups/{group_id}/transactions", headers={"Accept-Encoding": "identity"})
+        self.assertEqual(200, resp.status_code)
+        self.assertNotIn("content-encoding", resp.headers)
+        self.assertEqual(10, len(resp.json()))
+
+        resp = await self._get(f"/api/v1/groups/{group_id}/accounts")
+        self.assertEqual(200, resp.status_code)
+        accounts = TypeAdapter(list[Account]).validate_python(resp.json())
+        expected = await self.account_service.list_accounts(user=self.test_user, group_id=group_id)
+        self.assertEqual(
+            sorted(expected, key=lambda a: a.id),
+            sorted(accounts, key=lambda a: a.id),
+        )
+
+    async def test_list_transactions_paginated(self):
+        group_id = await self.group_service.create_group(
+            user=self.test_user,
+            name="group1",
+            description="description",
+            currency_symbol="€",
+            terms="terms",
+            add_user_account_on_join=False,
+        )
+        account_id = await self.account_service.create_account(
+            user=self.test_user,
+            group_id=group_id,
+            account=NewAccount(type=AccountType.personal, name="account1"),
+        )
+        transaction = {
+            "type": "transfer",
+            "description": "",
+            "currency_symbol": "€",
+            "currency_conversion_rate": 1.0,
+            "value": 20.0,
+            "debitor_shares": {account_id: 1.0},
+            "creditor_shares": {account_id: 1.0},
+        }
+        resp = await self._post(
+            f"/api/v1/groups/{group_id}/transactions/bulk",
+            json={
+                "transactions": [
+                    {**transaction, "name": f"transfer {i}", "billed_at": f"2024-01-0{i + 1}", "tags": [f"tag{i % 2}"]}
+                    for i in range(5)
+                ]
+            },
+        )
+        self.assertEqual(200, resp.status_code)
+
+        names, params = [], {"limit": 2, "sort": "billed_at_asc"}
+        while True:
+            resp = await self._get(f"/api/v1/groups/{group_id}/transactions", params=params)
+            self.assertEqual(200, resp.status_code)
+            names.extend(t["name"] for t in resp.json())
+            if "x-next-cursor" not in resp.headers:
+                break
+            params["cursor"] = resp.headers["x-next-cursor"]
+        self.assertEqual([f"transfer {i}" for i in range(5)], names)
+
+        resp = await self._get(
+            f"/api/v1/groups/{group_id}/transactions",
+            params={"tags": ["tag0"], "billed_from": "2024-01-02", "search": "TRANSFER", "sort": "name_desc"},
+        )
+        self.assertEqual(200, resp.status_code)
+        self.assertEqual(["transfer 4", "transfer 2"], [t["name"] for t in resp.json()])
+
+        resp = await self._get(f"/api/v1/groups/{group_id}/transactions", params={"limit": 2, "cursor": "invalid"})
+        self.assertEqual(400, resp.status_code)
+
+    async def test_search(self):
+        group_id = await self.group_service.create_group(
+            user=self.test_user,
+            name="group1",
+            description="description",
+            currency_symbol="€",
+            terms="terms",
+            add_user_account_on_join=False,
+        )
+        account_id = await self.account_service.create_account(
+            user=self.test_user,
+            group_id=group_id,
+            account=NewAccount(type=AccountType.personal, name="pizza lover"),
+        )
+
+        resp = await self._get(f"/api/v1/groups/{group_id}/search", params={"q": "pizz"})
+        self.assertEqual(200, resp.status_code)
+        self.assertEqual([("account", account_id)], [(hit["type"], hit["id"]) for hit in resp.json()])
+
+        resp = await self._get(f"/api/v1/groups/{group_id}/search", params={"q": ""})
+        self.assertEqual(422, resp.status_code)
@@ -5,6 +5,7 @@ from datetime import date, datetime, timedelta
 from fastapi.testclient import TestClient
 
 from abrechnung.http.api import Api
+from abrechnung.http.routers.websocket import WebsocketSender
 from tests.common import TEST_CONFIG, BaseTestCase
 
 
@@ -275,3 +276,57 @@ class WebsocketAPITest(BaseTestCase):
                     },
                 },
             )
+
+
+class SlowWebsocket:
+    def __init__(self):
+        self.sent: list[str] = []
+        self.can_send = asyncio.Event()
+
+    async def send_text(self, message: str):
+        await self.can_send.wait()
+        self.sent.append(message)
+
+
+class WebsocketSenderTest(unittest.IsolatedAsyncioTestCase):
+    async def test_slow_client_does_not_block(self):
+        websocket = SlowWebsocket()
+        sender = WebsocketSender(connection_id=1, websocket=websocket, max_queue_size=3)  # type: ignore
+
+        sender.send_notification("a")
+        await asyncio.sleep(0)  # the writer task picks up "a" and blocks on sending it
+        for message in ["b", "c", "b", "d", "e", "f"]:
+            sender.send_notification(message)
+        sender.send_response("response")
+
+        self.assertEqual(1, sender.n_coalesced)
+        self.assertEqual(3, sender.n_dropped)
+        self.assertEqual(3, sender.queue_depth)
+
+        websocket.can_send.set()
+        for _ in range(10):
+            await asyncio.sleep(0)
+        self.assertEqual(["a", "e", "f", "response"], websocket.sent)
+        self.assertEqual(0, sender.queue_depth)
+
+        await sender.close()
+
+    async def test_queue_full_of_responses(self):
+        websocket = SlowWebsocket()
+        sender = WebsocketSender(connection_id=1, websocket=websocket, max_queue_size=2)  # type: ignore
+
+        sender.send_response("r1")
+        await asyncio.sleep(0)  # the writer task picks up "r1" and blocks on sending it
+        for message in ["r2", "r3", "r4"]:
+            sender.send_response(message)
+        sender.send_notification("n")
+
+        self.assertEqual(2, sender.n_dropped)
+        self.assertEqual(2, sender.queue_depth)
+
+        websocket.can_send.set()
+        for _ in range(10):
+            await asyncio.sleep(0)
+        self.assertEqual(["r1", "r2", "r3"], websocket.sent)
+
+        await sender.close()
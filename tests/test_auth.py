@@ -1,8 +1,11 @@
 # pylint: disable=attribute-defined-outside-init,missing-kwoa
+import asyncio
+import time
 from datetime import datetime, timedelta
 
 from abrechnung.application.groups import GroupService
-from abrechnung.application.users import UserService
+from abrechnung.application.users import _USER_CACHE_SWEEP_THRESHOLD, UserService
+from abrechnung.core.errors import InvalidCommand, TooManyRequests
 
 from .common import TEST_CONFIG, BaseTestCase
 
@@ -81,3 +84,90 @@ class TransactionLogicTest(BaseTestCase):
         self.assertIsNotNone(user_id)
         user = await user_service.get_user(user_id=user_id)
         self.assertFalse(user.pending)
+
+    async def test_user_cache_invalidation(self):
+        user, password = await self._create_test_user("cached user", "cached@test.test")
+        _, session_id, token = await self.user_service.login_user(
+            username=user.username, password=password, session_name="session1"
+        )
+
+        async with self.db_pool.acquire() as conn:
+            await conn.add_listener("user_cache", self.user_service.on_user_cache_notification)
+
+            cached_user = await self.user_service.get_user_from_token(token=token)
+            self.assertEqual(user.id, cached_user.id)
+
+            # changes from outside of this user service are propagated through notifications
+            await conn.execute("update usr set username = 'renamed user' where id = $1", user.id)
+            await conn.execute("select pg_sleep(0.1)")
+            cached_user = await self.user_service.get_user_from_token(token=token)
+            self.assertEqual("renamed user", cached_user.username)
+
+            await conn.remove_listener("user_cache", self.user_service.on_user_cache_notification)
+
+        await self.user_service.logout_user(user=cached_user, session_id=session_id)
+        with self.assertRaises(PermissionError):
+            await self.user_service.get_user_from_token(token=token)
+
+    async def test_user_cache_sweep(self):
+        user, password = await self._create_test_user("cached user", "cached@test.test")
+        _, _, token = await self.user_service.login_user(
+            username=user.username, password=password, session_name="session1"
+        )
+
+        # entries of abandoned sessions are evicted once the cache grows too large
+        expired = time.time() - 1
+        for i in range(_USER_CACHE_SWEEP_THRESHOLD):
+            self.user_service._user_cache[(-i, user.id)] = (expired, user)
+
+        await self.user_service.get_user_from_token(token=token)
+        self.assertEqual(1, len(self.user_service._user_cache))
+
+    async def test_failed_login_limit(self):
+        config = TEST_CONFIG.model_copy(deep=True)
+        config.api.max_failed_logins = 2
+        user_service = UserService(self.db_pool, config=config)
+        user, password = await self._create_test_user("limited user", "limited@test.test")
+
+        # attempts via the username and the email of a user count towards the same limit
+        for username in [user.username, user.email]:
+            with self.assertRaises(InvalidCommand):
+                await user_service.login_user(
+                    username=username, password="wrong", session_name="session", client_address="10.0.0.1"
+                )
+
+        with self.assertRaises(TooManyRequests):
+            await user_service.login_user(
+                username=user.username, password=password, session_name="session", client_address="10.0.0.1"
+            )
+
+        # failed attempts of another client never lock out the user
+        await user_service.login_user(
+            username=user.username, password=password, session_name="session", client_address="10.0.0.2"
+        )
+
+        # other users are unaffected
+        other_user, other_password = await self._create_test_user("other user", "other@test.test")
+        await user_service.login_user(
+            username=other_user.username, password=other_password, session_name="session", client_address="10.0.0.1"
+        )
+
+        user_service._failed_logins.clear()
+        await user_service.login_user(
+            username=user.username, password=password, session_name="session", client_address="10.0.0.1"
+        )
+        user_service.shutdown()
+
+    async def test_password_operation_queue_limit(self):
+        config = TEST_CONFIG.model_copy(deep=True)
+        config.api.password_hashing_workers = 1
+        config.api.max_pending_password_operations = 2
+        user_service = UserService(self.db_pool, config=config)
+
+        results = await asyncio.gather(
+            *[user_service._hash_password_async("asdf1234") for _ in range(3)], return_exceptions=True
+        )
+        self.assertEqual(1, len([r for r in results if isinstance(r, TooManyRequests)]))
+        hashed = [r for r in results if isinstance(r, str)]
+        self.assertEqual(2, len(hashed))
+        self.assertTrue(await user_service._check_password_async("asdf1234", hashed[0]))
@@ -0,0 +1,571 @@
+# pylint: disable=attribute-defined-outside-init,missing-kwoa
+import random
+from datetime import date, datetime
+from unittest import TestCase
+
+import numpy as np
+
+from abrechnung.application.accounts import AccountService
+from abrechnung.application.balance_effects import (
+    BalanceEffectColumns,
+    compute_balance_effects,
+    load_balance_effect_columns,
+)
+from abrechnung.application.balances import (
+    BalanceService,
+    compute_account_balances,
+    compute_account_balances_from_effects,
+    compute_transaction_balance_effect,
+)
+from abrechnung.application.groups import GroupService
+from abrechnung.application.transactions import TransactionService
+from abrechnung.domain.accounts import (
+    AccountType,
+    ClearingAccount,
+    NewAccount,
+    PersonalAccount,
+)
+from abrechnung.domain.balances import (
+    AccountBalance,
+    BalanceChangeOriginType,
+    BalanceHistoryInterval,
+    SettlementMode,
+)
+from abrechnung.domain.transactions import (
+    NewTransaction,
+    NewTransactionPosition,
+    Transaction,
+    TransactionPosition,
+    TransactionType,
+    UpdateTransaction,
+)
+
+from .common import BaseTestCase
+
+
+def _purchase(transaction_id: int, value: float, creditor_shares: dict, debitor_shares: dict, **kwargs) -> Transaction:
+    return Transaction(
+        id=transaction_id,
+        group_id=0,
+        type=TransactionType.purchase,
+        name="foobar",
+        description="",
+        value=value,
+        currency_symbol="€",
+        currency_conversion_rate=1.0,
+        billed_at=date(2022, 10, 10),
+        tags=[],
+        deleted=kwargs.pop("deleted", False),
+        creditor_shares=creditor_shares,
+        debitor_shares=debitor_shares,
+        last_changed=datetime.now(),
+        positions=kwargs.pop("positions", []),
+        files=[],
+    )
+
+
+def _personal(account_id: int) -> PersonalAccount:
+    return PersonalAccount(
+        id=account_id,
+        group_id=0,
+        type="personal",
+        name="foobar",
+        description="",
+        owning_user_id=None,
+        deleted=False,
+        last_changed=datetime.now(),
+    )
+
+
+def _clearing(account_id: int, clearing_shares: dict) -> ClearingAccount:
+    return ClearingAccount(
+        id=account_id,
+        group_id=0,
+        type="clearing",
+        name="foobar",
+        description="",
+        date_info=date(2022, 10, 10),
+        tags=[],
+        clearing_shares=clearing_shares,
+        last_changed=datetime.now(),
+        deleted=False,
+    )
+
+
+def _columns(transactions: list[Transaction]) -> BalanceEffectColumns:
+    transactions = sorted(transactions, key=lambda t: t.id)
+    items = sorted(
+        [(position, transaction.id) for transaction in transactions for position in transaction.positions],
+        key=lambda p: p[0].id,
+    )
+    creditors = [(t.id, account_id, shares) for t in transactions for account_id, shares in t.creditor_shares.items()]
+    debitors = [(t.id, account_id, shares) for t in transactions for account_id, shares in t.debitor_shares.items()]
+    usages = [(p.id, account_id, shares) for p, _ in items for account_id, shares in p.usages.items()]
+    return BalanceEffectColumns(
+        transaction_ids=np.array([t.id for t in transactions], dtype=np.int64),
+        transaction_values=np.array([t.value for t in transactions], dtype=np.float64),
+        creditor_transaction_ids=np.array([c[0] for c in creditors], dtype=np.int64),
+        creditor_account_ids=np.array([c[1] for c in creditors], dtype=np.int64),
+        creditor_shares=np.array([c[2] for c in creditors], dtype=np.float64),
+        debitor_transaction_ids=np.array([d[0] for d in debitors], dtype=np.int64),
+        debitor_account_ids=np.array([d[1] for d in debitors], dtype=np.int64),
+        debitor_shares=np.array([d[2] for d in debitors], dtype=np.float64),
+        item_ids=np.array([p.id for p, _ in items], dtype=np.int64),
+        item_transaction_ids=np.array([transaction_id for _, transaction_id in items], dtype=np.int64),
+        item_prices=np.array([p.price for p, _ in items], dtype=np.float64),
+        item_communist_shares=np.array([p.communist_shares for p, _ in items], dtype=np.float64),
+        usage_item_ids=np.array([u[0] for u in usages], dtype=np.int64),
+        usage_account_ids=np.array([u[1] for u in usages], dtype=np.int64),
+        usage_shares=np.array([u[2] for u in usages], dtype=np.float64),
+    )
+
+
+class BalanceComputationTest(TestCase):
+    def test_transaction_balance_effect_with_positions(self):
+        transaction = _purchase(
+            0,
+            100,
+            creditor_shares={1: 1},
+            debitor_shares={1: 1, 2: 1},
+            positions=[
+                TransactionPosition(id=0, name="item", price=30, communist_shares=1, usages={2: 2}, deleted=False),
+                TransactionPosition(id=1, name="deleted", price=50, communist_shares=0, usages={1: 1}, deleted=True),
+            ],
+        )
+        effect = compute_transaction_balance_effect(transaction)
+        self.assertAlmostEqual(20, effect[2].positions)
+        # 100 - 30 + 10 remaining for the communist shares
+        self.assertAlmostEqual(40, effect[1].common_debitors)
+        self.assertAlmostEqual(40, effect[2].common_debitors)
+        self.assertAlmostEqual(100, effect[1].common_creditors)
+        self.assertAlmostEqual(60, effect[1].total)
+        self.assertAlmostEqual(-60, effect[2].total)
+
+    def test_vectorized_balance_effects(self):
+        rng = random.Random(42)
+        transactions = []
+        for transaction_id in range(200):
+            positions = [
+                TransactionPosition(
+                    id=transaction_id * 10 + i,
+                    name="item",
+                    price=rng.uniform(1, 50),
+                    communist_shares=rng.choice([0, 0, 1, 2]),
+                    usages={account_id: rng.randint(1, 3) for account_id in rng.sample(range(20), rng.randint(0, 4))},
+                    deleted=False,
+                )
+                for i in range(rng.randint(0, 4))
+            ]
+            transactions.append(
+                _purchase(
+                    transaction_id,
+                    rng.uniform(50, 300),
+                    creditor_shares={rng.randrange(20): 1},
+                    debitor_shares={account_id: rng.randint(1, 3) for account_id in rng.sample(range(20), 3)},
+                    positions=positions,
+                )
+            )
+        # a transaction without debitors keeps the remaining value unassigned
+        transactions.append(_purchase(200, 100, creditor_shares={1: 1}, debitor_shares={}))
+
+        effects = compute_balance_effects(_columns(transactions))
+        for transaction in transactions:
+            expected = compute_transaction_balance_effect(transaction)
+            actual = effects.for_transaction(transaction.id)
+            self.assertEqual(set(expected.keys()), set(actual.keys()))
+            for account_id, effect in expected.items():
+                self.assertAlmostEqual(effect.total, actual[account_id].total)
+                self.assertAlmostEqual(effect.positions, actual[account_id].positions)
+                self.assertAlmostEqual(effect.common_creditors, actual[account_id].common_creditors)
+                self.assertAlmostEqual(effect.common_debitors, actual[account_id].common_debitors)
+
+        accounts = [_personal(account_id) for account_id in range(18)] + [_clearing(18, {0: 1, 19: 2}), _personal(19)]
+        expected_balances = compute_account_balances(accounts, transactions)
+        balances = compute_account_balances_from_effects(accounts, effects)
+        for account_id, expected_balance in expected_balances.items():
+            self.assertAlmostEqual(expected_balance.balance, balances[account_id].balance)
+            self.assertAlmostEqual(expected_balance.before_clearing, balances[account_id].before_clearing)
+            self.assertAlmostEqual(expected_balance.total_consumed, balances[account_id].total_consumed)
+            self.assertAlmostEqual(expected_balance.total_paid, balances[account_id].total_paid)
+
+    def test_vectorized_balance_effects_without_transactions(self):
+        effects = compute_balance_effects(_columns([]))
+        self.assertEqual(0, len(effects.account_ids))
+        self.assertEqual({}, effects.for_transaction(1))
+
+    def test_one_transaction(self):
+        accounts = [_personal(1), _personal(2), _personal(3)]
+        transaction = _purchase(0, 100, creditor_shares={1: 1}, debitor_shares={1: 1, 2: 2, 3: 1})
+
+        balances = compute_account_balances(accounts, [transaction])
+        self.assertEqual(
+            {
+                1: AccountBalance(balance=75, before_clearing=75, total_consumed=25, total_paid=100),
+                2: AccountBalance(balance=-50, before_clearing=-50, total_consumed=50, total_paid=0),
+                3: AccountBalance(balance=-25, before_clearing=-25, total_consumed=25, total_paid=0),
+            },
+            balances,
+        )
+
+    def test_deleted_transactions_are_ignored(self):
+        accounts = [_personal(1), _personal(2)]
+        transaction = _purchase(0, 100, creditor_shares={1: 1}, debitor_shares={2: 1}, deleted=True)
+
+        balances = compute_account_balances(accounts, [transaction])
+        self.assertEqual(0, balances[1].balance)
+        self.assertEqual(0, balances[2].balance)
+
+    def test_interdependent_clearing_accounts(self):
+        transactions = [
+            _purchase(0, 100, creditor_shares={1: 1}, debitor_shares={1: 1, 2: 1, 4: 2}),
+            _purchase(1, 100, creditor_shares={3: 1}, debitor_shares={6: 1}),
+            _purchase(2, 100, creditor_shares={2: 1}, debitor_shares={5: 1, 7: 1}),
+        ]
+        accounts = [
+            _personal(1),
+            _personal(2),
+            _personal(3),
+            _clearing(4, {3: 1}),
+            _clearing(5, {4: 2, 1: 1, 2: 1}),
+            _clearing(6, {5: 1}),
+            _clearing(7, {}),
+        ]
+
+        balances = compute_account_balances(accounts, transactions)
+        self.assertEqual(
+            {
+                1: AccountBalance(balance=37.5, before_clearing=75, total_consumed=62.5, total_paid=100),
+                2: AccountBalance(balance=37.5, before_clearing=75, total_consumed=62.5, total_paid=100),
+                3: AccountBalance(balance=-25, before_clearing=100, total_consumed=125, total_paid=100),
+                4: AccountBalance(
+                    balance=0, before_clearing=-50, total_consumed=125, total_paid=0, clearing_resolution={3: -125}
+                ),
+                5: AccountBalance(
+                    balance=0,
+                    before_clearing=-50,
+                    total_consumed=150,
+                    total_paid=0,
+                    clearing_resolution={1: -37.5, 2: -37.5, 4: -75},
+                ),
+                6: AccountBalance(
+                    balance=0, before_clearing=-100, total_consumed=100, total_paid=0, clearing_resolution={5: -100}
+                ),
+                7: AccountBalance(balance=-50, before_clearing=-50, total_consumed=50, total_paid=0),
+            },
+            balances,
+        )
+
+    def test_clearing_account_chain(self):
+        n_clearing_accounts = 10
+        accounts = [_personal(1), _personal(2)]
+        for i in range(n_clearing_accounts):
+            accounts.append(_clearing(i + 3, {i + 4: 1}))
+        accounts.append(_clearing(n_clearing_accounts + 3, {2: 1}))
+        transaction = _purchase(0, 100, creditor_shares={1: 1}, debitor_shares={3: 1})
+
+        balances = compute_account_balances(accounts, [transaction])
+        self.assertEqual(
+            AccountBalance(balance=-100, before_clearing=0, total_consumed=100, total_paid=0),
+            balances[2],
+        )
+
+
+class BalanceServiceTest(BaseTestCase):
+    async def asyncSetUp(self) -> None:
+        await super().asyncSetUp()
+        self.group_service = GroupService(self.db_pool, config=self.test_config)
+        self.account_service = AccountService(self.db_pool, config=self.test_config)
+        self.transaction_service = TransactionService(self.db_pool, config=self.test_config)
+        self.balance_service = BalanceService(self.db_pool, config=self.test_config)
+
+        self.user, _ = await self._create_test_user("test", "test@test.test")
+        self.group_id = await self.group_service.create_group(
+            user=self.user,
+            name="test group",
+            description="",
+            currency_symbol="€",
+            terms="",
+            add_user_account_on_join=False,
+        )
+
+    async def _create_account(self, name: str, **kwargs) -> int:
+        return await self.account_service.create_account(
+            user=self.user,
+            group_id=self.group_id,
+            account=NewAccount(type=kwargs.pop("type", AccountType.personal), name=name, **kwargs),
+        )
+
+    async def test_get_balances(self):
+        account1_id = await self._create_account("account1")
+        account2_id = await self._create_account("account2")
+        account3_id = await self._create_account("account3")
+        clearing_id = await self._create_account(
+            "clearing",
+            type=AccountType.clearing,
+            date_info=date.today(),
+            clearing_shares={account2_id: 1, account3_id: 1},
+        )
+
+        await self.transaction_service.create_transaction(
+            user=self.user,
+            group_id=self.group_id,
+            transaction=NewTransaction(
+                type=TransactionType.purchase,
+                name="purchase",
+                description="",
+                value=100,
+                currency_symbol="€",
+                currency_conversion_rate=1.0,
+                billed_at=date.today(),
+                creditor_shares={account1_id: 1.0},
+                debitor_shares={account1_id: 1.0, clearing_id: 1.0},
+                new_positions=[
+                    NewTransactionPosition(name="item", price=20, communist_shares=0, usages={account3_id: 1.0}),
+                ],
+            ),
+        )
+        deleted_id = await self.transaction_service.create_transaction(
+            user=self.user,
+            group_id=self.group_id,
+            transaction=NewTransaction(
+                type=TransactionType.transfer,
+                name="transfer",
+                description="",
+                value=50,
+                currency_symbol="€",
+                currency_conversion_rate=1.0,
+                billed_at=date.today(),
+                creditor_shares={account1_id: 1.0},
+                debitor_shares={account2_id: 1.0},
+            ),
+        )
+        before_deletion = await self.db_pool.fetchval("select now()")
+        await self.transaction_service.delete_transaction(user=self.user, transaction_id=deleted_id)
+
+        balances = await self.balance_service.get_balances(user=self.user, group_id=self.group_id)
+        self.assertEqual({account1_id, account2_id, account3_id, clearing_id}, set(balances.keys()))
+        self.assertAlmostEqual(60, balances[account1_id].balance)
+        self.assertAlmostEqual(-20, balances[account2_id].balance)
+        self.assertAlmostEqual(-40, balances[account3_id].balance)
+        self.assertAlmostEqual(0, balances[clearing_id].balance)
+        self.assertAlmostEqual(-40, balances[clearing_id].before_clearing)
+        self.assertEqual({account2_id: -20, account3_id: -20}, balances[clearing_id].clearing_resolution)
+
+        balances = await self.balance_service.get_balances(
+            user=self.user, group_id=self.group_id, valid_at=before_deletion
+        )
+        self.assertAlmostEqual(110, balances[account1_id].balance)
+        self.assertAlmostEqual(-70, balances[account2_id].balance)
+
+    async def test_balance_effects_of_latest_revision(self):
+        account1_id = await self._create_account("account1")
+        account2_id = await self._create_account("account2")
+        account3_id = await self._create_account("account3")
+
+        transaction_id = await self.transaction_service.create_transaction(
+            user=self.user,
+            group_id=self.group_id,
+            transaction=NewTransaction(
+                type=TransactionType.purchase,
+                name="purchase",
+                description="",
+                value=100,
+                currency_symbol="€",
+                currency_conversion_rate=1.0,
+                billed_at=date.today(),
+                creditor_shares={account1_id: 1.0},
+                debitor_shares={account1_id: 1.0, account2_id: 1.0},
+                new_positions=[
+                    NewTransactionPosition(name="item1", price=20, communist_shares=1, usages={account3_id: 1.0}),
+                    NewTransactionPosition(name="item2", price=10, communist_shares=0, usages={account2_id: 1.0}),
+                ],
+            ),
+        )
+        transaction = await self.transaction_service.get_transaction(user=self.user, transaction_id=transaction_id)
+        changed_position = next(p for p in transaction.positions if p.name == "item1")
+        await self.transaction_service.update_transaction(
+            user=self.user,
+            transaction_id=transaction_id,
+            transaction=UpdateTransaction(
+                **transaction.model_dump(include={"type", "name", "description", "currency_symbol", "billed_at"}),
+                value=120,
+                currency_conversion_rate=1.0,
+                creditor_shares={account2_id: 1.0},
+                debitor_shares={account1_id: 1.0, account2_id: 1.0, account3_id: 2.0},
+                changed_positions=[changed_position.model_copy(update={"price": 40, "usages": {account1_id: 3.0}})],
+            ),
+        )
+        transaction = await self.transaction_service.get_transaction(user=self.user, transaction_id=transaction_id)
+
+        async with self.db_pool.acquire() as conn:
+            columns = await load_balance_effect_columns(conn=conn, group_id=self.group_id)
+        effect = compute_balance_effects(columns).for_transaction(transaction_id)
+        expected = compute_transaction_balance_effect(transaction)
+        self.assertEqual(set(expected.keys()), set(effect.keys()))
+        for account_id, account_effect in expected.items():
+            self.assertAlmostEqual(account_effect.total, effect[account_id].total)
+            self.assertAlmostEqual(account_effect.positions, effect[account_id].positions)
+
+    async def test_rebuild_and_verify_balances(self):
+        account1_id = await self._create_account("account1")
+        account2_id = await self._create_account("account2")
+        transaction_id = await self.transaction_service.create_transaction(
+            user=self.user,
+            group_id=self.group_id,
+            transaction=NewTransaction(
+                type=TransactionType.purchase,
+                name="purchase",
+                description="",
+                value=100,
+                currency_symbol="€",
+                currency_conversion_rate=1.0,
+                billed_at=date.today(),
+                creditor_shares={account1_id: 1.0},
+                debitor_shares={account1_id: 1.0, account2_id: 3.0},
+                new_positions=[
+                    NewTransactionPosition(name="item", price=20, communist_shares=1, usages={account2_id: 1.0}),
+                ],
+            ),
+        )
+        transaction = await self.transaction_service.get_transaction(user=self.user, transaction_id=transaction_id)
+        await self.transaction_service.update_transaction(
+            user=self.user,
+            transaction_id=transaction_id,
+            transaction=UpdateTransaction(
+                **transaction.model_dump(include=set(NewTransaction.model_fields) - {"new_files", "new_positions"}),
+                changed_positions=[transaction.positions[0].model_copy(update={"usages": {account1_id: 1.0}})],
+            ),
+        )
+        self.assertEqual([], await self.balance_service.verify_balances(group_id=self.group_id))
+
+        balances = await self.balance_service.get_balances(user=self.user, group_id=self.group_id)
+        # the item is billed half to account1 and half to the debitors, 10 + 22.5 consumed by account1
+        self.assertAlmostEqual(67.5, balances[account1_id].balance)
+        self.assertAlmostEqual(32.5, balances[account1_id].total_consumed)
+        self.assertAlmostEqual(100, balances[account1_id].total_paid)
+        self.assertAlmostEqual(-67.5, balances[account2_id].balance)
+
+        await self.transaction_service.delete_transaction(user=self.user, transaction_id=transaction_id)
+        self.assertEqual([], await self.balance_service.verify_balances(group_id=self.group_id))
+        balances = await self.balance_service.get_balances(user=self.user, group_id=self.group_id)
+        self.assertAlmostEqual(0, balances[account1_id].balance)
+        self.assertAlmostEqual(0, balances[account2_id].total_consumed)
+
+        await self.db_pool.execute("update account_balance set balance = 42 where account_id = $1", account1_id)
+        self.assertEqual(1, len(await self.balance_service.verify_balances(group_id=self.group_id)))
+        await self.balance_service.rebuild_balances(group_id=self.group_id)
+        self.assertEqual([], await self.balance_service.verify_balances(group_id=self.group_id))
+
+    async def test_get_settlement(self):
+        account1_id = await self._create_account("account1")
+        account2_id = await self._create_account("account2")
+        account3_id = await self._create_account("account3")
+        transaction = NewTransaction(
+            type=TransactionType.purchase,
+            name="purchase",
+            description="",
+            value=90,
+            currency_symbol="€",
+            currency_conversion_rate=1.0,
+            billed_at=date.today(),
+            creditor_shares={account1_id: 1.0},
+            debitor_shares={account1_id: 1.0, account2_id: 1.0, account3_id: 1.0},
+        )
+        await self.transaction_service.create_transaction(
+            user=self.user, group_id=self.group_id, transaction=transaction
+        )
+
+        plan = await self.balance_service.get_settlement(user=self.user, group_id=self.group_id)
+        self.assertEqual(
+            {(account2_id, account1_id, 30), (account3_id, account1_id, 30)},
+            {(t.creditor_id, t.debitor_id, t.payment_amount) for t in plan},
+        )
+
+        # the plan is cached until the next change in the group is committed
+        await self.db_pool.execute("update account_balance set balance = 0 where group_id = $1", self.group_id)
+        self.assertEqual(plan, await self.balance_service.get_settlement(user=self.user, group_id=self.group_id))
+
+        await self.transaction_service.create_transaction(
+            user=self.user,
+            group_id=self.group_id,
+            transaction=transaction.model_copy(update={"creditor_shares": {account2_id: 1.0}}),
+        )
+        await self.balance_service.rebuild_balances(group_id=self.group_id)
+        plan = await self.balance_service.get_settlement(
+            user=self.user, group_id=self.group_id, mode=SettlementMode.min_transfers
+        )
+        self.assertEqual(
+            [(account3_id, account1_id, 30), (account3_id, account2_id, 30)],
+            sorted((t.creditor_id, t.debitor_id, t.payment_amount) for t in plan),
+        )
+
+    async def test_get_account_balance_history(self):
+        account1_id = await self._create_account("account1")
+        account2_id = await self._create_account("account2")
+        clearing_id = await self._create_account(
+            "clearing",
+            type=AccountType.clearing,
+            date_info=date(2024, 1, 10),
+            clearing_shares={account1_id: 1, account2_id: 1},
+        )
+
+        async def _create_transfer(value: float, billed_at: date, creditor_id: int, debitor_id: int) -> int:
+            return await self.transaction_service.create_transaction(
+                user=self.user,
+                group_id=self.group_id,
+                transaction=NewTransaction(
+                    type=TransactionType.transfer,
+                    name="transfer",
+                    description="",
+                    value=value,
+                    currency_symbol="€",
+                    currency_conversion_rate=1.0,
+                    billed_at=billed_at,
+                    creditor_shares={creditor_id: 1.0},
+                    debitor_shares={debitor_id: 1.0},
+                ),
+            )
+
+        transaction1_id = await _create_transfer(10, date(2024, 1, 31), account1_id, account2_id)
+        transaction2_id = await _create_transfer(20, date(2024, 1, 1), account1_id, account2_id)
+        transaction3_id = await _create_transfer(30, date(2024, 1, 2), clearing_id, account1_id)
+        await _create_transfer(40, date(2024, 1, 2), account2_id, account2_id)
+
+        history = await self.balance_service.get_account_balance_history(user=self.user, account_id=account1_id)
+        self.assertEqual(
+            [
+                (date(2024, 1, 1), 20, 20, BalanceChangeOriginType.transaction, transaction2_id),
+                (date(2024, 1, 2), -30, -10, BalanceChangeOriginType.transaction, transaction3_id),
+                (date(2024, 1, 10), 15, 5, BalanceChangeOriginType.clearing, clearing_id),
+                (date(2024, 1, 31), 10, 15, BalanceChangeOriginType.transaction, transaction1_id),
+            ],
+            [(e.date, e.change, e.balance, e.change_origin.type, e.change_origin.id) for e in history],
+        )
+
+        history = await self.balance_service.get_account_balance_history(
+            user=self.user, account_id=account1_id, interval=BalanceHistoryInterval.week
+        )
+        self.assertEqual(
+            [(date(2024, 1, 1), -10, -10, 2), (date(2024, 1, 8), 15, 5, 1), (date(2024, 1, 29), 10, 15, 1)],
+            [(e.date, e.change, e.balance, e.n_changes) for e in history],
+        )
+        history = await self.balance_service.get_account_balance_history(
+            user=self.user, account_id=account1_id, interval=BalanceHistoryInterval.month
+        )
+        self.assertEqual([(date(2024, 1, 1), 15, 15, 4)], [(e.date, e.change, e.balance, e.n_changes) for e in history])
+
+        # the ledger follows changes of the billing date
+        transaction = await self.transaction_service.get_transaction(user=self.user, transaction_id=transaction1_id)
+        await self.transaction_service.update_transaction(
+            user=self.user,
+            transaction_id=transaction1_id,
+            transaction=UpdateTransaction(
+                **transaction.model_dump(include=set(NewTransaction.model_fields) - {"new_files", "new_positions"}),
+            ).model_copy(update={"billed_at": date(2023, 12, 31)}),
+        )
+        history = await self.balance_service.get_account_balance_history(
+            user=self.user, account_id=account1_id, interval=BalanceHistoryInterval.month
+        )
+        self.assertEqual(
+            [(date(2023, 12, 1), 10, 10), (date(2024, 1, 1), 5, 15)], [(e.date, e.change, e.balance) for e in history]
+        )
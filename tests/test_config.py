@@ -28,3 +28,4 @@ def test_config_load_from_env():
         assert loaded_cfg.database.dbname == "abrechnung"
         assert loaded_cfg.database.password == "password"
         assert loaded_cfg.email.address == "do-not-reply@test.com"
+        assert loaded_cfg.api.forwarded_allow_ips == "*"
@@ -1,6 +1,7 @@
 # pylint: disable=attribute-defined-outside-init,missing-kwoa
 import asyncio
 from dataclasses import dataclass
+from datetime import timedelta
 from typing import Optional
 
 from aiosmtpd import smtp
@@ -32,14 +33,25 @@ def decode(val: str | bytes | None) -> str:
 class DummySMTPHandler:
     def __init__(self):
         self.mail_queue: asyncio.Queue[smtp.Envelope] = asyncio.Queue()
+        # delays accepting mails to the given addresses by the given number of seconds
+        self.delays: dict[str, float] = {}
+        # rejects mails to the given addresses with the given reply, as long as the counter is positive
+        self.rejections: dict[str, tuple[str, int]] = {}
 
     async def handle_RCPT(self, server, session, envelope: smtp.Envelope, address: str, rcpt_options):
         del server, session, rcpt_options  # unused
+        reply, count = self.rejections.get(address, ("", 0))
+        if count > 0:
+            self.rejections[address] = (reply, count - 1)
+            return reply
         envelope.rcpt_tos.append(address)
         return "250 OK"
 
     async def handle_DATA(self, server, session, envelope: smtp.Envelope):
         del server, session  # unused
+        delay = max((self.delays.get(address, 0) for address in envelope.rcpt_tos), default=0)
+        if delay > 0:
+            await asyncio.sleep(delay)
         await self.mail_queue.put(envelope)
         return "250 Message accepted for delivery"
 
@@ -55,6 +67,9 @@ class MailerTest(BaseTestCase):
         config.email.host = self.smtp.hostname
         config.email.port = self.smtp.port
         config.email.address = "abrechnung@stusta.de"
+        config.email.max_attempts = 3
+        config.email.retry_backoff = timedelta(milliseconds=500)
+        self.config = config
         self.mailer = Mailer(config=config)
 
         self.mailer_task = asyncio.create_task(self.mailer.run())
@@ -62,8 +77,9 @@ class MailerTest(BaseTestCase):
         self.user_service = UserService(db_pool=self.db_pool, config=config)
 
     async def asyncTearDown(self) -> None:
-        await super().asyncTearDown()
         self.mailer_task.cancel()
+        await asyncio.gather(self.mailer_task, return_exceptions=True)
+        await super().asyncTearDown()
         self.smtp.stop()
 
     async def test_registration_mail_delivery(self):
@@ -102,3 +118,124 @@ class MailerTest(BaseTestCase):
         assert mail is not None
         self.assertIn(user_email, mail.rcpt_tos)
         self.assertIn("[Test Abrechnung] Reset password", decode(mail.content))
+
+    async def test_connections_are_reused(self):
+        n_connects = 0
+        connect = self.mailer.smtp.connect
+
+        def _counting_connect():
+            nonlocal n_connects
+            n_connects += 1
+            return connect()
+
+        self.mailer.smtp.connect = _counting_connect  # type: ignore
+        for i in range(6):
+            await self.user_service.register_user(username=f"user{i}", email=f"user{i}@email.com", password="password")
+            await asyncio.sleep(0.2)
+
+        self.assertEqual(6, self.smtp_handler.mail_queue.qsize())
+        # all mails were sent one after the other over the connection established on startup
+        self.assertLessEqual(n_connects, 1)
+
+    async def test_stalled_send_does_not_block_other_mails(self):
+        self.smtp_handler.delays["slow@email.com"] = 2
+        await self.user_service.register_user(username="slow", email="slow@email.com", password="password")
+        await asyncio.sleep(0.2)
+        await self.user_service.register_user(username="fast", email="fast@email.com", password="password")
+        await asyncio.sleep(0.5)
+
+        mail: smtp.Envelope = self.smtp_handler.mail_queue.get_nowait()
+        self.assertEqual(["fast@email.com"], mail.rcpt_tos)
+        self.assertTrue(self.smtp_handler.mail_queue.empty())
+
+        await asyncio.sleep(2)
+        mail = self.smtp_handler.mail_queue.get_nowait()
+        self.assertEqual(["slow@email.com"], mail.rcpt_tos)
+
+    async def _pending_registration(self, user_email: str):
+        return await self.db_pool.fetchrow(
+            "select pr.mail_attempts, pr.mail_next_attempt, pr.mail_failed_at, pr.mail_last_error "
+            "from pending_registration pr join usr on usr.id = pr.user_id where usr.email = $1",
+            user_email,
+        )
+
+    async def test_failed_mails_are_retried(self):
+        user_email = "user@email.com"
+        self.smtp_handler.rejections[user_email] = ("451 try again later", 2)
+        await self.user_service.register_user(username="user1", email=user_email, password="password")
+
+        await asyncio.sleep(0.2)
+        self.assertTrue(self.smtp_handler.mail_queue.empty())
+        pending = await self._pending_registration(user_email)
+        self.assertEqual(1, pending["mail_attempts"])
+        self.assertIsNotNone(pending["mail_next_attempt"])
+        self.assertIn("try again later", pending["mail_last_error"])
+
+        # retries are woken up by a timer after 500ms and 1s of backoff without any further notifications
+        await asyncio.sleep(2.5)
+        mail: smtp.Envelope = self.smtp_handler.mail_queue.get_nowait()
+        self.assertIn(user_email, mail.rcpt_tos)
+        pending = await self._pending_registration(user_email)
+        self.assertEqual(2, pending["mail_attempts"])
+        self.assertIsNone(pending["mail_next_attempt"])
+        self.assertIsNone(pending["mail_failed_at"])
+
+    async def test_failed_mails_are_dead_lettered(self):
+        self.smtp_handler.rejections["unknown@email.com"] = ("550 no such user", 100)
+        self.smtp_handler.rejections["unavailable@email.com"] = ("451 try again later", 100)
+        await self.user_service.register_user(username="user1", email="unknown@email.com", password="password")
+        await self.user_service.register_user(username="user2", email="unavailable@email.com", password="password")
+        await asyncio.sleep(2.5)
+
+        self.assertTrue(self.smtp_handler.mail_queue.empty())
+        # permanent failures are given up on immediately
+        pending = await self._pending_registration("unknown@email.com")
+        self.assertEqual(1, pending["mail_attempts"])
+        self.assertIsNone(pending["mail_next_attempt"])
+        self.assertIsNotNone(pending["mail_failed_at"])
+        # temporary failures are retried until the attempts are exhausted
+        pending = await self._pending_registration("unavailable@email.com")
+        self.assertEqual(3, pending["mail_attempts"])
+        self.assertIsNone(pending["mail_next_attempt"])
+        self.assertIsNotNone(pending["mail_failed_at"])
+
+    async def test_multiple_mailers(self):
+        config = self.config.model_copy(deep=True)
+        config.email.batch_size = 2
+        second_mailer_task = asyncio.create_task(Mailer(config=config).run())
+        try:
+            await asyncio.sleep(0.5)
+            async with self.db_pool.acquire() as conn:
+                async with conn.transaction():
+                    for i in range(10):
+                        user_id = await conn.fetchval(
+                            "insert into usr (username, email, hashed_password, pending) "
+                            "values ($1, $2, '', true) returning id",
+                            f"user{i}",
+                            f"user{i}@email.com",
+                        )
+                        await conn.execute("insert into pending_registration (user_id) values ($1)", user_id)
+            await asyncio.sleep(1)
+        finally:
+            second_mailer_task.cancel()
+            await asyncio.gather(second_mailer_task, return_exceptions=True)
+
+        recipients = []
+        while not self.smtp_handler.mail_queue.empty():
+            recipients.extend(self.smtp_handler.mail_queue.get_nowait().rcpt_tos)
+        # every mail is sent exactly once
+        self.assertEqual(sorted(f"user{i}@email.com" for i in range(10)), sorted(recipients))
+
+    async def test_expired_lease(self):
+        user, _ = await self._create_test_user(username="user", email="user@email.com")
+        # simulates a mail claimed by a mailer which died while sending it
+        await self.db_pool.execute(
+            "insert into pending_registration (user_id, mail_next_attempt) values ($1, now() + interval '1 second')",
+            user.id,
+        )
+        await asyncio.sleep(0.5)
+        self.assertTrue(self.smtp_handler.mail_queue.empty())
+
+        await asyncio.sleep(1)
+        mail: smtp.Envelope = self.smtp_handler.mail_queue.get_nowait()
+        self.assertIn("user@email.com", mail.rcpt_tos)
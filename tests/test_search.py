@@ -0,0 +1,109 @@
+# pylint: disable=attribute-defined-outside-init,missing-kwoa
+from datetime import date
+
+from abrechnung.application.accounts import AccountService
+from abrechnung.application.groups import GroupService
+from abrechnung.application.search import SearchService
+from abrechnung.application.transactions import TransactionService
+from abrechnung.domain.accounts import AccountType, NewAccount
+from abrechnung.domain.search import SearchHitType
+from abrechnung.domain.transactions import (
+    NewTransaction,
+    NewTransactionPosition,
+    TransactionType,
+    UpdateTransaction,
+)
+
+from .common import BaseTestCase
+
+
+class SearchServiceTest(BaseTestCase):
+    async def asyncSetUp(self) -> None:
+        await super().asyncSetUp()
+        self.group_service = GroupService(self.db_pool, config=self.test_config)
+        self.account_service = AccountService(self.db_pool, config=self.test_config)
+        self.transaction_service = TransactionService(self.db_pool, config=self.test_config)
+        self.search_service = SearchService(self.db_pool, config=self.test_config)
+
+        self.user, _ = await self._create_test_user("test", "test@test.test")
+        self.group_id = await self.group_service.create_group(
+            user=self.user,
+            name="test group",
+            description="",
+            currency_symbol="€",
+            terms="",
+            add_user_account_on_join=False,
+        )
+
+    async def _search(self, query: str) -> list[tuple[SearchHitType, int]]:
+        hits = await self.search_service.search(user=self.user, group_id=self.group_id, query=query, limit=50)
+        return [(hit.type, hit.id) for hit in hits]
+
+    async def test_search(self):
+        account_id = await self.account_service.create_account(
+            user=self.user,
+            group_id=self.group_id,
+            account=NewAccount(type=AccountType.personal, name="Alice", description="shares the flat"),
+        )
+        transaction = NewTransaction(
+            type=TransactionType.purchase,
+            name="Rent March",
+            description="paid by alice",
+            value=500,
+            currency_symbol="€",
+            currency_conversion_rate=1.0,
+            billed_at=date.today(),
+            tags=["flat"],
+            creditor_shares={account_id: 1.0},
+            debitor_shares={account_id: 1.0},
+        )
+        rent_id = await self.transaction_service.create_transaction(
+            user=self.user, group_id=self.group_id, transaction=transaction
+        )
+        dinner_id = await self.transaction_service.create_transaction(
+            user=self.user,
+            group_id=self.group_id,
+            transaction=transaction.model_copy(
+                update={
+                    "name": "Dinner",
+                    "description": "",
+                    "tags": [],
+                    "new_positions": [
+                        NewTransactionPosition(name="Pizza Margherita", price=10, communist_shares=1, usages={})
+                    ],
+                }
+            ),
+        )
+
+        self.assertEqual([(SearchHitType.transaction, rent_id)], await self._search("rent march"))
+        self.assertEqual([(SearchHitType.transaction, rent_id)], await self._search("RENT mar"))
+        self.assertEqual([(SearchHitType.transaction, dinner_id)], await self._search("pizza"))
+        self.assertEqual([], await self._search("rent pizza"))
+        self.assertEqual([], await self._search("  "))
+        # name and tag matches rank higher than matches in descriptions
+        self.assertEqual(
+            [(SearchHitType.account, account_id), (SearchHitType.transaction, rent_id)], await self._search("alice")
+        )
+        self.assertEqual(
+            [(SearchHitType.transaction, rent_id), (SearchHitType.account, account_id)], await self._search("flat")
+        )
+
+        # search documents follow committed changes
+        await self.transaction_service.update_transaction(
+            user=self.user,
+            transaction_id=rent_id,
+            transaction=UpdateTransaction(**transaction.model_dump(exclude={"name"}), name="Rent April"),
+        )
+        self.assertEqual([], await self._search("march"))
+        self.assertEqual([(SearchHitType.transaction, rent_id)], await self._search("april"))
+
+        await self.account_service.update_account(
+            user=self.user,
+            account_id=account_id,
+            account=NewAccount(type=AccountType.personal, name="Bob", description=""),
+        )
+        self.assertEqual([(SearchHitType.account, account_id)], await self._search("bob"))
+        self.assertEqual([(SearchHitType.transaction, rent_id)], await self._search("alice"))
+
+        await self.transaction_service.delete_transaction(user=self.user, transaction_id=dinner_id)
+        self.assertEqual([], await self._search("pizza"))
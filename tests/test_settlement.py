@@ -0,0 +1,83 @@
+import random
+from unittest import TestCase
+
+from abrechnung.application.settlement import (
+    MAX_MIN_TRANSFERS_ACCOUNTS,
+    compute_settlement,
+)
+from abrechnung.core.errors import InvalidCommand
+from abrechnung.domain.balances import SettlementMode, SettlementPlan
+
+
+def _apply(balances: dict[int, float], plan: SettlementPlan) -> dict[int, float]:
+    result = dict(balances)
+    for transfer in plan:
+        result[transfer.creditor_id] += transfer.payment_amount
+        result[transfer.debitor_id] -= transfer.payment_amount
+    return result
+
+
+def _random_balances(rng: random.Random, n_accounts: int) -> dict[int, float]:
+    cents = [rng.randint(-10000, 10000) for _ in range(n_accounts - 1)]
+    cents.append(-sum(cents))
+    return {account_id: amount / 100 for account_id, amount in enumerate(cents)}
+
+
+class SettlementTest(TestCase):
+    def test_simple_settlement(self):
+        plan = compute_settlement({1: 30, 2: -10, 3: -20, 4: 0})
+        self.assertEqual(2, len(plan))
+        self.assertEqual({(2, 1, 10), (3, 1, 20)}, {(t.creditor_id, t.debitor_id, t.payment_amount) for t in plan})
+
+    def test_one_to_one_cancellation(self):
+        balances = {1: 50, 2: 40, 3: 10, 4: -50, 5: -30, 6: -20}
+        plan = compute_settlement(balances)
+        self.assertIn((4, 1, 50), {(t.creditor_id, t.debitor_id, t.payment_amount) for t in plan})
+        # the remaining 10 of account 2 is matched with account 3 directly after paying account 5
+        self.assertEqual(4, len(plan))
+        for balance in _apply(balances, plan).values():
+            self.assertAlmostEqual(0, balance)
+
+    def test_greedy_settles_all_balances(self):
+        rng = random.Random(42)
+        for n_accounts in [2, 5, 50, 500]:
+            balances = _random_balances(rng, n_accounts)
+            plan = compute_settlement(balances)
+            self.assertLessEqual(len(plan), n_accounts - 1)
+            for transfer in plan:
+                self.assertGreater(transfer.payment_amount, 0)
+            for balance in _apply(balances, plan).values():
+                self.assertAlmostEqual(0, balance)
+
+    def test_min_transfers(self):
+        # two independent zero-sum groups, settled with 1 + 2 transfers
+        balances = {1: 70, 2: -70, 3: 25, 4: -15, 5: -10}
+        plan = compute_settlement(balances, mode=SettlementMode.min_transfers)
+        self.assertEqual(3, len(plan))
+        for balance in _apply(balances, plan).values():
+            self.assertAlmostEqual(0, balance)
+
+        # the greedy solver matches 90 with 80 first and ends up with one transfer more than necessary
+        balances = {1: 90, 2: -70, 3: 40, 4: -20, 5: 40, 6: -80}
+        self.assertEqual(5, len(compute_settlement(balances)))
+        plan = compute_settlement(balances, mode=SettlementMode.min_transfers)
+        self.assertEqual(4, len(plan))
+        for balance in _apply(balances, plan).values():
+            self.assertAlmostEqual(0, balance)
+
+    def test_min_transfers_is_never_worse(self):
+        rng = random.Random(1)
+        for _ in range(20):
+            balances = _random_balances(rng, rng.randint(2, 8))
+            balances[100] = 12.34
+            balances[101] = -12.34
+            greedy = compute_settlement(balances)
+            minimal = compute_settlement(balances, mode=SettlementMode.min_transfers)
+            self.assertLessEqual(len(minimal), len(greedy))
+            for balance in _apply(balances, minimal).values():
+                self.assertAlmostEqual(0, balance)
+
+    def test_min_transfers_too_many_accounts(self):
+        balances = _random_balances(random.Random(0), MAX_MIN_TRANSFERS_ACCOUNTS + 2)
+        with self.assertRaises(InvalidCommand):
+            compute_settlement(balances, mode=SettlementMode.min_transfers)
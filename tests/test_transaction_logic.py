@@ -176,13 +176,23 @@ class TransactionLogicTest(BaseTestCase):
 
         file_id = transaction.files[0].id
         blob_id = transaction.files[0].blob_id
-        mime_type, retrieved_file = await self.transaction_service.read_file_contents(
-            user=self.user,
-            file_id=file_id,
-            blob_id=blob_id,
+        mime_type, size = await self.transaction_service.get_file_metadata(
+            user=self.user, file_id=file_id, blob_id=blob_id
         )
         self.assertEqual("image/jpeg", mime_type)
-        self.assertEqual(file_size, len(retrieved_file))
+        self.assertEqual(file_size, size)
+        retrieved_file = b"".join(
+            [chunk async for chunk in self.transaction_service.read_file_chunks(blob_id=blob_id, start=0, end=size - 1)]
+        )
+        self.assertEqual(image_content, retrieved_file)
+        chunks = [
+            chunk
+            async for chunk in self.transaction_service.read_file_chunks(
+                blob_id=blob_id, start=100, end=size - 1, chunk_size=1000
+            )
+        ]
+        self.assertTrue(all(len(chunk) <= 1000 for chunk in chunks))
+        self.assertEqual(image_content[100:], b"".join(chunks))
 
         await self.transaction_service.update_transaction(
             user=self.user,
@@ -1,16 +1,26 @@
 # pylint: disable=missing-kwoa
 
+import base64
+import csv
+import io
+import json
 from datetime import date, datetime
 
 from abrechnung.application.accounts import AccountService
 from abrechnung.application.groups import GroupService
-from abrechnung.application.transactions import TransactionService
+from abrechnung.application.transactions import (
+    TransactionService,
+    make_transaction_cursor,
+)
+from abrechnung.core.errors import InvalidCommand, NotFoundError
 from abrechnung.domain.accounts import AccountType, NewAccount
 from abrechnung.domain.transactions import (
     NewTransaction,
     NewTransactionPosition,
     Transaction,
+    TransactionFilter,
     TransactionPosition,
+    TransactionSortOrder,
     TransactionType,
     UpdateTransaction,
 )
@@ -210,6 +220,110 @@ class TransactionAPITest(BaseTestCase):
             t.currency_conversion_rate,
         )
 
+    async def test_list_transactions_paginated(self):
+        group_id = await self._create_group()
+        account1_id = await self._create_account(group_id=group_id, name="account1")
+        account2_id = await self._create_account(group_id=group_id, name="account2")
+        transaction_ids = []
+        for i in range(7):
+            transaction_ids.append(
+                await self.transaction_service.create_transaction(
+                    user=self.test_user,
+                    group_id=group_id,
+                    transaction=NewTransaction(
+                        type=TransactionType.purchase if i % 2 == 0 else TransactionType.transfer,
+                        name=f"transaction {i}",
+                        description="100% pizza" if i == 3 else "",
+                        currency_symbol="€",
+                        billed_at=date(2024, 1, 1 + i // 2),
+                        currency_conversion_rate=1.0,
+                        tags=["even"] if i % 2 == 0 else [],
+                        value=10.0 * i,
+                        debitor_shares={account1_id: 1.0},
+                        creditor_shares={account2_id: 1.0},
+                        new_positions=(
+                            [NewTransactionPosition(name="item", price=1, communist_shares=0, usages={account2_id: 1})]
+                            if i == 4
+                            else []
+                        ),
+                    ),
+                )
+            )
+
+        for sort in [
+            TransactionSortOrder.billed_at_desc,
+            TransactionSortOrder.last_changed_asc,
+            TransactionSortOrder.last_changed_desc,
+            TransactionSortOrder.name_asc,
+            TransactionSortOrder.value_desc,
+        ]:
+            listed, cursor = [], None
+            while True:
+                page = await self.transaction_service.list_transactions(
+                    user=self.test_user, group_id=group_id, sort=sort, limit=3, cursor=cursor
+                )
+                json_page, next_cursor = await self.transaction_service.list_transactions_json(
+                    user=self.test_user, group_id=group_id, sort=sort, limit=3, cursor=cursor
+                )
+                self.assertEqual([t.id for t in page], [t["id"] for t in json.loads(json_page)])
+                listed.extend(page)
+                if next_cursor is None:
+                    break
+
+                cursor = make_transaction_cursor(page[-1], sort)
+                # the cursor returned by the server must not depend on the database's text representation of values
+                self.assertEqual(cursor, next_cursor)
+                self.assertEqual(
+                    await self.transaction_service.list_transactions(
+                        user=self.test_user, group_id=group_id, sort=sort, limit=3, cursor=next_cursor
+                    ),
+                    await self.transaction_service.list_transactions(
+                        user=self.test_user, group_id=group_id, sort=sort, limit=3, cursor=cursor
+                    ),
+                )
+
+            all_transactions = await self.transaction_service.list_transactions(
+                user=self.test_user, group_id=group_id, sort=sort
+            )
+            self.assertEqual([t.id for t in all_transactions], [t.id for t in listed])
+            self.assertEqual(sorted(transaction_ids), sorted(t.id for t in listed))
+
+        by_billed_at = await self.transaction_service.list_transactions(
+            user=self.test_user, group_id=group_id, sort=TransactionSortOrder.billed_at_asc
+        )
+        self.assertEqual(sorted((t.billed_at, t.id) for t in by_billed_at), [(t.billed_at, t.id) for t in by_billed_at])
+
+        async def _list_filtered(**kwargs) -> list[int]:
+            transactions = await self.transaction_service.list_transactions(
+                user=self.test_user, group_id=group_id, filters=TransactionFilter(**kwargs)
+            )
+            return sorted(t.id for t in transactions)
+
+        self.assertEqual(transaction_ids[0::2], await _list_filtered(tags=["even"]))
+        self.assertEqual(transaction_ids[1::2], await _list_filtered(type=TransactionType.transfer))
+        self.assertEqual(
+            transaction_ids[2:4], await _list_filtered(billed_from=date(2024, 1, 2), billed_to=date(2024, 1, 2))
+        )
+        self.assertEqual([transaction_ids[3]], await _list_filtered(search="0% PIZ"))
+        self.assertEqual([], await _list_filtered(search="_"))
+        self.assertEqual(transaction_ids, await _list_filtered(account_id=account1_id))
+        self.assertEqual([transaction_ids[4]], await _list_filtered(account_id=account2_id, tags=["even"], search="4"))
+
+        def _cursor(sort: TransactionSortOrder, sort_value: str) -> str:
+            return base64.urlsafe_b64encode(json.dumps([sort.value, sort_value, 1]).encode()).decode()
+
+        invalid_cursors = [
+            (TransactionSortOrder.name_asc, "foobar"),
+            (TransactionSortOrder.billed_at_asc, _cursor(TransactionSortOrder.billed_at_asc, "abc")),
+            (TransactionSortOrder.value_desc, _cursor(TransactionSortOrder.value_desc, "1.5.0")),
+            (TransactionSortOrder.last_changed_desc, _cursor(TransactionSortOrder.last_changed_desc, "yesterday")),
+        ]
+        for sort, cursor in invalid_cursors:
+            with self.assertRaises(InvalidCommand):
+                await self.transaction_service.list_transactions(
+                    user=self.test_user, group_id=group_id, sort=sort, limit=3, cursor=cursor
+                )
+
     async def test_account_deletion(self):
         group_id = await self._create_group()
         account1_id = await self.account_service.create_account(
@@ -300,6 +414,55 @@ class TransactionAPITest(BaseTestCase):
         # we should not be able to delete this account as changes depend on it
         await self.account_service.delete_account(user=self.test_user, account_id=account2_id)
 
+    async def test_account_references(self):
+        group_id = await self._create_group()
+        creditor_id = await self._create_account(group_id, "creditor")
+        item_user_id = await self._create_account(group_id, "item user")
+        clearing_member_id = await self._create_account(group_id, "clearing member")
+        clearing_id = await self.account_service.create_account(
+            user=self.test_user,
+            group_id=group_id,
+            account=NewAccount(
+                type=AccountType.clearing,
+                name="clearing",
+                date_info=date.today(),
+                clearing_shares={clearing_member_id: 1.0},
+            ),
+        )
+        transaction_id = await self.transaction_service.create_transaction(
+            user=self.test_user,
+            group_id=group_id,
+            transaction=NewTransaction(
+                type=TransactionType.purchase,
+                name="purchase",
+                description="",
+                currency_symbol="€",
+                billed_at=date.today(),
+                currency_conversion_rate=1.0,
+                value=10.0,
+                creditor_shares={creditor_id: 1.0},
+                debitor_shares={creditor_id: 1.0},
+                new_positions=[
+                    NewTransactionPosition(name="item", price=5, communist_shares=0, usages={item_user_id: 1.0})
+                ],
+            ),
+        )
+
+        with self.assertRaisesRegex(InvalidCommand, "by a transaction"):
+            await self.account_service.delete_account(user=self.test_user, account_id=item_user_id)
+        with self.assertRaisesRegex(InvalidCommand, "by a clearing account"):
+            await self.account_service.delete_account(user=self.test_user, account_id=clearing_member_id)
+
+        # deleting the referencing transaction and clearing account frees the referenced accounts
+        await self.transaction_service.delete_transaction(user=self.test_user, transaction_id=transaction_id)
+        await self.account_service.delete_account(user=self.test_user, account_id=clearing_id)
+        await self.account_service.delete_account(user=self.test_user, account_id=item_user_id)
+        await self.account_service.delete_account(user=self.test_user, account_id=clearing_member_id)
+        await self.account_service.delete_account(user=self.test_user, account_id=creditor_id)
+
+        with self.assertRaisesRegex(InvalidCommand, "already deleted"):
+            await self.account_service.delete_account(user=self.test_user, account_id=creditor_id)
+
     async def test_purchase_items(self):
         group_id = await self._create_group()
         account1_id = await self.account_service.create_account(
@@ -379,3 +542,436 @@ class TransactionAPITest(BaseTestCase):
         self.assertIsNotNone(t.positions)
         self.assertEqual(1, len(t.positions))
         self.assertIn(account2_id, t.positions[0].usages)
+
+    async def test_materialized_transaction_state(self):
+        group_id = await self._create_group()
+        account1_id = await self._create_account(group_id=group_id, name="account1")
+        account2_id = await self._create_account(group_id=group_id, name="account2")
+        transaction_id = await self.transaction_service.create_transaction(
+            user=self.test_user,
+            group_id=group_id,
+            transaction=NewTransaction(
+                type=TransactionType.purchase,
+                name="name123",
+                description="description123",
+                currency_symbol="€",
+                billed_at=date.today(),
+                currency_conversion_rate=1.0,
+                tags=["foo"],
+                value=100,
+                debitor_shares={account1_id: 1.0},
+                creditor_shares={account2_id: 1.0},
+                new_positions=[NewTransactionPosition(name="carrots", price=10, communist_shares=1, usages={})],
+            ),
+        )
+
+        async def _assert_state_matches_history():
+            async with self.db_pool.acquire() as conn:
+                async with conn.transaction():
+                    # valid_at < now() forces the computation from the transaction history
+                    from_history = await conn.fetch_one(
+                        Transaction,
+                        "select * from full_transaction_state_valid_at(now() - interval '1 microsecond') "
+                        "where id = $1",
+                        transaction_id,
+                    )
+            current = await self._fetch_transaction(transaction_id)
+            self.assertEqual(from_history, current)
+
+        await _assert_state_matches_history()
+
+        t = await self._fetch_transaction(transaction_id)
+        await self.transaction_service.update_transaction_positions(
+            user=self.test_user,
+            transaction_id=transaction_id,
+            positions=[
+                TransactionPosition(
+                    id=t.positions[0].id,
+                    name="potatoes",
+                    price=20,
+                    communist_shares=0,
+                    usages={account1_id: 2.0},
+                    deleted=False,
+                )
+            ],
+        )
+        t = await self._fetch_transaction(transaction_id)
+        self.assertEqual("potatoes", t.positions[0].name)
+        self.assertEqual({account1_id: 2.0}, t.positions[0].usages)
+        await _assert_state_matches_history()
+
+        await self.transaction_service.delete_transaction(user=self.test_user, transaction_id=transaction_id)
+        t = await self._fetch_transaction(transaction_id)
+        self.assertTrue(t.deleted)
+        await _assert_state_matches_history()
+
+    async def test_scoped_state_functions(self):
+        group_id = await self._create_group()
+        other_group_id = await self._create_group()
+        account1_id = await self._create_account(group_id=group_id, name="account1")
+        account2_id = await self._create_account(group_id=group_id, name="account2")
+        other_account_id = await self._create_account(group_id=other_group_id, name="other")
+        await self.account_service.create_account(
+            user=self.test_user,
+            group_id=group_id,
+            account=NewAccount(
+                type=AccountType.clearing,
+                name="clearing",
+                date_info=date.today(),
+                tags=["tag"],
+                clearing_shares={account1_id: 1.0, account2_id: 2.0},
+            ),
+        )
+        transaction = NewTransaction(
+            type=TransactionType.purchase,
+            name="name123",
+            description="description123",
+            currency_symbol="€",
+            billed_at=date.today(),
+            currency_conversion_rate=1.0,
+            tags=["foo"],
+            value=100,
+            debitor_shares={account1_id: 1.0},
+            creditor_shares={account2_id: 1.0},
+            new_positions=[NewTransactionPosition(name="carrots", price=10, communist_shares=1, usages={})],
+        )
+        transaction_id = await self.transaction_service.create_transaction(
+            user=self.test_user, group_id=group_id, transaction=transaction
+        )
+        await self.transaction_service.create_transaction(
+            user=self.test_user,
+            group_id=other_group_id,
+            transaction=transaction.model_copy(
+                update={"debitor_shares": {other_account_id: 1.0}, "creditor_shares": {other_account_id: 1.0}}
+            ),
+        )
+        async with self.db_pool.acquire() as conn:
+            before_update = await conn.fetchval("select now()")
+        await self.account_service.update_account(
+            user=self.test_user, account_id=account1_id, account=NewAccount(type=AccountType.personal, name="renamed")
+        )
+        await self.transaction_service.delete_transaction(user=self.test_user, transaction_id=transaction_id)
+
+        async with self.db_pool.acquire() as conn:
+            for valid_at in [before_update, None]:
+                async with conn.transaction():
+                    valid_at = valid_at or await conn.fetchval("select now()")
+                    expected = await conn.fetch_many(
+                        Transaction,
+                        "select * from full_transaction_state_valid_at($2) where group_id = $1 order by id",
+                        group_id,
+                        valid_at,
+                    )
+                    actual = await conn.fetch_many(
+                        Transaction,
+                        "select * from full_transaction_state_valid_at_for_group($1, $2) order by id",
+                        group_id,
+                        valid_at,
+                    )
+                    self.assertEqual(1, len(actual))
+                    self.assertEqual(expected, actual)
+                    self.assertEqual(valid_at != before_update, actual[0].deleted)
+
+                    expected = await conn.fetch(
+                        "select * from full_account_state_valid_at($2) where group_id = $1 order by id",
+                        group_id,
+                        valid_at,
+                    )
+                    actual = await conn.fetch(
+                        "select * from full_account_state_valid_at_for_group($1, $2) order by id", group_id, valid_at
+                    )
+                    self.assertEqual(3, len(actual))
+                    self.assertEqual([dict(row) for row in expected], [dict(row) for row in actual])
+
+    async def test_many_shares_and_tags(self):
+        group_id = await self._create_group()
+        account_ids = [await self._create_account(group_id=group_id, name=f"account{i}") for i in range(5)]
+        transaction_id = await self.transaction_service.create_transaction(
+            user=self.test_user,
+            group_id=group_id,
+            transaction=NewTransaction(
+                type=TransactionType.purchase,
+                name="name123",
+                description="description123",
+                currency_symbol="€",
+                billed_at=date.today(),
+                currency_conversion_rate=1.0,
+                tags=["foo", "bar", "foo"],
+                value=100,
+                debitor_shares={account_id: float(i + 1) for i, account_id in enumerate(account_ids)},
+                creditor_shares={account_ids[0]: 1.0},
+                new_positions=[
+                    NewTransactionPosition(
+                        name="carrots",
+                        price=10,
+                        communist_shares=0,
+                        usages={account_id: 1.0 for account_id in account_ids},
+                    )
+                ],
+            ),
+        )
+        t = await self._fetch_transaction(transaction_id)
+        self.assertEqual({account_id: float(i + 1) for i, account_id in enumerate(account_ids)}, t.debitor_shares)
+        self.assertEqual({account_ids[0]: 1.0}, t.creditor_shares)
+        self.assertEqual({account_id: 1.0 for account_id in account_ids}, t.positions[0].usages)
+        self.assertEqual({"foo", "bar"}, set(t.tags))
+
+    async def test_create_transactions_bulk(self):
+        group_id = await self._create_group()
+        account1_id = await self._create_account(group_id=group_id, name="account1")
+        account2_id = await self._create_account(group_id=group_id, name="account2")
+        transactions = [
+            NewTransaction(
+                type=TransactionType.purchase,
+                name=f"purchase{i}",
+                description="",
+                currency_symbol="€",
+                billed_at=date.today(),
+                currency_conversion_rate=1.0,
+                tags=["imported", f"tag{i % 2}"],
+                value=10.0 + i,
+                debitor_shares={account1_id: 1.0, account2_id: 1.0},
+                creditor_shares={account1_id: 1.0},
+                new_positions=[
+                    NewTransactionPosition(name="carrots", price=2, communist_shares=0, usages={account2_id: 1.0})
+                ],
+            )
+            for i in range(10)
+        ]
+        transactions.append(
+            NewTransaction(
+                type=TransactionType.transfer,
+                name="transfer",
+                description="",
+                currency_symbol="€",
+                billed_at=date.today(),
+                currency_conversion_rate=1.0,
+                value=5.0,
+                debitor_shares={account1_id: 1.0},
+                creditor_shares={account2_id: 1.0},
+            )
+        )
+
+        transaction_ids = await self.transaction_service.create_transactions_bulk(
+            user=self.test_user, group_id=group_id, transactions=transactions
+        )
+        self.assertEqual(len(transactions), len(transaction_ids))
+        for transaction_id, transaction in zip(transaction_ids, transactions):
+            t = await self._fetch_transaction(transaction_id)
+            self.assertEqual(transaction.name, t.name)
+            self.assertEqual(transaction.value, t.value)
+            self.assertEqual(set(transaction.tags), set(t.tags))
+            self.assertEqual(transaction.debitor_shares, t.debitor_shares)
+            self.assertEqual(transaction.creditor_shares, t.creditor_shares)
+            self.assertEqual(len(transaction.new_positions), len(t.positions))
+            if transaction.new_positions:
+                self.assertEqual(transaction.new_positions[0].usages, t.positions[0].usages)
+
+        # a single invalid transaction aborts the whole batch
+        transactions[0].creditor_shares = {account1_id: 1.0, account2_id: 1.0}
+        with self.assertRaises(Exception):
+            await self.transaction_service.create_transactions_bulk(
+                user=self.test_user, group_id=group_id, transactions=transactions
+            )
+        all_transactions = await self.transaction_service.list_transactions(user=self.test_user, group_id=group_id)
+        self.assertEqual(len(transaction_ids), len(all_transactions))
+
+    async def test_transaction_notifications_are_deduplicated(self):
+        group_id = await self._create_group()
+        account_ids = [await self._create_account(group_id=group_id, name=f"account{i}") for i in range(10)]
+
+        notifications = []
+        async with self.db_pool.acquire() as conn:
+            channel_id = await conn.fetchval("select channel_id from forwarder_boot('test-forwarder')")
+            connection_id = await conn.fetchval("select connection_id from client_connected($1)", channel_id)
+            await conn.execute("call subscribe($1, $2, 'transaction', $3)", connection_id, self.test_user.id, group_id)
+
+            def _on_notification(*args):
+                notifications.append(args[3])
+
+            await conn.add_listener(f"channel{channel_id}", _on_notification)
+
+            transaction_id = await self.transaction_service.create_transaction(
+                user=self.test_user,
+                group_id=group_id,
+                transaction=NewTransaction(
+                    type=TransactionType.purchase,
+                    name="name123",
+                    description="description123",
+                    currency_symbol="€",
+                    billed_at=date.today(),
+                    currency_conversion_rate=1.0,
+                    tags=["foo", "bar"],
+                    value=100,
+                    debitor_shares={account_id: 1.0 for account_id in account_ids},
+                    creditor_shares={account_ids[0]: 1.0},
+                    new_positions=[
+                        NewTransactionPosition(
+                            name="carrots", price=10, communist_shares=0, usages={a: 1.0 for a in account_ids}
+                        )
+                        for _ in range(5)
+                    ],
+                ),
+            )
+            # notifications are delivered asynchronously, give them some time to arrive
+            await conn.execute("select pg_sleep(0.1)")
+            await conn.remove_listener(f"channel{channel_id}", _on_notification)
+
+        self.assertEqual(1, len(notifications))
+        self.assertEqual(transaction_id, json.loads(notifications[0])["data"]["transaction_id"])
+
+    async def test_valid_at(self):
+        group_id = await self._create_group()
+        account_id = await self._create_account(group_id=group_id, name="account1")
+        before_creation = await self.db_pool.fetchval("select now()")
+        transaction = NewTransaction(
+            type=TransactionType.transfer,
+            name="before",
+            description="",
+            value=10.0,
+            currency_symbol="€",
+            currency_conversion_rate=1.0,
+            billed_at=date.today(),
+            creditor_shares={account_id: 1.0},
+            debitor_shares={account_id: 1.0},
+        )
+        transaction_id = await self.transaction_service.create_transaction(
+            user=self.test_user, group_id=group_id, transaction=transaction
+        )
+        after_creation = await self.db_pool.fetchval("select now()")
+        await self.transaction_service.update_transaction(
+            user=self.test_user,
+            transaction_id=transaction_id,
+            transaction=UpdateTransaction(**transaction.model_dump(exclude={"name"}), name="after"),
+        )
+        await self.account_service.update_account(
+            user=self.test_user,
+            account_id=account_id,
+            account=NewAccount(type=AccountType.personal, name="renamed"),
+        )
+
+        transaction_at = await self.transaction_service.get_transaction(
+            user=self.test_user, transaction_id=transaction_id, valid_at=after_creation
+        )
+        self.assertEqual("before", transaction_at.name)
+        self.assertEqual("after", (await self._fetch_transaction(transaction_id)).name)
+        with self.assertRaises(NotFoundError):
+            await self.transaction_service.get_transaction(
+                user=self.test_user, transaction_id=transaction_id, valid_at=before_creation
+            )
+
+        transactions = await self.transaction_service.list_transactions(
+            user=self.test_user, group_id=group_id, valid_at=after_creation
+        )
+        self.assertEqual(["before"], [t.name for t in transactions])
+        content, _ = await self.transaction_service.list_transactions_json(
+            user=self.test_user, group_id=group_id, valid_at=after_creation
+        )
+        self.assertEqual(["before"], [t["name"] for t in json.loads(content)])
+        self.assertEqual(
+            [],
+            await self.transaction_service.list_transactions(
+                user=self.test_user, group_id=group_id, valid_at=before_creation
+            ),
+        )
+
+        account_at = await self.account_service.get_account(
+            user=self.test_user, account_id=account_id, valid_at=after_creation
+        )
+        self.assertEqual("account1", account_at.name)
+        accounts = await self.account_service.list_accounts(
+            user=self.test_user, group_id=group_id, valid_at=after_creation
+        )
+        self.assertEqual(["account1"], [a.name for a in accounts])
+        content = await self.account_service.list_accounts_json(user=self.test_user, group_id=group_id)
+        self.assertEqual(["renamed"], [a["name"] for a in json.loads(content)])
+
+    async def test_export_transactions_csv(self):
+        group_id = await self._create_group()
+        account1_id = await self._create_account(group_id, "account1")
+        account2_id = await self._create_account(group_id, "account2")
+        base_transaction = NewTransaction(
+            type=TransactionType.purchase,
+            name="purchase",
+            description="description",
+            value=100,
+            currency_symbol="€",
+            currency_conversion_rate=1.0,
+            billed_at=date(2024, 1, 2),
+            tags=["food"],
+            creditor_shares={account1_id: 1.0},
+            debitor_shares={account1_id: 1.0, account2_id: 1.0},
+            new_positions=[
+                NewTransactionPosition(name="item, large", price=20, communist_shares=0, usages={account2_id: 1.0}),
+            ],
+        )
+        transaction1_id = await self.transaction_service.create_transaction(
+            user=self.test_user, group_id=group_id, transaction=base_transaction
+        )
+        transaction2_id = await self.transaction_service.create_transaction(
+            user=self.test_user,
+            group_id=group_id,
+            transaction=base_transaction.model_copy(
+                update={"billed_at": date(2024, 1, 1), "tags": [], "new_positions": [], "value": 10}
+            ),
+        )
+        deleted_id = await self.transaction_service.create_transaction(
+            user=self.test_user, group_id=group_id, transaction=base_transaction
+        )
+        await self.transaction_service.delete_transaction(user=self.test_user, transaction_id=deleted_id)
+
+        export = await self.transaction_service.prepare_transaction_export(user=self.test_user, group_id=group_id)
+        content = b"".join([chunk async for chunk in self.transaction_service.export_transactions_csv(export=export)])
+        rows = list(csv.reader(io.StringIO(content.decode("utf-8"))))
+        self.assertEqual(
+            [
+                "ID",
+                "Date",
+                "Payer",
+                "Name",
+                "Description",
+                "Currency",
+                "Currency Conversion Rate",
+                "Tags",
+                "Value",
+                "Positions",
+                "account1",
+                "account2",
+            ],
+            rows[0],
+        )
+        self.assertEqual(3, len(rows))
+        self.assertEqual([str(transaction2_id), "2024-01-01", "account1"], rows[1][:3])
+        self.assertEqual(["5.00", "-5.00"], rows[1][10:])
+        self.assertEqual(
+            [
+                str(transaction1_id),
+                "2024-01-02",
+                "account1",
+                "purchase",
+                "description",
+                "€",
+                "1.0",
+                "food",
+                "100.00",
+                "item, large: 20.00",
+                "60.00",
+                "-60.00",
+            ],
+            rows[2],
+        )
+
+        # batches are continued after the last exported transaction
+        for batch_size in [1, 2]:
+            batched = b"".join(
+                [
+                    chunk
+                    async for chunk in self.transaction_service.export_transactions_csv(
+                        export=export, batch_size=batch_size
+                    )
+                ]
+            )
+            self.assertEqual(content, batched)
+
+        with self.assertRaises(NotFoundError):
+            await self.transaction_service.prepare_transaction_export(user=self.test_user, group_id=group_id + 1)
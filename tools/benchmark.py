@@ -0,0 +1,388 @@
+#!/usr/bin/env python3
+# pylint: disable=missing-kwoa
+"""
+Benchmark of the transaction and account read and write paths against a local database.
+
+Seeds a fresh group of configurable size, times the service operations and reports latency percentiles as well as
+the number of database queries per operation. Results can be stored as a baseline and later runs compared against it.
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import sys
+import time
+import uuid
+from dataclasses import dataclass, field
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Optional
+
+import asyncpg
+
+from abrechnung.application.accounts import AccountService
+from abrechnung.application.groups import GroupService
+from abrechnung.application.transactions import TransactionService
+from abrechnung.application.users import UserService
+from abrechnung.config import Config, read_config
+from abrechnung.domain.accounts import AccountType, NewAccount
+from abrechnung.domain.transactions import (
+    NewTransaction,
+    NewTransactionPosition,
+    TransactionType,
+    UpdateTransaction,
+)
+from abrechnung.domain.users import User
+from abrechnung.framework.database import create_db_pool
+
+N_DB_CONNECTIONS = 4
+
+
+@dataclass
+class OperationStats:
+    durations: list[float] = field(default_factory=list)
+    queries: list[int] = field(default_factory=list)
+
+    def summary(self) -> dict[str, float]:
+        durations = sorted(self.durations)
+
+        def percentile(p: float) -> float:
+            # nearest rank percentile in milliseconds
+            index = max(0, min(len(durations) - 1, round(p / 100 * len(durations)) - 1))
+            return durations[index] * 1000
+
+        return {
+            "n": len(durations),
+            "p50_ms": percentile(50),
+            "p95_ms": percentile(95),
+            "p99_ms": percentile(99),
+            "queries": statistics.mean(self.queries) if self.queries else 0,
+        }
+
+
+class Benchmark:
+    def __init__(self, config: Config, args: argparse.Namespace):
+        self.config = config
+        self.args = args
+        self.random = random.Random(args.seed)
+        self.stats: dict[str, OperationStats] = {}
+        self.n_queries = 0
+
+        self.db_pool: asyncpg.Pool
+        self.user_service: UserService
+        self.group_service: GroupService
+        self.account_service: AccountService
+        self.transaction_service: TransactionService
+
+    def _on_query(self, record):
+        del record  # unused
+        self.n_queries += 1
+
+    async def setup(self):
+        self.db_pool = await create_db_pool(self.config.database, n_connections=N_DB_CONNECTIONS)
+        # count the queries of all connections in the pool
+        connections = [await self.db_pool.acquire() for _ in range(N_DB_CONNECTIONS)]
+        for connection in connections:
+            connection.add_query_logger(self._on_query)
+            await self.db_pool.release(connection)
+
+        self.user_service = UserService(self.db_pool, self.config)
+        self.group_service = GroupService(self.db_pool, self.config)
+        self.account_service = AccountService(self.db_pool, self.config)
+        self.transaction_service = TransactionService(self.db_pool, self.config)
+
+    async def teardown(self):
+        await self.db_pool.close()
+
+    async def measure(self, operation: str, func: Callable[[], Awaitable[Any]]) -> Any:
+        queries_before = self.n_queries
+        start = time.perf_counter()
+        result = await func()
+        duration = time.perf_counter() - start
+        # query loggers are called on the next iteration of the event loop
+        await asyncio.sleep(0)
+
+        stats = self.stats.setdefault(operation, OperationStats())
+        stats.durations.append(duration)
+        stats.queries.append(self.n_queries - queries_before)
+        return result
+
+    def _random_date(self) -> date:
+        return date.today() + timedelta(days=self.random.randint(-365, 0))
+
+    def _purchase(self, account_ids: list[int], name: str) -> NewTransaction:
+        value = round(self.random.uniform(10, 200), 2)
+        debitors = self.random.sample(account_ids, k=min(len(account_ids), self.random.randint(2, 6)))
+        positions = [
+            NewTransactionPosition(
+                name=f"{name} position {i}",
+                price=round(value / (self.args.n_positions + 1), 2),
+                communist_shares=self.random.choice([0, 1]),
+                usages={
+                    account_id: float(self.random.randint(1, 3))
+                    for account_id in self.random.sample(account_ids, k=min(len(account_ids), self.args.n_usages))
+                },
+            )
+            for i in range(self.args.n_positions)
+        ]
+        return NewTransaction(
+            type=TransactionType.purchase,
+            name=name,
+            description="",
+            value=value,
+            currency_symbol="€",
+            currency_conversion_rate=1.0,
+            billed_at=self._random_date(),
+            creditor_shares={self.random.choice(account_ids): 1.0},
+            debitor_shares={account_id: 1.0 for account_id in debitors},
+            new_positions=positions,
+        )
+
+    async def _update_purchase(self, user: User, transaction_id: int):
+        transaction = await self.transaction_service.get_transaction(user=user, transaction_id=transaction_id)
+        update = UpdateTransaction(
+            **transaction.model_dump(include=set(NewTransaction.model_fields) - {"new_files", "new_positions"}),
+            changed_positions=[
+                position.model_copy(update={"price": round(position.price * 1.01, 2)}) if index == 0 else position
+                for index, position in enumerate(transaction.positions)
+            ],
+        )
+        update.value = round(transaction.value * 1.01, 2)
+        await self.measure(
+            "update_transaction",
+            lambda: self.transaction_service.update_transaction(
+                user=user, transaction_id=transaction_id, transaction=update
+            ),
+        )
+
+    async def _measure_notification_latency(self, user: User, group_id: int, account_ids: list[int]):
+        async with self.db_pool.acquire() as conn:
+            forwarder_id = f"benchmark-{uuid.uuid4()}"
+            channel_id = await conn.fetchval("select channel_id from forwarder_boot($1)", forwarder_id)
+            connection_id = await conn.fetchval("select connection_id from client_connected($1)", channel_id)
+            await conn.execute("call subscribe($1, $2, 'transaction', $3)", connection_id, user.id, group_id)
+
+            received: asyncio.Queue[float] = asyncio.Queue()
+
+            def _on_notification(*args):
+                del args  # unused
+                received.put_nowait(time.perf_counter())
+
+            await conn.add_listener(f"channel{channel_id}", _on_notification)
+            try:
+                for i in range(self.args.repetitions):
+                    start = time.perf_counter()
+                    await self.transaction_service.create_transaction(
+                        user=user, group_id=group_id, transaction=self._purchase(account_ids, f"Notified {i}")
+                    )
+                    arrival = await asyncio.wait_for(received.get(), timeout=10)
+                    # end to end latency from issuing the write until the forwarder receives the notification
+                    self.stats.setdefault("transaction_notification", OperationStats()).durations.append(
+                        arrival - start
+                    )
+            finally:
+                await conn.remove_listener(f"channel{channel_id}", _on_notification)
+                await conn.execute("select forwarder_stop($1)", forwarder_id)
+
+    async def run(self):
+        args = self.args
+        async with self.db_pool.acquire() as conn:
+            user_id = await conn.fetchval(
+                "insert into usr (username, email, hashed_password, pending) values ($1, $2, '', false) returning id",
+                f"benchmark-{uuid.uuid4()}",
+                f"benchmark-{uuid.uuid4()}@example.com",
+            )
+        user = await self.user_service.get_user(user_id=user_id)
+        group_id = await self.group_service.create_group(
+            user=user,
+            name="Benchmark",
+            description="",
+            currency_symbol="€",
+            add_user_account_on_join=False,
+            terms="",
+        )
+
+        try:
+            print(f"Seeding {args.n_accounts} accounts and {args.n_clearing_accounts} clearing accounts")
+            account_ids = []
+            for i in range(args.n_accounts):
+                account_ids.append(
+                    await self.account_service.create_account(
+                        user=user,
+                        group_id=group_id,
+                        account=NewAccount(type=AccountType.personal, name=f"Account {i}"),
+                    )
+                )
+            for i in range(args.n_clearing_accounts):
+                shares = self.random.sample(account_ids, k=min(len(account_ids), self.random.randint(2, 8)))
+                account_ids.append(
+                    await self.account_service.create_account(
+                        user=user,
+                        group_id=group_id,
+                        account=NewAccount(
+                            type=AccountType.clearing,
+                            name=f"Event {i}",
+                            date_info=self._random_date(),
+                            clearing_shares={account_id: 1.0 for account_id in shares},
+                        ),
+                    )
+                )
+
+            print(
+                f"Seeding {args.n_purchases} purchases with {args.n_positions} positions of {args.n_usages} usages "
+                f"and {args.history_depth} edits each"
+            )
+            for i in range(args.n_purchases):
+                transaction = self._purchase(account_ids, f"Purchase {i}")
+                transaction_id = await self.measure(
+                    "create_transaction",
+                    lambda: self.transaction_service.create_transaction(
+                        user=user, group_id=group_id, transaction=transaction
+                    ),
+                )
+                for _ in range(args.history_depth):
+                    await self._update_purchase(user, transaction_id)
+
+            print(f"Measuring read paths with {args.repetitions} repetitions")
+            for _ in range(args.repetitions):
+                await self.measure(
+                    "list_transactions",
+                    lambda: self.transaction_service.list_transactions(user=user, group_id=group_id),
+                )
+                await self.measure(
+                    "list_accounts", lambda: self.account_service.list_accounts(user=user, group_id=group_id)
+                )
+
+            print("Measuring account deletion")
+            for i in range(args.repetitions):
+                account_id = await self.account_service.create_account(
+                    user=user,
+                    group_id=group_id,
+                    account=NewAccount(type=AccountType.personal, name=f"Deleted {i}"),
+                )
+                await self.measure(
+                    "delete_account",
+                    lambda: self.account_service.delete_account(user=user, account_id=account_id),
+                )
+
+            print("Measuring notification latency")
+            await self._measure_notification_latency(user, group_id, account_ids[: args.n_accounts])
+        finally:
+            if not args.keep_data:
+                await self.group_service.delete_group(user=user, group_id=group_id)
+                await self.db_pool.execute("delete from usr where id = $1", user_id)
+
+    def results(self) -> dict[str, Any]:
+        parameters = {
+            key: getattr(self.args, key)
+            for key in [
+                "n_accounts",
+                "n_clearing_accounts",
+                "n_purchases",
+                "n_positions",
+                "n_usages",
+                "history_depth",
+                "repetitions",
+                "seed",
+            ]
+        }
+        return {
+            "parameters": parameters,
+            "results": {operation: stats.summary() for operation, stats in self.stats.items()},
+        }
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list[str]:
+    """returns a description of all regressions of the results compared to the baseline"""
+    if results["parameters"] != baseline["parameters"]:
+        print("Warning: the baseline was recorded with different parameters", file=sys.stderr)
+
+    regressions = []
+    for operation, current in results["results"].items():
+        previous = baseline["results"].get(operation)
+        if previous is None:
+            continue
+        for metric in ["p50_ms", "p95_ms", "queries"]:
+            if current[metric] > previous[metric] * (1 + threshold) and current[metric] - previous[metric] > 0.5:
+                regressions.append(f"{operation} {metric}: {previous[metric]:.2f} -> {current[metric]:.2f}")
+    return regressions
+
+
+def print_results(results: dict, baseline: Optional[dict]):
+    header = f"{'operation':<26} {'n':>5} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10} {'queries':>8}"
+    print(header)
+    print("-" * len(header))
+    for operation, summary in results["results"].items():
+        print(
+            f"{operation:<26} {summary['n']:>5} {summary['p50_ms']:>10.2f} {summary['p95_ms']:>10.2f} "
+            f"{summary['p99_ms']:>10.2f} {summary['queries']:>8.1f}"
+        )
+        previous = (baseline or {}).get("results", {}).get(operation)
+        if previous is not None:
+            print(
+                f"{'  baseline':<26} {previous['n']:>5} {previous['p50_ms']:>10.2f} {previous['p95_ms']:>10.2f} "
+                f"{previous['p99_ms']:>10.2f} {previous['queries']:>8.1f}"
+            )
+
+
+async def main(args: argparse.Namespace) -> int:
+    config = read_config(Path(args.config_path))
+    benchmark = Benchmark(config=config, args=args)
+    await benchmark.setup()
+    try:
+        await benchmark.run()
+    finally:
+        await benchmark.teardown()
+
+    results = benchmark.results()
+    baseline = json.loads(Path(args.baseline).read_text("utf-8")) if args.baseline else None
+    print_results(results, baseline)
+
+    if args.save_baseline:
+        Path(args.save_baseline).write_text(json.dumps(results, indent=2), "utf-8")
+        print(f"Stored results as baseline in {args.save_baseline}")
+
+    if baseline is not None:
+        regressions = compare(results, baseline, threshold=args.threshold)
+        if regressions:
+            print("Regressions compared to the baseline:")
+            for regression in regressions:
+                print(f"  {regression}")
+            return 1
+        print("No regressions compared to the baseline")
+    return 0
+
+
+def parse_args():
+    cli = argparse.ArgumentParser(description="benchmark the transaction and account read and write paths")
+
+    cli.add_argument(
+        "-c",
+        "--config-path",
+        default="/etc/abrechnung/abrechnung.yaml",
+        help="config file, default: %(default)s",
+    )
+    cli.add_argument("--n-accounts", type=int, default=20, help="number of personal accounts to seed")
+    cli.add_argument("--n-clearing-accounts", type=int, default=5, help="number of clearing accounts to seed")
+    cli.add_argument("--n-purchases", type=int, default=200, help="number of purchases to seed")
+    cli.add_argument("--n-positions", type=int, default=5, help="number of positions per purchase")
+    cli.add_argument("--n-usages", type=int, default=3, help="number of accounts using each position")
+    cli.add_argument("--history-depth", type=int, default=2, help="number of edits of each purchase")
+    cli.add_argument("--repetitions", type=int, default=20, help="number of repetitions of the measured reads")
+    cli.add_argument("--seed", type=int, default=42, help="seed of the random data generation")
+    cli.add_argument("--baseline", help="compare the results against the baseline stored in this file")
+    cli.add_argument("--save-baseline", help="store the results as baseline in this file")
+    cli.add_argument(
+        "--threshold",
+        type=float,
+        default=0.2,
+        help="relative increase of a metric compared to the baseline considered a regression, default: %(default)s",
+    )
+    cli.add_argument("--keep-data", action="store_true", help="do not delete the seeded group after the run")
+    return cli.parse_args()
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main(parse_args())))